@@ -0,0 +1,296 @@
+# Aircraft
+# plane records, a grid index for nearest-aircraft queries around the sign
+# and a bounded history of recently seen aircraft
+# planes are bucketed into square cells as they are parsed, so a query only
+# looks at the cells around the query point instead of sorting every aircraft
+
+import math
+import time
+from collections import OrderedDict
+
+# kilometers per degree of latitude
+km_per_degree = 111.195
+
+# plane records are lists indexed by these positions, filled in place by json_stream
+# a short list is a fraction of a class instance on CircuitPython, which keeps
+# an attribute dict per instance whether or not the class declares __slots__
+FLIGHT = 0
+ALT_GEOM = 1
+LAT = 2
+LON = 3
+EMERGENCY = 4
+HEX = 5
+plane_size = 6
+
+# aircraft.json fields kept by the streaming parser and the position each one fills
+plane_fields = {
+    "hex": HEX,
+    "flight": FLIGHT,
+    "alt_geom": ALT_GEOM,
+    "lat": LAT,
+    "lon": LON,
+    "emergency": EMERGENCY,
+}
+
+def plane_record(flight, alt_geom, lat, lon, emergency=None, hex=None):
+    return [flight, alt_geom, lat, lon, emergency, hex]
+
+# blank record for json_stream to fill
+def empty_plane():
+    return [None] * plane_size
+
+def clear_plane(plane):
+    for i in range(plane_size):
+        plane[i] = None
+
+def location(plane):
+    return (plane[LAT], plane[LON])
+
+class PlanePool:
+    """Plane records reused from one poll to the next instead of allocated and
+    dropped every minute. Planes taken during a poll are only valid until the
+    next reset(); past capacity new planes are allocated and not kept.
+    """
+    def __init__(self, capacity=200):
+        self.capacity = capacity
+        self._planes = []
+        self._next = 0
+        self.created = 0
+        self.reused = 0
+
+    # start a new poll, every pooled plane can be handed out again
+    def reset(self):
+        self._next = 0
+
+    # a blank plane, reused when possible
+    def take(self):
+        if self._next < len(self._planes):
+            plane = self._planes[self._next]
+            clear_plane(plane)
+            self.reused += 1
+        else:
+            plane = empty_plane()
+            self.created += 1
+            if len(self._planes) < self.capacity:
+                self._planes.append(plane)
+        self._next += 1
+        return plane
+
+    # hand back the plane from the last take(), e.g. a record that was skipped
+    def release(self, plane):
+        if self._next > 0 and self._next <= len(self._planes) and self._planes[self._next - 1] is plane:
+            self._next -= 1
+
+# ring index of a cell relative to the query cell along one axis
+def _ring(offset):
+    return offset if offset >= 0 else -offset
+
+# True if alt_geom is a number inside the [min_alt, max_alt] band
+def _in_band(alt, min_alt, max_alt):
+    if min_alt is None and max_alt is None:
+        return True
+    if not isinstance(alt, (int, float)):
+        return False
+    if min_alt is not None and alt < min_alt:
+        return False
+    if max_alt is not None and alt > max_alt:
+        return False
+    return True
+
+class PlaneIndex:
+    def __init__(self, lat, lon, cell_km=10):
+        # origin of the local equirectangular projection (the sign's location)
+        self.lat = lat
+        self.lon = lon
+        self.cell_km = cell_km
+        self._km_per_lon = km_per_degree * math.cos(math.radians(lat))
+        # (column, row): list of (x, y, plane)
+        self.cells = {}
+        self.count = 0
+        self._bounds = None
+
+    def clear(self):
+        self.cells = {}
+        self.count = 0
+        self._bounds = None
+
+    # km east and north of the origin
+    def project(self, lat, lon):
+        return (lon - self.lon) * self._km_per_lon, (lat - self.lat) * km_per_degree
+
+    def _cell(self, x, y):
+        return int(math.floor(x / self.cell_km)), int(math.floor(y / self.cell_km))
+
+    def add(self, plane):
+        lat = plane[LAT]
+        lon = plane[LON]
+        if lat is None or lon is None:
+            return
+        x, y = self.project(lat, lon)
+        key = self._cell(x, y)
+        bucket = self.cells.get(key)
+        if bucket is None:
+            bucket = self.cells[key] = []
+        bucket.append((x, y, plane))
+        self.count += 1
+        if self._bounds is None:
+            self._bounds = [key[0], key[1], key[0], key[1]]
+        else:
+            bounds = self._bounds
+            bounds[0] = min(bounds[0], key[0])
+            bounds[1] = min(bounds[1], key[1])
+            bounds[2] = max(bounds[2], key[0])
+            bounds[3] = max(bounds[3], key[1])
+
+    # km between a point and a plane entry
+    @staticmethod
+    def _distance(x, y, entry):
+        dx = entry[0] - x
+        dy = entry[1] - y
+        return math.sqrt(dx * dx + dy * dy)
+
+    # yield the buckets at Chebyshev ring distance `ring` from cell (column, row)
+    def _ring_buckets(self, column, row, ring):
+        if ring == 0:
+            bucket = self.cells.get((column, row))
+            if bucket:
+                yield bucket
+            return
+        for i in range(column - ring, column + ring + 1):
+            step = 1 if _ring(i - column) == ring else 2 * ring
+            for j in range(row - ring, row + ring + 1, step):
+                bucket = self.cells.get((i, j))
+                if bucket:
+                    yield bucket
+
+    # largest ring needed to cover every occupied cell from (column, row)
+    def _max_ring(self, column, row):
+        if self._bounds is None:
+            return -1
+        bounds = self._bounds
+        return max(_ring(bounds[0] - column), _ring(bounds[2] - column),
+        _ring(bounds[1] - row), _ring(bounds[3] - row))
+
+    def nearest(self, k=1, max_km=None, min_alt=None, max_alt=None, lat=None, lon=None):
+        """Return up to k (distance_km, plane) tuples, closest first.
+        :param max_km: ignore planes further than this
+        :param min_alt: ignore planes below this alt_geom (feet)
+        :param max_alt: ignore planes above this alt_geom (feet)
+        :param lat: query latitude, defaults to the index origin
+        :param lon: query longitude, defaults to the index origin
+        """
+        x, y = (0.0, 0.0) if lat is None else self.project(lat, lon)
+        column, row = self._cell(x, y)
+        best = []
+        last_ring = self._max_ring(column, row)
+        ring = 0
+        while ring <= last_ring:
+            # every cell in this ring is at least (ring - 1) * cell_km away
+            if len(best) == k and best[-1][0] <= (ring - 1) * self.cell_km:
+                break
+            if max_km is not None and (ring - 1) * self.cell_km > max_km:
+                break
+            for bucket in self._ring_buckets(column, row, ring):
+                for entry in bucket:
+                    distance = self._distance(x, y, entry)
+                    if max_km is not None and distance > max_km:
+                        continue
+                    if not _in_band(entry[2][ALT_GEOM], min_alt, max_alt):
+                        continue
+                    if len(best) == k and distance >= best[-1][0]:
+                        continue
+                    # insert in order and keep at most k
+                    position = len(best)
+                    while position > 0 and best[position - 1][0] > distance:
+                        position -= 1
+                    best.insert(position, (distance, entry[2]))
+                    if len(best) > k:
+                        best.pop()
+            ring += 1
+        return best
+
+    def within(self, radius_km, min_alt=None, max_alt=None, lat=None, lon=None):
+        """Return every (distance_km, plane) within radius_km, closest first."""
+        found = []
+        if self._bounds is None:
+            return found
+        x, y = (0.0, 0.0) if lat is None else self.project(lat, lon)
+        # only the occupied cells that overlap the radius square
+        first = self._cell(x - radius_km, y - radius_km)
+        last = self._cell(x + radius_km, y + radius_km)
+        bounds = self._bounds
+        for i in range(max(first[0], bounds[0]), min(last[0], bounds[2]) + 1):
+            for j in range(max(first[1], bounds[1]), min(last[1], bounds[3]) + 1):
+                bucket = self.cells.get((i, j))
+                if not bucket:
+                    continue
+                for entry in bucket:
+                    distance = self._distance(x, y, entry)
+                    if distance <= radius_km and _in_band(entry[2][ALT_GEOM], min_alt, max_alt):
+                        found.append((distance, entry[2]))
+        found.sort(key=lambda item: item[0])
+        return found
+
+class AircraftHistory:
+    """Fixed-capacity history of seen aircraft keyed by ICAO hex or callsign.
+    Entries are kept in least-recently-seen order, expire ttl seconds after
+    they were last seen and are evicted oldest first past capacity.
+    """
+    def __init__(self, capacity=100, ttl=60 * 30, clock=time.monotonic):
+        self.capacity = capacity
+        self.ttl = ttl
+        self.clock = clock
+        # key: [first seen, last seen, peak alt_geom]
+        self._entries = OrderedDict()
+        self.evicted = 0
+        self.expired = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    # [first seen, last seen, peak alt_geom] for a key, or None
+    def get(self, key):
+        return self._entries.get(key)
+
+    # record a sighting, returns True if the aircraft wasn't in the history
+    def seen(self, key, alt=None, now=None):
+        if now is None:
+            now = self.clock()
+        entry = self._entries.pop(key, None)
+        new = entry is None
+        if new:
+            entry = [now, now, alt]
+        else:
+            entry[1] = now
+            if isinstance(alt, (int, float)) and (not isinstance(entry[2], (int, float)) or alt > entry[2]):
+                entry[2] = alt
+        # re-insert so the order stays least-recently-seen first
+        self._entries[key] = entry
+        while len(self._entries) > self.capacity:
+            self._entries.pop(next(iter(self._entries)))
+            self.evicted += 1
+        return new
+
+    # drop entries not seen for ttl seconds
+    def expire(self, now=None):
+        if now is None:
+            now = self.clock()
+        while self._entries:
+            key = next(iter(self._entries))
+            if now - self._entries[key][1] < self.ttl:
+                break
+            self._entries.pop(key)
+            self.expired += 1
+
+    # number of aircraft first seen in the last `seconds`
+    def new_since(self, seconds, now=None):
+        if now is None:
+            now = self.clock()
+        count = 0
+        for entry in self._entries.values():
+            if now - entry[0] <= seconds:
+                count += 1
+        return count
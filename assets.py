@@ -0,0 +1,183 @@
+# Assets
+# sprite sheets for the display, loaded into palette-indexed bitmaps in RAM at
+# the smallest bit depth that holds their colors, so tiles are redrawn without
+# reading flash
+# sheets that don't fit the memory budget stay on flash behind OnDiskBitmap
+
+import gc
+import displayio
+
+# bits per color channel the matrix can show (Matrix(bit_depth=2) in code.py),
+# colors are reduced to this depth so the palette stays small without visible loss
+channel_bits = 2
+
+# bits per pixel a displayio.Bitmap can store
+_depths = (1, 2, 4, 8)
+
+# bytes a displayio.Bitmap uses for its pixels, rows are padded to 32 bits
+def bitmap_bytes(width, height, bits):
+    return ((width * bits + 31) // 32) * 4 * height
+
+# smallest bitmap depth that holds count colors, or None if there are too many
+def depth_for(count):
+    for bits in _depths:
+        if count <= 1 << bits:
+            return bits
+    return None
+
+# reduce an 8 bit channel to `bits` and scale it back to 0-255
+def _reduce(value, bits):
+    top = (1 << bits) - 1
+    return (value >> (8 - bits)) * 255 // top
+
+def _color(r, g, b, bits):
+    return (_reduce(r, bits) << 16) | (_reduce(g, bits) << 8) | _reduce(b, bits)
+
+class SpriteSheet:
+    def __init__(self, name, bitmap, pixel_shader, tile_width, tile_height, in_ram, cost=0, bits=None):
+        self.name = name
+        self.bitmap = bitmap
+        self.pixel_shader = pixel_shader
+        self.tile_width = tile_width
+        self.tile_height = tile_height
+        self.in_ram = in_ram
+        # bytes of bitmap storage in RAM (0 on flash)
+        self.cost = cost
+        self.bits = bits
+
+    def tile_grid(self, **kwargs):
+        return displayio.TileGrid(self.bitmap, pixel_shader=self.pixel_shader,
+        tile_width=self.tile_width, tile_height=self.tile_height, **kwargs)
+
+class _BMP:
+    """Uncompressed 8 bit indexed or 16 bit (5-5-5) BMP read row by row."""
+    def __init__(self, path, bits):
+        self.file = open(path, "rb")
+        header = self.file.read(54)
+        if header[0:2] != b"BM":
+            raise ValueError("{} is not a BMP".format(path))
+        self.offset = int.from_bytes(header[10:14], "little")
+        header_size = int.from_bytes(header[14:18], "little")
+        self.width = int.from_bytes(header[18:22], "little")
+        height = int.from_bytes(header[22:26], "little")
+        # positive heights are stored bottom row first
+        self.bottom_up = height < 0x80000000
+        self.height = height if self.bottom_up else 0x100000000 - height
+        self.depth = int.from_bytes(header[28:30], "little")
+        compression = int.from_bytes(header[30:34], "little")
+        if compression != 0 or self.depth not in (8, 16):
+            raise ValueError("{}: unsupported BMP ({} bit, compression {})".format(path, self.depth, compression))
+        self.row_size = ((self.width * self.depth + 31) // 32) * 4
+        # 8 bit images: reduced color of every palette entry
+        self.colors = None
+        if self.depth == 8:
+            count = int.from_bytes(header[46:50], "little") or 256
+            self.file.seek(14 + header_size)
+            entries = self.file.read(count * 4)
+            self.colors = [_color(entries[i + 2], entries[i + 1], entries[i], bits) for i in range(0, len(entries), 4)]
+        self.bits = bits
+        self._row = bytearray(self.row_size)
+
+    # yield (y, reduced colors of the row) top to bottom
+    def rows(self):
+        for y in range(self.height):
+            stored = self.height - 1 - y if self.bottom_up else y
+            self.file.seek(self.offset + stored * self.row_size)
+            self.file.readinto(self._row)
+            row = self._row
+            if self.depth == 8:
+                colors = self.colors
+                yield y, [colors[row[x]] for x in range(self.width)]
+            else:
+                bits = self.bits
+                line = []
+                for x in range(self.width):
+                    value = row[2 * x] | (row[2 * x + 1] << 8)
+                    r = (value >> 10) & 0x1F
+                    g = (value >> 5) & 0x1F
+                    b = value & 0x1F
+                    line.append(_color((r << 3) | (r >> 2), (g << 3) | (g >> 2), (b << 3) | (b >> 2), bits))
+                yield y, line
+
+    def close(self):
+        self.file.close()
+
+class AssetManager:
+    def __init__(self, budget=1024 * 32, reserve=1024 * 24, channel_bits=channel_bits):
+        # bytes of bitmap storage the sheets may use in RAM
+        self.budget = budget
+        # free heap to keep after loading a sheet (only checked on CircuitPython)
+        self.reserve = reserve
+        self.channel_bits = channel_bits
+        self.used = 0
+        self.sheets = {}
+        # name: (path, tile width, tile height) loaded on first get()
+        self._registered = {}
+
+    # register a sheet to load on first use
+    def register(self, name, path, tile_width, tile_height):
+        self._registered[name] = (path, tile_width, tile_height)
+
+    def get(self, name):
+        sheet = self.sheets.get(name)
+        if sheet is None:
+            path, tile_width, tile_height = self._registered[name]
+            sheet = self.load(name, path, tile_width, tile_height)
+        return sheet
+
+    def _fits(self, cost):
+        if self.used + cost > self.budget:
+            return False
+        if hasattr(gc, "mem_free"):
+            gc.collect()
+            if gc.mem_free() - cost < self.reserve:
+                return False
+        return True
+
+    def load(self, name, path, tile_width, tile_height):
+        """Load a sprite sheet into RAM, or open it on flash if it doesn't fit.
+        Two passes over the file: the first collects the reduced colors to pick the
+        bit depth and check the budget, the second fills the bitmap.
+        """
+        sheet = None
+        try:
+            image = _BMP(path, self.channel_bits)
+        except ValueError as e:
+            print(e)
+            image = None
+        if image is not None:
+            try:
+                palette_index = {}
+                for _, line in image.rows():
+                    for color in line:
+                        if color not in palette_index:
+                            palette_index[color] = len(palette_index)
+                bits = depth_for(len(palette_index))
+                cost = bitmap_bytes(image.width, image.height, bits) if bits else 0
+                if bits and self._fits(cost):
+                    bitmap = displayio.Bitmap(image.width, image.height, 1 << bits)
+                    palette = displayio.Palette(len(palette_index))
+                    for color, index in palette_index.items():
+                        palette[index] = color
+                    for y, line in image.rows():
+                        for x in range(image.width):
+                            bitmap[x, y] = palette_index[line[x]]
+                    self.used += cost
+                    sheet = SpriteSheet(name, bitmap, palette, tile_width, tile_height, True, cost, bits)
+            finally:
+                image.close()
+        if sheet is None:
+            # same as before the asset manager: pixels are read from flash on every redraw
+            bitmap = displayio.OnDiskBitmap(open(path, "rb"))
+            sheet = SpriteSheet(name, bitmap, getattr(bitmap, 'pixel_shader', displayio.ColorConverter()),
+            tile_width, tile_height, False)
+        self.sheets[name] = sheet
+        return sheet
+
+    def report(self):
+        for sheet in self.sheets.values():
+            if sheet.in_ram:
+                print("{}: ram | {} bit | {} bytes".format(sheet.name, sheet.bits, sheet.cost))
+            else:
+                print("{}: flash".format(sheet.name))
+        print("assets: {}/{} bytes".format(self.used, self.budget))
@@ -0,0 +1,85 @@
+# Aggregator benchmark
+# bytes the sign receives and the time it spends parsing them for one cycle of
+# direct upstream requests (trains, incidents, weather, aircraft, time) against
+# one aggregator payload, then an hour of replay in both modes (run on CPython)
+
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+root = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, root)
+sys.path.insert(0, os.path.join(root, "server"))
+sys.path.insert(0, os.path.join(root, "host"))
+import json_stream
+from aggregator import Aggregator, fixture_fetch, fixture_names
+from predictions import train_record, empty_train, train_fields
+from incidents import Incident, incident_fields
+from aircraft import plane_record, empty_plane, plane_fields
+from weather import compact_weather
+from harness import Replay, fixture_dir
+from secrets import secrets
+
+repeats = 50
+
+def chunks(data, size=256):
+    for start in range(0, len(data), size):
+        yield data[start:start + size]
+
+# what the sign does with each upstream response in direct mode
+def parse_direct(bodies):
+    list(json_stream.iter_records(chunks(bodies["trains"]), "Trains", train_fields, record=empty_train))
+    list(json_stream.iter_records(chunks(bodies["incidents"]), "Incidents", incident_fields, record=Incident))
+    compact_weather(json.loads(bodies["weather"]))
+    list(json_stream.iter_records(chunks(bodies["planes"]), "aircraft", plane_fields, record=empty_plane))
+    json.loads(bodies["time"])
+
+# what the sign does with the aggregator payload
+def parse_payload(body):
+    payload = json.loads(body)
+    for entry in payload["trains"]:
+        if entry is not None:
+            train_record(entry[0], entry[1], entry[2], entry[3])
+    [Incident(*entry) for entry in payload["incidents"]]
+    entry = payload["plane"]
+    if entry is not None:
+        plane_record(entry[0], entry[1], entry[2], entry[3], hex=entry[4])
+
+# (average ms, peak bytes) of a parse
+def measure(function, argument):
+    tracemalloc.start()
+    function(argument)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    start = time.perf_counter()
+    for _ in range(repeats):
+        function(argument)
+    return (time.perf_counter() - start) / repeats * 1000, peak
+
+if __name__ == "__main__":
+    bodies = {}
+    for feed, name in fixture_names.items():
+        with open(os.path.join(fixture_dir, name), "rb") as fixture:
+            bodies[feed] = fixture.read()
+    aggregator = Aggregator(secrets, fixture_fetch(fixture_dir))
+    aggregator.tick()
+    payload = aggregator.body()
+    bodies["time"] = json.dumps(json.loads(payload)["time"]).encode()
+
+    direct_ms, direct_peak = measure(parse_direct, bodies)
+    payload_ms, payload_peak = measure(parse_payload, payload)
+    print("one cycle")
+    print("direct:     {} requests | {:>7} bytes | parse {:>7.2f} ms | peak {:>7} bytes".format(
+    len(bodies), sum(len(body) for body in bodies.values()), direct_ms, direct_peak))
+    print("aggregator: 1 request  | {:>7} bytes | parse {:>7.2f} ms | peak {:>7} bytes".format(
+    len(payload), payload_ms, payload_peak))
+    print()
+
+    for title, overrides in (("direct", {}), ("aggregator", {"aggregator_url": "http://127.0.0.1:8080/sign.json"})):
+        replay = Replay(duration=60 * 60, secrets=overrides)
+        replay.run()
+        print("== 1 hour, {} ==".format(title))
+        replay.report()
+        print()
@@ -0,0 +1,62 @@
+# Aircraft index benchmark
+# compares PlaneIndex nearest/within queries against a brute-force scan and sort
+# on synthetic aircraft sets around the sign (run on CPython)
+
+import math
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from aircraft import PlaneIndex, plane_record, ALT_GEOM, LAT, LON
+
+origin = (38.9, -77.03)
+repeats = 200
+
+def synthetic_planes(count, seed=1):
+    rng = random.Random(seed)
+    planes = []
+    for i in range(count):
+        # ADS-B receivers see roughly 250 km in every direction
+        planes.append(plane_record("AAL{}".format(i), rng.randint(0, 40000),
+        origin[0] + rng.uniform(-2.2, 2.2), origin[1] + rng.uniform(-2.8, 2.8)))
+    return planes
+
+def brute_force(index, planes, k, max_km, max_alt):
+    found = []
+    for plane in planes:
+        x, y = index.project(plane[LAT], plane[LON])
+        distance = math.sqrt(x * x + y * y)
+        if distance <= max_km and plane[ALT_GEOM] <= max_alt:
+            found.append((distance, plane))
+    found.sort(key=lambda item: item[0])
+    return found[:k]
+
+def timed(function):
+    start = time.perf_counter()
+    for _ in range(repeats):
+        result = function()
+    return (time.perf_counter() - start) / repeats * 1000000, result
+
+def bench(count):
+    planes = synthetic_planes(count)
+
+    def build():
+        index = PlaneIndex(origin[0], origin[1])
+        for plane in planes:
+            index.add(plane)
+        return index
+
+    build_time, index = timed(build)
+    index_time, nearest = timed(lambda: index.nearest(5, max_km=50, max_alt=20000))
+    brute_time, expected = timed(lambda: brute_force(index, planes, 5, 50, 20000))
+    within_time, _ = timed(lambda: index.within(15, max_alt=20000))
+    assert [plane for _, plane in nearest] == [plane for _, plane in expected]
+    print("{:>5} aircraft | build {:>8.1f} us | nearest-5 {:>7.1f} us | within 15 km {:>7.1f} us | brute force {:>8.1f} us".format(
+    count, build_time, index_time, within_time, brute_time
+    ))
+
+if __name__ == "__main__":
+    for count in (50, 200, 500, 1000):
+        bench(count)
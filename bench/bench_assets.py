@@ -0,0 +1,71 @@
+# Sprite sheet benchmark
+# memory cost and tile redraw time of the sprite sheets in RAM (palette-indexed
+# bitmap from the asset manager) against reading them from flash like
+# OnDiskBitmap does on every redraw (run on CPython)
+# the host Bitmap stand-in is pure Python, so RAM redraw times here overstate the
+# device cost where displayio reads the bitmap natively; file reads are the real cost
+
+import os
+import sys
+import time
+
+root = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, root)
+sys.path.append(os.path.join(root, "host", "stubs"))
+import assets
+
+sheets = (
+    ("icons", os.path.join(root, "bmp", "weather-icons.bmp"), 16, 16),
+    ("line", os.path.join(root, "bmp", "RD line.bmp"), 228, 231),
+)
+repeats = 200
+
+# every pixel of a tile from the in-memory bitmap and palette
+def draw_ram(sheet, tile):
+    columns = sheet.bitmap.width // sheet.tile_width
+    x0 = (tile % columns) * sheet.tile_width
+    y0 = (tile // columns) * sheet.tile_height
+    bitmap = sheet.bitmap
+    palette = sheet.pixel_shader
+    for y in range(y0, y0 + sheet.tile_height):
+        for x in range(x0, x0 + sheet.tile_width):
+            palette[bitmap[x, y]]
+
+# every pixel of a tile read from the file and converted, what OnDiskBitmap does
+def draw_disk(image, tile_width, tile_height, tile):
+    columns = image.width // tile_width
+    x0 = (tile % columns) * tile_width
+    y0 = (tile // columns) * tile_height
+    pixel_bytes = image.depth // 8
+    for y in range(y0, y0 + tile_height):
+        stored = image.height - 1 - y if image.bottom_up else y
+        image.file.seek(image.offset + stored * image.row_size + x0 * pixel_bytes)
+        row = image.file.read(tile_width * pixel_bytes)
+        for x in range(tile_width):
+            if pixel_bytes == 1:
+                image.colors[row[x]]
+            else:
+                value = row[2 * x] | (row[2 * x + 1] << 8)
+                assets._color((value >> 7) & 0xF8, (value >> 2) & 0xF8, (value << 3) & 0xF8, image.bits)
+
+def timed(function):
+    start = time.perf_counter()
+    for _ in range(repeats):
+        function()
+    return (time.perf_counter() - start) / repeats * 1000000
+
+if __name__ == "__main__":
+    for name, path, tile_width, tile_height in sheets:
+        manager = assets.AssetManager(budget=1024 * 64)
+        start = time.perf_counter()
+        sheet = manager.load(name, path, tile_width, tile_height)
+        load_time = (time.perf_counter() - start) * 1000
+        image = assets._BMP(path, assets.channel_bits)
+        ram_time = timed(lambda: draw_ram(sheet, 0))
+        disk_time = timed(lambda: draw_disk(image, tile_width, tile_height, 0))
+        image.close()
+        print("{:<6} {}x{} | ram: {} bit, {:>6} bytes, {} colors, load {:>6.1f} ms, tile redraw {:>8.1f} us"
+        " | flash: 0 bytes, tile redraw {:>8.1f} us".format(
+        name, image.width, image.height, sheet.bits, sheet.cost, len(sheet.pixel_shader),
+        load_time, ram_time, disk_time
+        ))
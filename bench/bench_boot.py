@@ -0,0 +1,39 @@
+# Boot benchmark
+# runs code.py's staged startup on the host with the CircuitPython stand-ins and
+# prints the boot profile: import and init time and heap change of every stage
+# and when the first frame was shown (run on CPython)
+# times are host time for the work plus virtual time for blocking I/O such as
+# joining the network; heap values are host (CPython) sizes, only their ratios
+# between stages carry over to the sign
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "host"))
+from harness import Replay
+
+# seconds the ESP32 takes to join the network
+connect_time = 8.0
+
+def boot(title, nvm=None):
+    replay = Replay(duration=60 * 2, connect_time=connect_time, nvm=nvm)
+    replay.run()
+    profiler = replay.globals["boot"]
+    print("== {} ==".format(title))
+    print("{:<13} {:>10} {:>12} {:>10} {:>12} {:>10}".format(
+    "stage", "import ms", "import used", "init ms", "init used", "done at"))
+    for name, import_ms, init_ms, import_heap, init_heap, free, at in profiler.stages:
+        print("{:<13} {:>10.1f} {:>11}B {:>10.1f} {:>11}B {:>8.1f}ms".format(
+        name, import_ms, -import_heap, init_ms, -init_heap, at))
+    # before staging, all of this ran ahead of the first frame
+    before_loop = profiler.stages[-1][6]
+    print("status frame at {:.1f}ms, {:.1f}ms of imports and init (with the network join) run after it".format(
+    profiler.first_frame, before_loop - profiler.first_frame))
+    print("first frame with data: {}".format(
+    "never" if replay.first_frame is None else "{:.1f}s".format(replay.first_frame)))
+    print()
+    return replay
+
+if __name__ == "__main__":
+    cold = boot("cold boot")
+    boot("reboot from snapshot", nvm=bytearray(cold.nvm))
@@ -0,0 +1,46 @@
+# Font loading benchmark
+# startup and first-render time of the symbol font: BDF parsed lazily by
+# adafruit_bitmap_font against the precompiled glyph file (run on CPython,
+# BDF numbers need adafruit-circuitpython-bitmap-font installed)
+
+import os
+import sys
+import time
+
+root = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, root)
+# displayio/fontio stand-ins, appended so an installed adafruit_bitmap_font wins over its stub
+sys.path.append(os.path.join(root, "host", "stubs"))
+import glyph_font
+from adafruit_bitmap_font import bitmap_font
+
+sys.path.insert(0, os.path.join(root, "tools"))
+from bdf2glyphs import symbol_chars
+
+bdf_path = os.path.join(root, "bdf", "custom_bellota.bdf")
+glf_path = os.path.join(root, "bdf", "custom_bellota.glf")
+repeats = 500
+
+# load the font, then look up every rendered glyph once (what a label does on first draw)
+def bench(name, load, path):
+    load_time = render_time = 0
+    for _ in range(repeats):
+        start = time.perf_counter()
+        font = load(path)
+        loaded = time.perf_counter()
+        for char in symbol_chars:
+            font.get_glyph(ord(char))
+        render_time += time.perf_counter() - loaded
+        load_time += loaded - start
+    load_time = load_time / repeats * 1000000
+    render_time = render_time / repeats * 1000000
+    print("{:<6} {:>6} bytes | load {:>8.1f} us | first render {:>8.1f} us | total {:>8.1f} us".format(
+    name, os.path.getsize(path), load_time, render_time, load_time + render_time
+    ))
+
+if __name__ == "__main__":
+    if hasattr(bitmap_font, "bdf"):
+        bench("bdf", bitmap_font.load_font, bdf_path)
+    else:
+        print("bdf    skipped, adafruit-circuitpython-bitmap-font is not installed")
+    bench("glyphs", glyph_font.load_font, glf_path)
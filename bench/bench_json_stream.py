@@ -0,0 +1,90 @@
+# JSON stream benchmark
+# compares peak allocation and parse time of json_stream against json.loads
+# on tar1090 and WMATA shaped documents of different sizes (run on CPython)
+
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import json_stream
+
+plane_fields = ("flight", "alt_geom", "lat", "lon", "emergency")
+train_fields = ("Line", "DestinationCode", "Destination", "DestinationName", "Min")
+
+# build an aircraft.json document shaped like a tar1090 response
+def aircraft_document(count, seed=1):
+    rng = random.Random(seed)
+    aircraft = []
+    for i in range(count):
+        aircraft.append({
+            "hex": "a{:05x}".format(i), "type": "adsb_icao",
+            "flight": "AAL{:<5}".format(i), "r": "N{}AA".format(i), "t": "A321",
+            "alt_baro": rng.randint(0, 40000), "alt_geom": rng.randint(0, 40000),
+            "gs": rng.uniform(100, 500), "track": rng.uniform(0, 360),
+            "baro_rate": rng.randint(-2000, 2000), "squawk": "{:04d}".format(rng.randint(0, 7777)),
+            "emergency": "none", "category": "A3",
+            "nav_qnh": 1013.6, "nav_altitude_mcp": 36000, "nav_heading": rng.uniform(0, 360),
+            "lat": 38.9 + rng.uniform(-1, 1), "lon": -77.0 + rng.uniform(-1, 1),
+            "nic": 8, "rc": 186, "seen_pos": rng.uniform(0, 30), "version": 2,
+            "nic_baro": 1, "nac_p": 9, "nac_v": 1, "sil": 3, "sil_type": "perhour",
+            "gva": 2, "sda": 2, "alert": 0, "spi": 0,
+            "mlat": [], "tisb": [], "messages": rng.randint(0, 100000),
+            "seen": rng.uniform(0, 30), "rssi": rng.uniform(-30, -5),
+        })
+    return json.dumps({"now": 1700000000.0, "messages": 123456, "aircraft": aircraft}).encode()
+
+# build a GetPrediction document shaped like a WMATA response
+def train_document(count, seed=1):
+    rng = random.Random(seed)
+    trains = []
+    for i in range(count):
+        trains.append({
+            "Car": "8", "Destination": "Shady Gr", "DestinationCode": "A15",
+            "DestinationName": "Shady Grove", "Group": str(1 + i % 2), "Line": "RD",
+            "LocationCode": "A01", "LocationName": "Metro Center",
+            "Min": str(rng.randint(1, 20)),
+        })
+    return json.dumps({"Trains": trains}).encode()
+
+def chunks(data, size):
+    for start in range(0, len(data), size):
+        yield data[start:start + size]
+
+# returns (seconds, peak bytes) for one run of parse
+def measure(parse):
+    tracemalloc.start()
+    start = time.perf_counter()
+    parse()
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak
+
+def bench(name, data, array_key, fields, chunk_size=256):
+    def loads():
+        records = []
+        for item in json.loads(data)[array_key]:
+            records.append({key: item[key] for key in fields if key in item})
+        return records
+
+    def stream():
+        count = 0
+        for _ in json_stream.iter_records(chunks(data, chunk_size), array_key, fields):
+            count += 1
+        return count
+
+    loads_time, loads_peak = measure(loads)
+    stream_time, stream_peak = measure(stream)
+    print("{:<18} {:>9} B | json.loads {:>8.2f} ms {:>9} B peak | json_stream {:>8.2f} ms {:>7} B peak".format(
+    name, len(data), loads_time * 1000, loads_peak, stream_time * 1000, stream_peak
+    ))
+
+if __name__ == "__main__":
+    for count in (10, 100, 300, 600):
+        bench("aircraft x{}".format(count), aircraft_document(count), "aircraft", plane_fields)
+    for count in (4, 20, 60):
+        bench("trains x{}".format(count), train_document(count), "Trains", train_fields)
@@ -0,0 +1,116 @@
+# Record benchmark
+# memory of plane/train records: the old class instances filled from parsed dicts
+# against the list records json_stream fills in place, and the plane pool reusing
+# list records between polls
+# per poll numbers are measured on CPython; per object sizes are given for CPython
+# and for the CircuitPython heap layout the sign runs on, where __slots__ is
+# ignored and every instance keeps an attribute table
+
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import json_stream
+from aircraft import PlanePool, plane_record, empty_plane, plane_fields, plane_size, FLIGHT
+from predictions import train_record, train_size
+from bench_json_stream import aircraft_document, chunks
+
+polls = 5
+
+# the records as they were before (with hex, which planes now keep)
+class DictPlane:
+    def __init__(self, flight, alt_geom, lat, lon):
+        self.flight = flight
+        self.alt_geom = alt_geom
+        self.lat = lat
+        self.lon = lon
+        self.location = (lat, lon)
+        self.emergency = None
+        self.hex = None
+
+class DictTrain:
+    def __init__(self, destination, destination_name, destination_code, minutes, line=None, station=None, group=None, received=None):
+        self.destination = destination
+        self.destination_name = destination_name
+        self.destination_code = destination_code
+        self.minutes = minutes
+        self.line = line
+        self.station = station
+        self.group = group
+        self.received = received
+
+# CircuitPython allocates the heap in 16 byte blocks and pointers are 4 bytes
+def device_blocks(size):
+    return (size + 15) // 16 * 16
+
+# an instance header (type, members map) and its table of (name, value) pairs
+def device_instance(attributes, tuples=0):
+    return device_blocks(12) + device_blocks(8 * attributes) + tuples * device_blocks(8 + 4 * 2)
+
+# a list header (type, alloc, len, items) and its item array
+def device_list(items):
+    return device_blocks(16) + device_blocks(4 * items)
+
+# CPython bytes of one record and its attribute storage (shared values not counted)
+def object_size(record):
+    size = sys.getsizeof(record)
+    if hasattr(record, "__dict__"):
+        size += sys.getsizeof(record.__dict__)
+        if hasattr(record, "location"):
+            size += sys.getsizeof(record.location)
+    return size
+
+def dict_poll(data):
+    planes = []
+    for entry in json_stream.iter_records(chunks(data, 256), "aircraft", tuple(plane_fields)):
+        if "flight" in entry:
+            plane = DictPlane(entry["flight"].strip(), entry["alt_geom"], entry["lat"], entry["lon"])
+            plane.emergency = entry.get("emergency")
+            plane.hex = entry.get("hex")
+            planes.append(plane)
+    return planes
+
+def record_poll(data, make_plane=empty_plane):
+    planes = []
+    for plane in json_stream.iter_records(chunks(data, 256), "aircraft", plane_fields, record=make_plane):
+        if plane[FLIGHT] is not None:
+            plane[FLIGHT] = plane[FLIGHT].strip()
+            planes.append(plane)
+    return planes
+
+# (peak bytes during a poll, bytes still held by its planes, planes kept) for the last of several polls
+def measure(poll, data, before_poll=None):
+    planes = None
+    for _ in range(polls):
+        if before_poll is not None:
+            before_poll()
+        # the previous poll's planes are dropped once the new ones are parsed, like code.py
+        tracemalloc.start()
+        base = tracemalloc.get_traced_memory()[0]
+        planes = poll(data)
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return peak - base, current - base, len(planes)
+
+if __name__ == "__main__":
+    plane = plane_record("AAL1", 1000, 38.9, -77.0)
+    train = train_record("Shady Gr", "Shady Grove", "A15", "4", "RD", "A01", "2", 0.0)
+    print("per object on CPython: Plane {} -> {} bytes | Train {} -> {} bytes".format(
+    object_size(DictPlane("AAL1", 1000, 38.9, -77.0)), object_size(plane),
+    object_size(DictTrain("Shady Gr", "Shady Grove", "A15", "4", "RD", "A01", "2", 0.0)), object_size(train)
+    ))
+    # the old plane also held its (lat, lon) location tuple
+    print("per object on CircuitPython: Plane {} -> {} bytes | Train {} -> {} bytes".format(
+    device_instance(7, tuples=1), device_list(plane_size), device_instance(train_size), device_list(train_size)
+    ))
+    for count in (100, 500, 1000):
+        data = aircraft_document(count)
+        pool = PlanePool(capacity=count)
+        dict_peak, dict_kept, kept_planes = measure(dict_poll, data)
+        record_peak, record_kept, _ = measure(record_poll, data)
+        pool_peak, pool_kept, _ = measure(lambda document: record_poll(document, pool.take), data, pool.reset)
+        print("{:>5} aircraft per poll ({} kept) | class instances: peak {:>7} kept {:>7} | list records: peak {:>7} kept {:>7}"
+        " | pooled: peak {:>7} kept {:>7} bytes".format(
+        count, kept_planes, dict_peak, dict_kept, record_peak, record_kept, pool_peak, pool_kept
+        ))
@@ -0,0 +1,37 @@
+# End-to-end replay benchmark
+# runs the real code.py loop on the host harness against recorded feed fixtures
+# on a virtual clock and reports per-task latency and allocations, data
+# staleness, display work and scroll jitter (run on CPython)
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "host"))
+from harness import Replay
+
+hour = 60 * 60
+
+def scenario(title, duration=hour, faults=None, latency=None, sequences=None):
+    replay = Replay(duration=duration, latency=latency)
+    for feed, count in (faults or {}).items():
+        replay.fail(feed, count)
+    for feed, names in (sequences or {}).items():
+        replay.sequence(feed, names)
+    replay.run()
+    print("== {} ==".format(title))
+    replay.report()
+    print()
+    return replay
+
+if __name__ == "__main__":
+    scenario("steady state, 1 hour")
+    # aircraft feed keeps failing, only its own circuit should open
+    scenario("aircraft feed down", faults={"planes": None})
+    # two feeds failing together trips the radio reset quorum
+    scenario("trains and incidents down for 4 requests", faults={"trains": 4, "incidents": 4})
+    # incidents appear, are updated and clear, only the changes are scrolled
+    scenario("incident updates", sequences={"incidents": (
+        "wmata_incidents.json", "wmata_incidents.json", "wmata_incidents_updated.json", "wmata_incidents_cleared.json"
+    )})
+    # slow TLS handshakes, scroll frames that overlap a fetch are counted as dropped
+    scenario("slow network", latency={"trains": 3.0, "incidents": 3.0, "weather": 5.0})
@@ -0,0 +1,34 @@
+# Warm start benchmark
+# time to the first meaningful frame (trains and a temperature instead of the
+# placeholders) and to the first live one, booting with an empty snapshot and
+# rebooting from the snapshot an earlier run left in nonvolatile memory (run on CPython)
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "host"))
+from harness import Replay
+
+# seconds the ESP32 takes to join the network after a reboot
+connect_time = 8.0
+
+def boot(title, nvm=None, duration=60 * 40, faults=None):
+    replay = Replay(duration=duration, connect_time=connect_time, nvm=nvm)
+    for feed, count in (faults or {}).items():
+        replay.fail(feed, count)
+    replay.run()
+    snapshotter = replay.globals["snapshotter"]
+    print("{:<44} | first frame {:>6} | first live frame {:>6} | snapshot writes {}".format(
+    title,
+    "never" if replay.first_frame is None else "{:.1f}s".format(replay.first_frame),
+    "never" if replay.first_live_frame is None else "{:.1f}s".format(replay.first_live_frame),
+    snapshotter.writes))
+    return replay
+
+if __name__ == "__main__":
+    cold = boot("cold boot, empty snapshot")
+    boot("reboot from snapshot", nvm=bytearray(cold.nvm), duration=60 * 10)
+    # after a brownout the feeds often fail for a while
+    boot("cold boot, feeds failing twice", faults={"trains": 2, "weather": 2}, duration=60 * 30)
+    boot("reboot from snapshot, feeds failing twice", nvm=bytearray(cold.nvm),
+    faults={"trains": 2, "weather": 2}, duration=60 * 30)
@@ -0,0 +1,72 @@
+# Wire benchmark
+# size, decode time and peak allocation of the aggregator payload in the binary
+# encoding of wire.py against JSON (run on CPython, round trips are checked by tests/test_wire.py)
+# json.loads is C on CPython while the wire decoder runs as Python bytecode here,
+# so decode times favor JSON more than on the sign; sizes and allocations carry over
+
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+root = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, root)
+sys.path.insert(0, os.path.join(root, "server"))
+sys.path.insert(0, os.path.join(root, "host"))
+import wire
+from aggregator import Aggregator, fixture_fetch
+from harness import fixture_dir
+from secrets import secrets
+
+repeats = 2000
+
+class Body:
+    def __init__(self, data):
+        self.data = data
+
+    def iter_content(self, chunk_size=1, decode_unicode=False):
+        for start in range(0, len(self.data), chunk_size):
+            yield self.data[start:start + chunk_size]
+
+    def close(self):
+        pass
+
+# the fixture payload with extra incidents, a busy day on the Red line
+def payload_with_incidents(payload, count):
+    payload = dict(payload)
+    incidents = list(payload["incidents"] or ())
+    for i in range(count):
+        incidents.append(["incident-{}".format(i), "2024-05-14T08:{:02d}:00".format(i % 60), "RD;",
+        "Red Line: Trains single tracking between Station {} and Station {} due to a track problem.".format(i, i + 1),
+        None, None])
+    payload["incidents"] = incidents
+    return payload
+
+# (average us, peak bytes) of a decode
+def measure(function):
+    tracemalloc.start()
+    function()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    start = time.perf_counter()
+    for _ in range(repeats):
+        function()
+    return (time.perf_counter() - start) / repeats * 1000000, peak
+
+if __name__ == "__main__":
+    aggregator = Aggregator(secrets, fixture_fetch(fixture_dir))
+    aggregator.tick()
+    base = json.loads(aggregator.body())
+    empty = dict(base, trains=None, weather=None, plane=None, incidents=None, at={})
+    decoder = wire.WireDecoder(1024)
+    for title, payload in (("no data yet", empty), ("fixtures", base),
+    ("5 incidents", payload_with_incidents(base, 4)), ("20 incidents", payload_with_incidents(base, 19))):
+        text = json.dumps(payload, separators=(",", ":")).encode()
+        binary = wire.encode(payload)
+        json_us, json_peak = measure(lambda: json.loads(text))
+        wire_us, wire_peak = measure(lambda: decoder.read(Body(binary)))
+        print("{:<13} | json: {:>5} bytes, decode {:>6.1f} us, peak {:>6} bytes"
+        " | wire: {:>5} bytes, decode {:>6.1f} us, peak {:>6} bytes".format(
+        title, len(text), json_us, json_peak, len(binary), wire_us, wire_peak))
+    print("decoder buffer {} bytes, grown {} times".format(len(decoder.buffer), decoder.grown))
@@ -0,0 +1,72 @@
+# Cache
+# response cache for slow-changing feeds
+# keeps the parsed, compacted result of each feed for a TTL and revalidates it
+# with a conditional request, so unchanged responses are never parsed again
+
+import time
+
+# case-insensitive header lookup, adafruit_requests and CPython differ on header case
+def _header(headers, name):
+    for key, value in headers.items():
+        if key.lower() == name:
+            return value
+    return None
+
+class FeedCache:
+    def __init__(self, session, clock=time.monotonic):
+        self.session = session
+        self.clock = clock
+        # name: [value, fetched at, ttl, etag, last modified]
+        self.entries = {}
+        self.hits = 0
+        self.misses = 0
+        self.revalidations = 0
+
+    # clock time the cached value of a feed was fetched or revalidated, or None
+    def fetched_at(self, name):
+        entry = self.entries.get(name)
+        return entry[1] if entry else None
+
+    def is_fresh(self, name):
+        entry = self.entries.get(name)
+        return entry is not None and self.clock() - entry[1] < entry[2]
+
+    def fetch(self, name, url, parse, ttl, headers=None):
+        """Return the cached value of a feed while it is fresh, otherwise request
+        it, sending If-None-Match/If-Modified-Since when the server gave an ETag or
+        Last-Modified. A 304 keeps the cached value and restarts its TTL. Request
+        errors are raised to the caller and leave the stale value in place.
+        :param parse: function taking the response and returning the value to cache
+        """
+        entry = self.entries.get(name)
+        now = self.clock()
+        if entry is not None and now - entry[1] < entry[2]:
+            self.hits += 1
+            return entry[0]
+
+        request_headers = dict(headers) if headers else {}
+        if entry is not None:
+            if entry[3]:
+                request_headers["If-None-Match"] = entry[3]
+            if entry[4]:
+                request_headers["If-Modified-Since"] = entry[4]
+
+        response = self.session.get(url, headers=request_headers)
+        if response.status_code == 304 and entry is not None:
+            response.close()
+            entry[1] = now
+            entry[2] = ttl
+            self.revalidations += 1
+            return entry[0]
+        if response.status_code >= 400:
+            response.close()
+            raise RuntimeError("{} returned HTTP {}".format(name, response.status_code))
+        etag = _header(response.headers, "etag")
+        last_modified = _header(response.headers, "last-modified")
+        value = parse(response)
+        self.entries[name] = [value, now, ttl, etag, last_modified]
+        self.misses += 1
+        return value
+
+    def report(self):
+        print("cache hits: {} | misses: {} | revalidated: {}".format(self.hits, self.misses, self.revalidations))
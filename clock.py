@@ -0,0 +1,108 @@
+# Clock
+# local wall clock synced from Adafruit IO and extrapolated with time.monotonic_ns
+# answers hour/min/wday queries without network I/O and resyncs on a slow schedule
+# all arithmetic is on ints: epoch seconds (about 1.7e9) do not fit a CircuitPython
+# float, where one step is minutes at that size
+
+import time
+
+# days since 1970-01-01 for a civil date
+def days_from_civil(year, month, day):
+    if month <= 2:
+        year -= 1
+    era = year // 400
+    yoe = year - era * 400
+    doy = (153 * (month + (-3 if month > 2 else 9)) + 2) // 5 + day - 1
+    doe = yoe * 365 + yoe // 4 - yoe // 100 + doy
+    return era * 146097 + doe - 719468
+
+class Clock:
+    def __init__(self, fetch, resync_interval=60 * 60 * 6, retry_interval=60, monotonic_ns=time.monotonic_ns):
+        # fetch returns an Adafruit IO time struct dict (year, mon, mday, hour, min, sec, wday)
+        self.fetch = fetch
+        self.resync_interval = resync_interval
+        self.retry_interval = retry_interval
+        self.monotonic_ns = monotonic_ns
+        # local seconds since the epoch and the monotonic time (ms) they were taken at
+        self._remote = None
+        self._synced_at = None
+        self._last_attempt = None
+        # weekday of the epoch day, taken from the synced struct
+        self._wday_offset = 0
+        # parts per million the local oscillator runs slow, corrected on every resync
+        self.skew_ppm = 0
+        # last measured error between the extrapolated and synced time (seconds)
+        self.drift = 0
+        self.syncs = 0
+        self.failures = 0
+
+    def synced(self):
+        return self._synced_at is not None
+
+    # integer milliseconds of monotonic time
+    def _ms(self):
+        return self.monotonic_ns() // 1000000
+
+    def needs_sync(self):
+        now = self._ms()
+        if self._synced_at is None or now - self._synced_at >= self.resync_interval * 1000:
+            return self._last_attempt is None or now - self._last_attempt >= self.retry_interval * 1000
+        return False
+
+    # fetch the time once and rebase the local clock on it
+    def sync(self):
+        self._last_attempt = self._ms()
+        try:
+            struct = self.fetch()
+            day = days_from_civil(struct["year"], struct["mon"], struct["mday"])
+            remote = day * 86400 + struct["hour"] * 3600 + struct["min"] * 60 + struct.get("sec", 0)
+            wday = struct["wday"]
+        except Exception as e:
+            self.failures += 1
+            print("Clock sync failed: {}".format(e))
+            return False
+
+        now = self._ms()
+        if self._synced_at is not None:
+            elapsed = now - self._synced_at
+            self.drift = remote - self.seconds()
+            # track the rate of the local oscillator once enough time has passed to measure it
+            if elapsed >= 600 * 1000:
+                skew = (remote - self._remote) * 1000000000 // elapsed - 1000000
+                if -10000 < skew < 10000:
+                    self.skew_ppm = skew
+            print("Clock resynced, drift {}s, skew {} ppm".format(self.drift, self.skew_ppm))
+        self._remote = remote
+        self._synced_at = now
+        self._wday_offset = (wday - day) % 7
+        self.syncs += 1
+        return True
+
+    # extrapolated local seconds since the epoch, an int
+    def seconds(self):
+        if self._synced_at is None:
+            return None
+        elapsed = self._ms() - self._synced_at
+        return self._remote + elapsed * (1000000 + self.skew_ppm) // 1000000000
+
+    # days since the epoch, changes at local midnight
+    def day(self):
+        seconds = self.seconds()
+        if seconds is None:
+            return None
+        return seconds // 86400
+
+    # returns weekday, hour, minute and day in the format of check_time
+    def now(self):
+        seconds = self.seconds()
+        if seconds is None:
+            return None
+        day = seconds // 86400
+        of_day = seconds % 86400
+        return {
+            "wday": (day + self._wday_offset) % 7,
+            "hour": of_day // 3600,
+            "min": of_day % 3600 // 60,
+            "sec": of_day % 60,
+            "day": day,
+        }
@@ -1,71 +1,163 @@
-from adafruit_display_text import label
-from adafruit_bitmap_font import bitmap_font
-import board
 import gc
 import time
+import board
 import busio
-from digitalio import DigitalInOut, Pull
-import neopixel
-import json
-import adafruit_apds9960.apds9960
-from adafruit_apds9960 import colorutility
+from instrument import BootProfiler
+
+# staged startup: the display and a status frame come up first, then the
+# snapshot, the sensor and the network stacks are imported and initialized and
+# the wifi connection starts while the first frame is already on the panel
+# import and init time and heap use of every stage, printed before the loop starts
+boot = BootProfiler()
+
+# --- INITIALIZE DISPLAY -----------------------------------------------
+boot.begin("display")
 from adafruit_matrixportal.matrix import Matrix
-import adafruit_requests as requests
-from adafruit_esp32spi import adafruit_esp32spi
-from adafruit_esp32spi import adafruit_esp32spi_wifimanager
 import display_manager
+from assets import AssetManager
+boot.imported()
 
-# --- SENSOR SETUP -------
-try:
-    i2c = busio.I2C(board.SCL, board.SDA)
-    sensor = adafruit_apds9960.apds9960.APDS9960(i2c)
-    sensor.enable_color = True
-    sensor_enabled=True
-    # light sensor defaults and counters
-    lux=0
-    lux_counter=0
-    #NOTE: Change lux_min to at least XX to enable light sensing mode
-    lux_min=-100
-    night_mode=False
-except:
-    print("no sensor attached")
-    sensor_enabled=False
+# MATRIX DISPLAY MANAGER
+matrix_bit_depth = 2
+matrix = Matrix(width=128, height=32, bit_depth=matrix_bit_depth, tile_rows=1)
+# sprite sheets kept in RAM up to 32 KB, colors reduced to what the matrix can show
+assets = AssetManager(budget=1024 * 32, channel_bits=matrix_bit_depth)
+display_manager = display_manager.display_manager(matrix.display, assets)
+# status frame until there is data to show
+display_manager.show_status("Connecting...")
+display_manager.refresh_display()
+boot.frame()
+print("display manager loaded")
+assets.report()
+boot.end()
 
 # --- CONSTANTS SETUP ----
-
+boot.begin("constants")
 try:
     from secrets import secrets
 except ImportError:
     print("Wifi + constants are kept in secrets.py, please add them there!")
     raise
+from predictions import PredictionEngine, train_record, empty_train, train_fields
+from predictions import DESTINATION, DESTINATION_NAME, DESTINATION_CODE, MINUTES
+from aircraft import PlanePool, PlaneIndex, AircraftHistory, plane_record, empty_plane, plane_fields
+from aircraft import FLIGHT, ALT_GEOM, HEX
+from temperature import TemperatureHistory
+from wire import WireDecoder
+boot.imported()
 
 # local Metro station
 station_code = secrets["station_code"]
+# stations and lines fetched together in one batched prediction request
+# NOTE: station_codes and train_lines are optional comma-separated entries in secrets.py
+train_stations = secrets.get("station_codes", station_code).split(",")
+train_lines = secrets.get("train_lines", "RD").split(",")
+# (station, line, group) shown on the top and bottom rows
+# on the Red line, WMATA group "2" runs toward Shady Grove and group "1" toward Glenmont
+train_rows = secrets.get("train_rows", ((station_code, "RD", "2"), (station_code, "RD", "1")))
+prediction_engine = PredictionEngine(train_stations, train_lines)
 historical_trains = [None, None]
-historical_planes = {}
+# aircraft seen recently, keyed by ICAO hex (or callsign), expired after 30 minutes
+historical_planes = AircraftHistory(capacity=100, ttl=60 * 30)
+
+# NOTE: aggregator_url is optional in secrets.py, e.g. "http://192.168.1.20:8080/sign.json"
+# when set, one request to the aggregator service (server/aggregator.py) per cycle
+# replaces the separate train, incident, weather, aircraft and time requests
+# a URL ending in .bin (e.g. ".../sign.bin") fetches the binary encoding of wire.py instead of JSON
+aggregator_url = secrets.get("aggregator_url")
+# binary payloads are decoded from one buffer reused every request
+wire_decoder = WireDecoder(1024) if aggregator_url and aggregator_url.endswith(".bin") else None
+
+# location the plane index measures distance from (defaults to the weather coordinates)
+plane_coords = secrets.get("plane coords", (secrets['dc coords x'], secrets['dc coords y']))
+plane_index = PlaneIndex(float(plane_coords[0]), float(plane_coords[1]))
+# only show planes within plane_radius km and below plane_ceiling feet
+plane_radius = 15
+plane_ceiling = 20000
+
+# plane records reused from poll to poll (set to None to allocate new planes every poll)
+plane_pool = PlanePool(capacity=200)
 
 # width of total displays in pixels
 # NOTE this width is set for 2 64x32 RGB LED Matrix panels
 # (https://www.adafruit.com/product/2278)
 width = 128
 
-# daily highest temperature
-# max_temp, day of the year
-highest_temp = [None,None]
-# daily lowest temperature
-# min_temp, day of the year
-lowest_temp = [None, None]
-# current temp (for historical)
-current_temp = []
+# observed temperatures (last 8 hours at one sample per weather refresh)
+# with min/max since local midnight and the observed trend
+temperature_history = TemperatureHistory(size=48)
+boot.end()
 
-# --- INITIALIZE DISPLAY -----------------------------------------------
+# --- WARM START -------------
+# trains and weather from before the last reboot, kept in nonvolatile memory and
+# drawn (marked stale) before the network comes up, until fresh data replaces them
+boot.begin("warm start")
+from snapshot import Snapshotter
+try:
+    import microcontroller
+    snapshot_store = microcontroller.nvm
+except (ImportError, AttributeError):
+    snapshot_store = None
+boot.imported()
+# written at most every 30 minutes to spare the flash
+snapshotter = Snapshotter(snapshot_store, min_interval=60 * 30)
+snapshot = snapshotter.load()
+weather=None
+# True while the weather shown is the restored one
+weather_stale=False
+# (local day, daily low, daily high) shown before the reboot, merged into the
+# temperature history by the first weather update of the same day
+restored_day_range=None
+if snapshot is not None:
+    for index, entry in enumerate(snapshot["trains"] or ()):
+        if entry is not None and index < len(train_rows):
+            row = train_rows[index]
+            # no receive time, so the trains are drawn as stale
+            historical_trains[index] = train_record(entry[0], entry[1], entry[2], entry[3], row[1], row[0], row[2])
+    display_manager.assign_trains([None, None], historical_trains)
+    if snapshot["weather"] is not None:
+        weather = snapshot["weather"]
+        weather_stale = True
+        display_manager.update_weather(weather, stale=True)
+        if snapshot["now"]:
+            restored_day_range = (snapshot["now"] // 86400, weather["daily_temp_min"], weather["daily_temp_max"])
+    display_manager.clear_status()
+    display_manager.refresh_display()
+    print("snapshot restored")
+boot.end()
 
-# MATRIX DISPLAY MANAGER
-matrix = Matrix(width=128, height=32, bit_depth=2, tile_rows=1)
-display_manager = display_manager.display_manager(matrix.display)
-print("display manager loaded")
+# --- SENSOR SETUP -------
+#NOTE: Change lux_min to at least XX to enable light sensing mode
+# (night mode and the panel off below lux_min, back on above lux_min + 10)
+# while it is negative light sensing is disabled and the sensor is never started
+lux_min=-100
+sensor_enabled=False
+boot.begin("sensor")
+if lux_min >= 0:
+    try:
+        import adafruit_apds9960.apds9960
+        from adafruit_apds9960 import colorutility
+        from light import LightService
+        boot.imported()
+        i2c = busio.I2C(board.SCL, board.SDA)
+        sensor = adafruit_apds9960.apds9960.APDS9960(i2c)
+        sensor.enable_color = True
+        # smoothed light level and dark state, sampled without waiting
+        light = LightService(sensor, colorutility.calculate_lux, dark_lux=lux_min, bright_lux=lux_min + 10)
+        sensor_enabled=True
+    except:
+        print("no sensor attached")
+boot.end()
 
 # --- WIFI SETUP -------------
+boot.begin("network")
+from digitalio import DigitalInOut
+import neopixel
+from adafruit_esp32spi import adafruit_esp32spi
+from adafruit_esp32spi import adafruit_esp32spi_wifimanager
+from session import FeedSession
+from cache import FeedCache
+boot.imported()
 # Initialize ESP32 Pins:
 esp32_cs = DigitalInOut(board.ESP_CS)
 esp32_ready = DigitalInOut(board.ESP_BUSY)
@@ -77,257 +169,293 @@ esp = adafruit_esp32spi.ESP_SPIcontrol(spi, esp32_cs, esp32_ready, esp32_reset)
 status_light = neopixel.NeoPixel(board.NEOPIXEL, 1, brightness=0.2)
 # Initialize wifi object
 wifi = adafruit_esp32spi_wifimanager.ESPSPI_WiFiManager(esp, secrets, status_light, attempts=5)
+# shared keep-alive session used by every fetch
+session = FeedSession(wifi, max_sockets=2)
+# parsed results of slow-changing feeds, revalidated once their TTL runs out
+# each TTL spans several of its task's base poll periods, the polls in between
+# are answered from the cache without a request
+# incidents: 2 of 3 polls while incidents are active (backed off polls miss anyway)
+# weather: every other poll, One Call data only changes about every 10 minutes
+feed_cache = FeedCache(session)
+incident_ttl = 60 * 3
+weather_ttl = 60 * 20
+# seconds before a failed weather fetch is tried again
+weather_retry = 60
 
 print("WiFi loaded")
+boot.end()
 
-gc.collect()
-
-# --- CLASSES ---
-
-class Train:
-    def __init__(self, destination, destination_name, destination_code, minutes):
-        self.destination = destination
-        self.destination_name = destination_name
-        self.destination_code = destination_code
-        self.minutes = minutes
-
-class Plane:
-    def __init__(self, flight, alt_geom, lat, lon):
-        self.flight = flight
-        self.alt_geom = alt_geom
-        self.lat = lat
-        self.lon = lon
-        self.location = (lat, lon)
-        self.emergency = None
+# join the network now, with the first frame already on the panel
+boot.begin("wifi connect")
+try:
+    wifi.connect()
+except Exception as e:
+    # the session connects again before the first request
+    print("WiFi not connected yet: {}".format(e))
+boot.end()
+
+# --- OPERATING LOOP SETUP ---
+boot.begin("loop")
+import json_stream
+from clock import Clock
+from scheduler import Scheduler
+from instrument import Instruments
+from incidents import Incident, IncidentStore, incident_fields, incidents_url
+from weather import onecall_url, compact_weather
+from polling import PollPolicy, train_period, incident_period, plane_period
+from health import HealthMonitor
+boot.imported()
+
+# wall time and heap use of every loop phase, printed as @phase lines once a minute
+instruments = Instruments()
 
-    def get_location(self):
-        return self.location
+gc.collect()
 
 # --- FUNCTIONS ---
 
-# queries WMATA API to return a dict with all unique train destinations, sorted by min
-# input is StationCode from secrets.py
-def get_trains(StationCode, historical_trains):
+# reset the radio and drop the session's pooled sockets
+def reset_wifi():
+    wifi.reset()
+    session.reset()
+
+# per-endpoint backoff, the radio is only reset when 2 endpoints fail within 2 minutes
+health = HealthMonitor(reset_wifi, reset_quorum=2)
+# trains are what the sign is for, a failing train feed backs off from one poll
+# period up to 2 minutes instead of 30 seconds up to 15 minutes
+health.add("trains", base_delay=15, max_delay=60 * 2)
+
+# queries WMATA API once for every configured station and indexes the predictions
+# returns the soonest train for each display row (station, line, group)
+def get_trains(engine, rows, historical_trains):
+    response = None
     try:
-        # query WMATA API with input StationCode
-        URL = 'https://api.wmata.com/StationPrediction.svc/json/GetPrediction/'
+        # query WMATA API with every station code, comma-separated
         payload = {'api_key': secrets['wmata api key']}
-        response = wifi.get(URL + StationCode, headers=payload)
-        json_data = response.json()
+        response = session.get(engine.url(), headers=payload)
     except Exception as e:
         print("Failed to get data, retrying\n", e)
-        wifi.reset()
-
-    # set up two train directions (A station code and B station code)
-    A_train=None
-    B_train=None
-    # check trains in json response for correct destination code prefixes
-    try:
-        for item in json_data['Trains']:
-            if item['Line'] is not "RD":
-                pass
-            # if no train and destination code prefix matches, add
-            if item['DestinationCode'][0] is "A" and A_train is None:
-                A_train = Train(item['Destination'], item['DestinationName'], item['DestinationCode'], item['Min'])
-            elif item['DestinationCode'][0] is "B" and B_train is None:
-                B_train = Train(item['Destination'], item['DestinationName'], item['DestinationCode'], item['Min'])
-            # if both trains have a train object, pass
-            else:
-                pass
-
-    except Exception as e:
-        print ("Error accessing the WMATA API: ", e)
-        pass
-
-    # merge train objects into trains array
+        health.failure("trains")
+
+    # stream trains from the json response into the (station, line, group) index
+    # on failure the index is cleared so the display falls back to historical trains
+    engine.clear()
+    if response is not None:
+        try:
+            engine.update(json_stream.iter_response(response, 'Trains', train_fields, record=empty_train))
+            instruments.sample()
+            health.success("trains")
+        except Exception as e:
+            print ("Error accessing the WMATA API: ", e)
+            health.failure("trains")
+
+    # soonest train for each display row
     # NOTE: None objects accepted, handled by update_trains function in display_manager.py
-    trains=[A_train,B_train]
-    # if train objects exist in trains array, add them to historical trains
-    if A_train is not None:
-        historical_trains[0] = A_train
-    if B_train is not None:
-        historical_trains[1] = B_train
+    trains=[]
+    for index, row in enumerate(rows):
+        train = engine.first(row[0], row[1], row[2])
+        trains.append(train)
+        # if train objects exist in trains array, add them to historical trains
+        if train is not None:
+            historical_trains[index] = train
     # print train data
     try:
         for item in trains:
-            print("{} {}: {}".format(item.destination_code, item.destination_name, item.minutes))
+            print("{} {}: {}".format(item[DESTINATION_CODE], item[DESTINATION_NAME], item[MINUTES]))
     except:
         pass
     return trains
 
-# queries WMATAI to return a dict with all relevant station incident objects\
-# input is StationCode from secrets.py, line (e.g. "RD", "YL", etc.)
-def get_train_incidents(station_code, line):
-
-    incidents = []
-    # fetch incident data from WMATA
+# queries WMATA for rail incidents and diffs them against the incident store
+# input is the store, which keeps the incidents affecting the configured lines
+# returns (new, updated, cleared) incident lists, None if the request failed
+def get_train_incidents(store):
+    # fetch incident data from WMATA (or the feed cache while it is fresh)
     try:
-        URL = 'https://api.wmata.com/Incidents.svc/json/Incidents'
         payload = {'api_key': secrets['wmata api key']}
-        response = wifi.get(URL, headers=payload)
-        json_data = response.json()
+        all_incidents = feed_cache.fetch("incidents", incidents_url, parse_incidents, incident_ttl, headers=payload)
+        health.success("incidents")
     except Exception as e:
         print("Failed to get data, retrying\n", e)
-        wifi.reset()
+        health.failure("incidents")
+        return None
 
-# check for Line impact
-    try:
-        for item in json_data['Incidents']:
-            if line in item['LinesAffected']:
-                incidents.append(item)
-    except Exception as e:
-        print("get_train_incidents Exception: {}".format(e))
+    # a cached response is the same list and yields no changes
+    return store.update(all_incidents)
 
-    return incidents
+# streams every incident from the Incidents response, cached by the feed cache
+def parse_incidents(response):
+    return list(json_stream.iter_response(response, 'Incidents', incident_fields, record=Incident))
 
 # queries local ADS-B reciever with dump1090-fa installed for flight data
-# adds unseen flights to the plane array
-# input is plane array
-def get_planes(historical_planes):
+# records flights in the aircraft history and rebuilds the plane index while parsing
+# input is aircraft history and plane index
+# returns None if the request failed, keeping the previous plane index
+def get_planes(historical_planes, plane_index):
     # set local variables
     plane_counter = 0
     planes = {}
-    json_data = None
+    response = None
     # request plane.json from local ADS-B receiver (default location for dump1090-fa)
     try:
-        response = wifi.get("http://{}/tar1090/data/aircraft.json".format(secrets['ip_address']))
-        json_data = response.json()
+        response = session.get("http://{}/tar1090/data/aircraft.json".format(secrets['ip_address']))
     except Exception as e:
         print("Failed to get data, retrying\n", e)
-        wifi.reset()
-
-    if json_data:
-    # iterate through each aircraft entry
-        for entry in json_data["aircraft"]:
-            # if flight callsign exists
-            if "flight" in entry:
-                try:
-                    new_plane = Plane(entry["flight"].strip(), entry["alt_geom"], entry["lat"], entry["lon"])
-                    # seperate emergency field as optional
-                    if "emergency" in entry:
-                        new_plane.emergency = entry["emergency"]
-                    # add to planes dict and increment counter
-                    planes[new_plane.flight] = new_plane
-                    # add to historical plane dict if not already there
-                    if entry["flight"].strip() not in historical_planes:
-                        historical_planes[new_plane.flight] = new_plane
-                        plane_counter+=1
-                except:
-                    print("couldn't add plane?")
-
-    purge_planes()
-    print("found {} new planes | {} total planes".format(plane_counter, len(historical_planes)))
+        health.failure("planes")
+        return None
+
+    # stream each aircraft entry straight into a plane record, one at a time
+    # pooled planes from the previous poll are overwritten, so the index is cleared first
+    plane_index.clear()
+    if plane_pool is not None:
+        plane_pool.reset()
+    make_plane = plane_pool.take if plane_pool is not None else empty_plane
+    if response is not None:
+        try:
+            for new_plane in json_stream.iter_response(response, "aircraft", plane_fields, record=make_plane):
+                # if flight callsign exists
+                if new_plane[FLIGHT] is not None:
+                    try:
+                        new_plane[FLIGHT] = new_plane[FLIGHT].strip()
+                        # add to planes dict and increment counter
+                        planes[new_plane[FLIGHT]] = new_plane
+                        plane_index.add(new_plane)
+                        # record in the aircraft history and count if not already there
+                        if historical_planes.seen(new_plane[HEX] or new_plane[FLIGHT], new_plane[ALT_GEOM]):
+                            plane_counter+=1
+                    except:
+                        print("couldn't add plane?")
+                elif plane_pool is not None:
+                    plane_pool.release(new_plane)
+            instruments.sample()
+            health.success("planes")
+        except Exception as e:
+            print("get_planes Exception: {}".format(e))
+            health.failure("planes")
+
+    historical_planes.expire()
+    print("found {} new planes | {} total planes | {} new in last 10 min".format(
+    plane_counter, len(historical_planes), historical_planes.new_since(60 * 10)
+    ))
     return planes
 
-def purge_planes():
-    global historical_planes
-    if len(historical_planes) >= 100:
-        historical_planes.clear()
-
-#TODO separate daily highest_lowest into new function
 # queries Openweather API to return a dict with current and 3 hr forecast weather data
 # input is latitude and longitude coordinates for weather location
 def get_weather(lat, long):
-    weather_data = {}
     try:
         # query Openweather for weather at location defined by input lat, long
-        base_URL = 'https://api.openweathermap.org/data/3.0/onecall?'
-        latitude = lat
-        longitude = long
-        units = 'imperial'
-        api_key = secrets['openweather api key']
-        exclude = 'minutely,alerts'
-        response = wifi.get(base_URL
-        +'lat='+latitude
-        +'&lon='+longitude
-        +'&exclude='+exclude
-        +'&units='+units
-        +'&appid='+api_key
-        )
-        weather_json = response.json()
-
-        # insert icon and current weather data into dict
-        weather_data["icon"] = weather_json["current"]["weather"][0]["icon"]
-        weather_data["current_temp"] = weather_json["current"]["temp"]
-        weather_data["current_feels_like"] = weather_json["current"]["feels_like"]
-        # insert daily forecast min and max temperature into dict
-        weather_data["daily_temp_min"] = weather_json["daily"][0]["temp"]["min"]
-        weather_data["daily_temp_max"] = weather_json["daily"][0]["temp"]["max"]
-        # insert next hour + 1 forecast temperature and feels like into dict
-        weather_data["hourly_next_temp"] = weather_json["hourly"][2]["temp"]
-        weather_data["hourly_feels_like"] = weather_json["hourly"][2]["feels_like"]
-
-        current_time = check_time()
-
-        # set daily highest temperature
-        global highest_temp
-        # if daily highest temperature hasn't been set or is from a previous day
-        if highest_temp[0] is None or highest_temp[1] != current_time["wday"]:
-            highest_temp[0] = weather_data["daily_temp_max"]
-            highest_temp[1] = current_time["wday"]
-            print("Daily highest temp set to {}".format(highest_temp[0]))
-        # if stored highest temp is less than new highest temp
-        elif highest_temp[0] < weather_data["daily_temp_max"]:
-            highest_temp[0] = weather_data["daily_temp_max"]
-            print("Daily highest temp set to {}".format(highest_temp[0]))
-        # if stored highest temp is greater than new highest temp
-        elif highest_temp[0] > weather_data["daily_temp_max"]:
-            weather_data["daily_temp_max"] = highest_temp[0]
-            print("Daily highest temp pulled from historical data")
-
-        # set daily lowest temperature
-        global lowest_temp
-        # if daily lowest temperature hasn't been set or is from a previous day
-        if lowest_temp[0] is None or lowest_temp[1] != current_time["wday"]:
-            lowest_temp[0] = weather_data["daily_temp_min"]
-            lowest_temp[1] = current_time["wday"]
-            print("Daily lowest temp set to {}".format(lowest_temp[0]))
-        # if daily lowest temp is greater than new lowest temp
-        elif lowest_temp[0] > weather_data["daily_temp_min"]:
-            lowest_temp[0] = weather_data["daily_temp_min"]
-            print("Daily lowest temp set to {}".format(lowest_temp[0]))
-        # if daily lowest temp is less than new lowest temp
-        elif lowest_temp[0] < weather_data["daily_temp_min"]:
-            weather_data["daily_temp_min"] = lowest_temp[0]
-            print("Daily lowest temp pulled from historical data")
-
-        # add current temp to historical array
-        global current_temp
-        current_temp.append(weather_data["current_temp"])
-        # clean up response
-        del response
-
-        # return dict with relevant data
-        return weather_data
+        URL = onecall_url(lat, long, secrets['openweather api key'])
+        # copy the cached dict, the daily high/low below adjusts it
+        weather_data = dict(feed_cache.fetch("weather", URL, parse_weather, weather_ttl))
+        health.success("weather")
 
     except Exception as e:
         print("Failed to get data, retrying\n", e)
-        wifi.reset()
-
-def check_sensor(sensor):
-    # input is APDS9960 sensor
-    # let the sensor come online
-    while not sensor.color_data_ready:
-        time.sleep(1)
-    # get color data from the sensor to calculate lux
-    r, g, b, c = sensor.color_data
-    lux_curr = round(colorutility.calculate_lux(r, g, b), 1)
-    # modify global lux variables based on current lux value
-    global lux
-    lux = lux_curr
-
-    # returns weekday, hour, and minute
+        health.failure("weather")
+        return None
+
+    # local bookkeeping after the request, its errors aren't the endpoint's
+    # return dict with relevant data
+    return observe_weather(weather_data, feed_cache.fetched_at("weather"))
+
+# records the observed temperature and adjusts the daily range and trend of a compact weather dict
+# input is the dict and the monotonic time it was fetched at (the same time is only recorded once)
+def observe_weather(weather_data, fetched_at):
+    global restored_day_range
+    today = clock.day()
+    # the daily range shown before a reboot still counts if it was today
+    if restored_day_range is not None and today is not None:
+        temperature_history.restore_day(*restored_day_range)
+        restored_day_range = None
+
+    # record the observed temperature once per fetched response
+    temperature_history.append(weather_data["current_temp"], today, fetched_at)
+
+    # never show a daily range narrower than what was observed since local midnight
+    if today is not None and temperature_history.day == today:
+        if temperature_history.day_max > weather_data["daily_temp_max"]:
+            weather_data["daily_temp_max"] = temperature_history.day_max
+        if temperature_history.day_min < weather_data["daily_temp_min"]:
+            weather_data["daily_temp_min"] = temperature_history.day_min
+
+    # trend from the observed slope and the forecast 2 hours out
+    weather_data["temp_trend"] = temperature_history.trend(
+    weather_data["hourly_next_temp"] - weather_data["current_temp"]
+    )
+    return weather_data
+
+# compacts the One Call response to the fields the display uses, cached by the feed cache
+def parse_weather(response):
+    weather_json = response.json()
+    # the full One Call document is the largest allocation of the loop
+    instruments.sample()
+    return compact_weather(weather_json)
+
+# queries the aggregator service for the sign payload (see server/aggregator.py)
+# returns the payload dict, None if the request failed
+def get_sign():
+    try:
+        response = session.get(aggregator_url)
+        if wire_decoder is not None:
+            payload = wire_decoder.read(response)
+        else:
+            payload = response.json()
+        instruments.sample()
+        if payload.get("v") != 1:
+            raise ValueError("unsupported aggregator payload version {}".format(payload.get("v")))
+        health.success("sign")
+        return payload
+    except Exception as e:
+        print("Failed to get data, retrying\n", e)
+        health.failure("sign")
+    return None
+
+# monotonic time an aggregator feed was last polled, None if it never succeeded
+def sign_received(payload, feed, now):
+    at = payload["at"].get(feed)
+    if at is None:
+        return None
+    return now - max(0, payload["now"] - at)
+
+# trains for each display row from an aggregator payload, recorded in historical trains
+def sign_trains(payload, rows, historical_trains, now):
+    received = sign_received(payload, "trains", now)
+    trains = []
+    for index, row in enumerate(rows):
+        train = None
+        entry = payload["trains"][index] if received is not None and index < len(payload["trains"]) else None
+        if entry is not None:
+            train = train_record(entry[0], entry[1], entry[2], entry[3], row[1], row[0], row[2], received)
+            historical_trains[index] = train
+        trains.append(train)
+    return trains
+
+# the aggregator's nearest aircraft as the only plane in the plane index
+def sign_planes(payload, historical_planes, plane_index):
+    plane_index.clear()
+    planes = {}
+    entry = payload["plane"]
+    if entry is not None:
+        plane = plane_record(entry[0], entry[1], entry[2], entry[3], hex=entry[4])
+        planes[plane[FLIGHT]] = plane
+        plane_index.add(plane)
+        historical_planes.seen(plane[HEX] or plane[FLIGHT], plane[ALT_GEOM])
+    historical_planes.expire()
+    return planes
+
+# queries Adafruit IO for the local time struct, used by the clock to sync
+# returns year, month, day, weekday, hour, minute and second (None on failure)
 def check_time():
     base_url = "http://io.adafruit.com/api/v2/{}/integrations/time/struct?".format(secrets["aio_username"])
     api_key = "X-AIO-Key=" + secrets["aio_key"]
     try:
-        time_struct = wifi.get(base_url + api_key)
-        time_json= time_struct.json()
+        time_struct = session.get(base_url + api_key)
+        time_json = time_struct.json()
+        health.success("time")
+        return time_json
     except Exception as e:
         print(e)
-        wifi.reset()
-        wifi.connect()
-    return (time_json)
+        health.failure("time")
+    return None
 
 def check_open(current_time, shut_off_hour):
     # SET OPENING TIME
@@ -355,73 +483,251 @@ def check_open(current_time, shut_off_hour):
 
     return True
 
+# time struct of the last aggregator payload
+def sign_time():
+    return sign_payload["time"]
+
+# local clock, synced from Adafruit IO (or the aggregator) every 6 hours and answered locally in between
+clock = Clock(check_time if aggregator_url is None else sign_time, resync_interval=60 * 60 * 6)
+
 # --- OPERATING LOOP ------------------------------------------
-# TODO use requests.Session() to open a session at the beginning of any function check
-# and use the same session for any valid requests
 loop_counter=1
-last_weather_check=None
-last_train_check=None
-last_incident_check=None
-last_plane_check=None
-last_time_check=None
 day_mode=True
-
-while True:
-    if last_time_check is None or time.monotonic() > last_time_check + 60*10:
-        current_time = check_time()
+trains=[None, None]
+# rail incidents on the displayed lines, by IncidentID
+incidents=IncidentStore(train_lines)
+planes={}
+# last aggregator payload and the time its weather was polled
+sign_payload=None
+sign_weather_at=None
+
+# poll periods chosen from each feed's data, outside service hours the feeds
+# only wake once a minute to see whether service has started
+# trains: 10s while a train is under 3 minutes out, 45s when every train is 15+ minutes out
+train_poll = PollPolicy(15, fast=10, slow=45)
+# incidents: doubles up to 10 minutes while none are active
+incident_poll = PollPolicy(60, max_period=60 * 10)
+# planes: every 2 minutes while no aircraft is close enough to show
+plane_poll = PollPolicy(60, slow=60 * 2)
+
+# each feed runs as its own periodic task, display rendering reads the latest results
+# while an endpoint's circuit is open its task keeps the last good (cached) data
+def time_task():
+    global day_mode
+    # with an aggregator the clock is synced from its payload by sign_task
+    if aggregator_url is None and clock.needs_sync() and health.allow("time"):
+        clock.sync()
+    current_time = clock.now()
+    if current_time is None:
+        return
     try:
         day_mode = check_open(current_time, 22)
-        display_manager.night_mode_toggle(day_mode)
+        update_night_mode()
     except Exception as e:
         print("Expection: {}".format(e))
         pass
 
+# night mode outside opening hours or while the room is dark
+def update_night_mode():
+    dark = sensor_enabled and light.dark
+    display_manager.night_mode_toggle(day_mode is True and not dark)
+
+# sample the light sensor if a reading is ready, never waits for one
+def light_task():
+    if light.sample():
+        display_manager.set_brightness(light.brightness)
+        update_night_mode()
+
+# a failed fetch (or an open circuit) is retried after weather_retry seconds
+# instead of waiting out the 10 minute period
+def weather_task():
+    global weather, weather_stale
+    if day_mode is not True:
+        return None
+    if not health.allow("weather"):
+        return weather_retry
+    new_weather = get_weather(secrets['dc coords x'], secrets['dc coords y'])
+    if new_weather is not None:
+        weather = new_weather
+        weather_stale = False
+        print("weather updated")
+    # update weather display component
+    display_manager.update_weather(weather, stale=weather_stale)
+    if new_weather is None:
+        return weather_retry
+    return None
+
+# adaptive feeds return the seconds until their next poll
+def train_task():
+    global trains
+    if day_mode is not True:
+        return train_poll.closed_hours()
+    if health.allow("trains"):
+        trains = get_trains(prediction_engine, train_rows, historical_trains)
+        return train_period(train_poll, trains)
+    # show historical trains while the circuit is open
+    trains = [None, None]
+    return train_poll.base_rate()
+
+# only new and updated incidents are scrolled, once
+def incident_task():
+    if day_mode is not True:
+        return incident_poll.closed_hours()
+    if health.allow("incidents"):
+        changes = get_train_incidents(incidents)
+        if changes is not None:
+            show_incidents(changes)
+    return incident_period(incident_poll, incidents)
+
+# scroll new and updated incidents, input is an incident store diff
+def show_incidents(changes):
+    new, updated, cleared = changes
+    for item in new + updated:
+        print("Desc.: {}\nStartLocation: {} | EndLocation: {}".format(
+        item.description,
+        item.start,
+        item.end
+        ))
+        display_manager.scroll_text(item.description)
+    for item in cleared:
+        print("Incident cleared: {}".format(item.description))
+
+def plane_task():
+    global planes
+    if day_mode is not True:
+        return plane_poll.closed_hours()
+    if health.allow("planes"):
+        new_planes = get_planes(historical_planes, plane_index)
+        if new_planes is not None:
+            planes = new_planes
+    return plane_period(plane_poll, plane_index.nearest(1, max_km=plane_radius, max_alt=plane_ceiling))
+
+# one aggregator request per cycle replaces the train, incident, weather, plane and time tasks
+def sign_task():
+    global sign_payload, sign_weather_at, trains, weather, weather_stale, planes
+    if health.allow("sign"):
+        payload = get_sign()
+    else:
+        payload = None
+    if payload is None:
+        # show historical trains while the aggregator is unreachable
+        trains = [None, None]
+        return train_poll.base_rate()
+    sign_payload = payload
+    if clock.needs_sync():
+        clock.sync()
+    if day_mode is not True:
+        return train_poll.closed_hours()
+
+    now = time.monotonic()
+    trains = sign_trains(payload, train_rows, historical_trains, now)
+    # the weather is only recorded and redrawn once per aggregator poll
+    if payload["weather"] is not None and payload["at"].get("weather") != sign_weather_at:
+        sign_weather_at = payload["at"].get("weather")
+        weather = observe_weather(dict(payload["weather"]), sign_received(payload, "weather", now))
+        weather_stale = False
+        display_manager.update_weather(weather)
+        print("weather updated")
+    planes = sign_planes(payload, historical_planes, plane_index)
+    if payload["incidents"] is not None:
+        show_incidents(incidents.update([Incident(*entry) for entry in payload["incidents"]]))
+    return train_period(train_poll, trains)
+
+def render_task():
     if day_mode is True:
-        # fetch weather data on start and recurring (default: 10 minutes)
-        if last_weather_check is None or time.monotonic() > last_weather_check + 60 * 10:
-            weather = get_weather(secrets['dc coords x'], secrets['dc coords y'])
-            last_weather_check = time.monotonic()
-            print("weather updated")
-            # update weather display component
-            display_manager.update_weather(weather)
-
-        # update train data (default: 15 seconds)
-        if last_train_check is None or time.monotonic() > last_train_check + 15:
-            trains = get_trains(station_code, historical_trains)
-            last_train_check = time.monotonic()
-            # update train display component
-            display_manager.assign_trains(trains, historical_trains)
-
-        # update train incident data (default: 1 minute)
-        if last_incident_check is None or time.monotonic() > last_incident_check + 60 * 1:
-            incidents = get_train_incidents(station_code, "RD")
-            if len(incidents) > 0:
-                for item in incidents:
-                    print("Desc.: {}\nStartLocation: {} | EndLocation: {}".format(
-                    item['Description'],
-                    item['StartLocationFullName'],
-                    item['EndLocationFullName']
-                    ))
-            last_incident_check = time.monotonic()
-
-        # update plane data (default: 60 seconds)
-        if last_plane_check is None or time.monotonic() > last_plane_check + 60:
-            planes = get_planes(historical_planes)
-            last_plane_check = time.monotonic()
-
-        # display top plane data every 100 loops
-        # TODO find closest plane and display when within a certain distance
-        if loop_counter % 100 == 0 and len(planes) > 0:
-            plane = planes.popitem()[1]
-            display_manager.scroll_text("Flight {}\n  Alt: {}".format(plane.flight, plane.alt_geom))
-
+        # update train display component
+        display_manager.assign_trains(trains, historical_trains)
+        # the status frame stays up until there is something to show
+        if trains[0] or trains[1] or historical_trains[0] or historical_trains[1] or weather:
+            display_manager.clear_status()
     display_manager.refresh_display()
-    # print available memory
-    print("Loop {} available memory: {} bytes".format(loop_counter, gc.mem_free()))
 
+# queue the closest plane within plane_radius and below plane_ceiling to scroll
+def scroll_task():
+    if day_mode is True:
+        nearest = plane_index.nearest(1, max_km=plane_radius, max_alt=plane_ceiling)
+        if nearest:
+            plane = nearest[0][1]
+            display_manager.scroll_text("Flight {}\n  Alt: {}".format(plane[FLIGHT], plane[ALT_GEOM]))
+
+# advance any scrolling message by one frame
+def frame_task():
+    display_manager.update_scroll()
+
+# snapshot the trains and weather on the panel for the next boot, the snapshotter
+# skips the write unless 30 minutes have passed and something changed
+# nothing is written outside service hours, the panel doesn't change then
+def snapshot_task():
+    if day_mode is not True:
+        return
+    if weather is None and historical_trains[0] is None and historical_trains[1] is None:
+        return
+    rows = []
+    for train in historical_trains:
+        # Min as received, the local countdown would make every snapshot look changed
+        rows.append(None if train is None else
+        [train[DESTINATION], train[DESTINATION_NAME], train[DESTINATION_CODE], train[MINUTES]])
+    seconds = clock.seconds()
+    snapshotter.save({
+        "v": 1,
+        "now": 0 if seconds is None else int(seconds),
+        "time": clock.now() or {},
+        "at": {},
+        "trains": rows,
+        "weather": weather,
+        "plane": None,
+        "incidents": None,
+    })
+
+def memory_task():
+    global loop_counter
     # run garbage collection
     gc.collect()
-
-    # increment loop and sleep for 10 seconds
+    # print per-phase time and memory aggregates (every 6 runs)
+    if loop_counter % 6 == 0:
+        instruments.emit()
     loop_counter+=1
-    time.sleep(10)
+    # print task cadence and socket reuse every 10 reports
+    if loop_counter % 10 == 0:
+        scheduler.report()
+        session.report()
+        health.report()
+        feed_cache.report()
+        snapshotter.report()
+        print("scroll frames: {} | dropped: {}".format(display_manager.frames, display_manager.dropped_frames))
+        print("label layouts: {} | display refreshes: {}".format(display_manager.layouts, display_manager.refreshes))
+
+scheduler = Scheduler(instruments=instruments)
+if aggregator_url:
+    # fetch the aggregator payload, first so the clock is synced (default: 15 seconds, adaptive like trains)
+    scheduler.add("sign", 15, sign_task)
+# check opening hours against the local clock (default: 1 minute)
+scheduler.add("time", 60, time_task)
+if aggregator_url is None:
+    # fetch weather data (default: 10 minutes)
+    scheduler.add("weather", 60 * 10, weather_task)
+    # update train data (default: 15 seconds, adaptive)
+    scheduler.add("trains", 15, train_task)
+    # update train incident data (default: 1 minute, adaptive)
+    scheduler.add("incidents", 60 * 1, incident_task)
+    # update plane data (default: 60 seconds, adaptive)
+    scheduler.add("planes", 60, plane_task)
+# redraw the display (default: 1 second)
+scheduler.add("render", 1, render_task)
+# queue plane data to scroll (default: ~100 loops of the old 10 second loop)
+scheduler.add("scroll", 60 * 15, scroll_task)
+# scroll animation frames (default: display_manager frame period)
+# not instrumented, it runs every frame
+scheduler.add("frame", display_manager.frame_period, frame_task, instrumented=False)
+# sample ambient light (default: 1 second)
+if sensor_enabled:
+    scheduler.add("light", 1, light_task)
+# save the warm start snapshot (default: 1 minute, written at most every 30 minutes)
+scheduler.add("snapshot", 60, snapshot_task)
+# report memory and collect garbage (default: 10 seconds)
+scheduler.add("memory", 10, memory_task, instrumented=False)
+
+boot.end()
+boot.report()
+
+scheduler.run()
@@ -4,32 +4,68 @@ import time
 import displayio
 import terminalio
 from adafruit_display_text.label import Label
-from adafruit_bitmap_font import bitmap_font
+import glyph_font
+from assets import AssetManager
+from predictions import DESTINATION, DESTINATION_CODE, countdown, is_stale
 
 cwd = ("/" + __file__).rsplit("/", 1)[0]
 
 icon_spritesheet = cwd + "/bmp/weather-icons.bmp"
 icon_width = 16
 icon_height = 16
+# Red line map, not drawn yet, loaded on first use
+line_spritesheet = cwd + "/bmp/RD line.bmp"
+
+# tile of each openweathermap icon code, rows of the sprite sheet are
+# the codes below with day icons in the left column and night icons in the right
+icon_tiles = {}
+for row, code in enumerate(("01", "02", "03", "04", "09", "10", "11", "13", "50")):
+    icon_tiles[code + "d"] = row * 2
+    icon_tiles[code + "n"] = row * 2 + 1
 
 # custom font for temperature trend indicators
-symbol_font = bitmap_font.load_font("/bdf/custom_bellota.bdf")
+# the precompiled glyph file (tools/bdf2glyphs.py) is loaded eagerly in one read,
+# the BDF (and adafruit_bitmap_font) is only loaded if it is missing
+try:
+    symbol_font = glyph_font.load_font("/bdf/custom_bellota.glf")
+except (OSError, ValueError):
+    from adafruit_bitmap_font import bitmap_font
+    symbol_font = bitmap_font.load_font("/bdf/custom_bellota.bdf")
 
 # custom colors hex codes
 metro_orange=0xf06a37
 metro_red=0xda1b30
 metro_green=0x49742a
+# minutes of predictions older than predictions.stale_after
+stale_gray=0x404040
 
-# custom scroll delay for scroll_text
+# custom scroll frame period and speed for scroll_text
 scroll_delay = 0.03
+scroll_speed = 1 / scroll_delay
+# most scroll messages waiting in the queue
+scroll_queue_size = 4
 
 class display_manager(displayio.Group):
     def __init__(
             self,
             display,
+            assets=None,
     ):
         super().__init__()
         self.display = display
+        # sprite sheets, in RAM when they fit the asset manager's budget
+        self.assets = assets if assets is not None else AssetManager()
+        self.assets.register("icons", icon_spritesheet, icon_width, icon_height)
+        self.assets.register("line", line_spritesheet, 228, 231)
+        # shadow state of what is on the panel, updates that match it are skipped
+        self._text_shadow = {}
+        self._color_shadow = {}
+        self._icon_name = None
+        self._icon_shown = False
+        # layout operations (label text changes) and display refreshes
+        self.layouts = 0
+        self.refreshes = 0
+        self._dirty = True
         # set up label groups
         self.root_group = displayio.Group()
         self.root_group.append(self)
@@ -40,6 +76,13 @@ class display_manager(displayio.Group):
         self._night_mode_group.hidden = True
         self.append(self._night_mode_group)
 
+        # create status message group, shown in place of the boards while the sign starts
+        self._status_group = displayio.Group()
+        self._status_group.hidden = True
+        self.append(self._status_group)
+        # True from show_status until clear_status, a scroll only hides it while it runs
+        self._status_shown = False
+
         # create scrolling notification group
         self._scrolling_group = displayio.Group()
         # hide scrolling group by default
@@ -82,13 +125,7 @@ class display_manager(displayio.Group):
         self.row2=24
 
         # Load the icon sprite sheet
-        icons = displayio.OnDiskBitmap(open(icon_spritesheet, "rb"))
-        self._icon_sprite = displayio.TileGrid(
-            icons,
-            pixel_shader=getattr(icons, 'pixel_shader', displayio.ColorConverter()),
-            tile_width=icon_width,
-            tile_height=icon_height
-        )
+        self._icon_sprite = self.assets.get("icons").tile_grid()
 
         # set current temperature text
         # left-middle column, top row
@@ -163,6 +200,24 @@ class display_manager(displayio.Group):
         self.scrolling_label.color = 0xFFFFFF
         self._scrolling_group.append(self.scrolling_label)
 
+        # create status label
+        # left column, top row
+        self.status_label = Label(terminalio.FONT)
+        self.status_label.x = self.col1
+        self.status_label.y = self.row1
+        self.status_label.color = metro_orange
+        self._status_group.append(self.status_label)
+
+        # scroll message queue and frame accounting
+        self._scroll_queue = []
+        self._scroll_start = None
+        self._scroll_distance = 0
+        self._day_mode = True
+        self._last_frame = None
+        self.frame_period = scroll_delay
+        self.frames = 0
+        self.dropped_frames = 0
+
         # default icon set to none
         self.set_icon(None)
 
@@ -172,21 +227,36 @@ class display_manager(displayio.Group):
         :param icon_name: The icon name returned by openweathermap
         Format is always 2 numbers followed by 'd' or 'n' as the 3rd character
         """
-        icon_map = ("01", "02", "03", "04", "09", "10", "11", "13", "50")
+        if self._icon_shown and icon_name == self._icon_name:
+            return
+        self._icon_name = icon_name
+        self._icon_shown = True
+        self._dirty = True
         if self._icon_group:
             self._icon_group.pop()
-        if icon_name is not None:
-            row = None
-            for index, icon in enumerate(icon_map):
-                if icon == icon_name[0:2]:
-                    row = index
-                    break
-            column = 0
-            if icon_name[2] == "n":
-                column = 1
-            if row is not None:
-                self._icon_sprite[0] = (row * 2) + column
-                self._icon_group.append(self._icon_sprite)
+        tile = icon_tiles.get(icon_name)
+        if tile is not None:
+            self._icon_sprite[0] = tile
+            self._icon_group.append(self._icon_sprite)
+
+    # helper functions to change a label only when the new value differs from the shadow state
+    def _set_text(self, label, text):
+        if self._text_shadow.get(label) != text:
+            label.text = text
+            self._text_shadow[label] = text
+            self.layouts += 1
+            self._dirty = True
+
+    def _set_color(self, label, color):
+        if self._color_shadow.get(label) != color:
+            label.color = color
+            self._color_shadow[label] = color
+            self._dirty = True
+
+    def _set_hidden(self, group, hidden):
+        if group.hidden != hidden:
+            group.hidden = hidden
+            self._dirty = True
 
     # helper function to assign color to minutes labels
     def get_minutes_color(self, minutes):
@@ -199,121 +269,223 @@ class display_manager(displayio.Group):
             print("Value Error: {}".format(e))
             return metro_orange
 
+    # color of a train's minutes label, gray once the prediction is stale
+    # minutes None is a historical train, shown in white while it is fresh
+    def get_train_color(self, train, minutes, now):
+        if is_stale(train, now):
+            return stale_gray
+        if minutes is None:
+            return 0xFFFFFF
+        return self.get_minutes_color(minutes)
+
     # update temperature text, trend, and max/min
-    # input is a weather dict and configuration number
-    def update_weather(self, weather):
+    # input is a weather dict, stale weather (e.g. restored from a snapshot) is drawn in gray
+    def update_weather(self, weather, stale=False):
         if weather:
             # set the icon
             self.set_icon(weather["icon"])
 
             # set the temperature
-            self.temp_text.text = "%d" % weather["current_temp"]
-            self.min_temp_text.text = "%d" % weather["daily_temp_min"]
-            self.max_temp_text.text = "%d" % weather["daily_temp_max"]
+            self._set_text(self.temp_text, "%d" % weather["current_temp"])
+            self._set_color(self.temp_text, stale_gray if stale else 0xFFFFFF)
+            self._set_text(self.min_temp_text, "%d" % weather["daily_temp_min"])
+            self._set_text(self.max_temp_text, "%d" % weather["daily_temp_max"])
 
             # set temperature trend
-            # if the temperature change is more than 1 degree
-            temp_diff_default = 1
-            temp_diff = weather["hourly_next_temp"] - weather["current_temp"]
-            if temp_diff > 0 and temp_diff > temp_diff_default:
-                #print("trending higher by {}".format(temp_diff))
+            # 1 rising, -1 falling, 0 steady (from the observed slope and the forecast)
+            temp_trend = weather.get("temp_trend")
+            if temp_trend is None:
+                # forecast only, if the temperature change is more than 1 degree
+                temp_diff = weather["hourly_next_temp"] - weather["current_temp"]
+                temp_trend = 1 if temp_diff > 1 else -1 if temp_diff < -1 else 0
+            if temp_trend > 0:
                 # comma is increase arrow
-                self.temp_trend_icon.text = ","
-                self.temp_trend_icon.color = metro_red
+                self._set_text(self.temp_trend_icon, ",")
+                self._set_color(self.temp_trend_icon, metro_red)
                 self.temp_trend_icon.y = self.row1 - 6
-                self._temp_trend_group.hidden = False
+                self._set_hidden(self._temp_trend_group, False)
 
-            elif temp_diff < 0 and abs(temp_diff) > temp_diff_default:
-                #print("trending lower by {}".format(abs(temp_diff)))
+            elif temp_trend < 0:
                 # period is decrease arrow
-                self.temp_trend_icon.text = "."
-                self.temp_trend_icon.color = 0x1e81b0
+                self._set_text(self.temp_trend_icon, ".")
+                self._set_color(self.temp_trend_icon, 0x1e81b0)
                 self.temp_trend_icon.y = self.row1 - 6
-                self._temp_trend_group.hidden = False
+                self._set_hidden(self._temp_trend_group, False)
 
             else:
-                #print("no trend at {}".format(temp_diff))
-                self._temp_trend_group.hidden = True
+                self._set_hidden(self._temp_trend_group, True)
         else:
-            self.temp_text.text = "..."
+            self._set_text(self.temp_text, "...")
 
     # update train destination text and time to arrival
-    # input is a list of train objects and display config integer
-    def assign_trains(self, trains, historical_trains):
+    # input is a list of train records and display config integer
+    # minutes are counted down locally from each prediction's receive time
+    # and drawn in gray once the prediction is stale
+    def assign_trains(self, trains, historical_trains, now=None):
+        if now is None:
+            now = time.monotonic()
         try:
             if trains[0] is not None:
-                self.top_row_train_text.text = trains[0].destination
+                minutes = countdown(trains[0], now)
+                self._set_text(self.top_row_train_text, trains[0][DESTINATION])
 
                 # if train isn't Shady Grove, set train text color to white
-                if trains[0].destination_code is not "A15":
-                    self.top_row_train_text.color = 0xFFFFFF
+                if trains[0][DESTINATION_CODE] is not "A15":
+                    self._set_color(self.top_row_train_text, 0xFFFFFF)
                 else:
-                    self.top_row_train_text.color = self.get_minutes_color(trains[0].minutes)
+                    self._set_color(self.top_row_train_text, self.get_minutes_color(minutes))
 
                 # set min and min text colors
-                self.top_row_train_min.text = trains[0].minutes
-                self.top_row_train_min.color = self.get_minutes_color(trains[0].minutes)
+                self._set_text(self.top_row_train_min, minutes)
+                self._set_color(self.top_row_train_min, self.get_train_color(trains[0], minutes, now))
 
             # no A train data
             elif historical_trains[0] is not None:
-                self.top_row_train_text.text = historical_trains[0].destination
-                self.top_row_train_min.text = historical_trains[0].minutes
-                self.top_row_train_min.color = 0xFFFFFF
+                self._set_text(self.top_row_train_text, historical_trains[0][DESTINATION])
+                self._set_text(self.top_row_train_min, countdown(historical_trains[0], now))
+                self._set_color(self.top_row_train_min, self.get_train_color(historical_trains[0], None, now))
             else:
-                self.top_row_train_min.text = "NULL"
+                self._set_text(self.top_row_train_min, "NULL")
 
             if trains[1] is not None:
-                self.bottom_row_train_text.text = trains[1].destination
+                minutes = countdown(trains[1], now)
+                self._set_text(self.bottom_row_train_text, trains[1][DESTINATION])
 
                 # if train isn't Glenmont, set train text color to white
-                if trains[1].destination_code is not "B11":
-                    self.bottom_row_train_text.color = 0xFFFFFF
+                if trains[1][DESTINATION_CODE] is not "B11":
+                    self._set_color(self.bottom_row_train_text, 0xFFFFFF)
                 else:
-                    self.bottom_row_train_text.color = self.get_minutes_color(trains[1].minutes)
+                    self._set_color(self.bottom_row_train_text, self.get_minutes_color(minutes))
 
                 # set min and min text colors
-                self.bottom_row_train_min.text = trains[1].minutes
-                self.bottom_row_train_min.color = self.get_minutes_color(trains[1].minutes)
+                self._set_text(self.bottom_row_train_min, minutes)
+                self._set_color(self.bottom_row_train_min, self.get_train_color(trains[1], minutes, now))
 
             # no B train data
             elif historical_trains[1] is not None:
-                self.bottom_row_train_text.text = historical_trains[1].destination
-                self.bottom_row_train_min.text = historical_trains[1].minutes
-                self.bottom_row_train_min.color = 0xFFFFFF
+                self._set_text(self.bottom_row_train_text, historical_trains[1][DESTINATION])
+                self._set_text(self.bottom_row_train_min, countdown(historical_trains[1], now))
+                self._set_color(self.bottom_row_train_min, self.get_train_color(historical_trains[1], None, now))
             else:
-                self.bottom_row_train_min.text = "NULL"
+                self._set_text(self.bottom_row_train_min, "NULL")
 
         except TypeError as e:
             print(e)
 
     def night_mode_toggle(self, trigger):
+        self._day_mode = trigger
+        # the night mode screen replaces a status message
+        if not trigger:
+            self._status_shown = False
+        # groups are restored when the current scroll message finishes
+        if self._scroll_start is not None:
+            return
         # night mode is activated, hide all groups
         if trigger:
-            self._weather_group.hidden = False
-            self._train_board_group.hidden = False
-            self._night_mode_group.hidden = True
+            # the boards stay hidden under a status message until clear_status
+            self._set_hidden(self._weather_group, self._status_shown)
+            self._set_hidden(self._train_board_group, self._status_shown)
+            self._set_hidden(self._night_mode_group, True)
         # night mode is deactivated, show all groups
         else:
-            self._weather_group.hidden = True
-            self._train_board_group.hidden = True
-            self._night_mode_group.hidden = False
+            self._set_hidden(self._status_group, True)
+            self._set_hidden(self._weather_group, True)
+            self._set_hidden(self._train_board_group, True)
+            self._set_hidden(self._night_mode_group, False)
+
+    # show a static message instead of the weather and train boards, e.g. "Connecting..."
+    def show_status(self, text):
+        self._set_text(self.status_label, text)
+        self._status_shown = True
+        if self._scroll_start is None:
+            self._set_hidden(self._weather_group, True)
+            self._set_hidden(self._train_board_group, True)
+            self._set_hidden(self._status_group, False)
+
+    # hide the status message and bring the boards back
+    def clear_status(self):
+        if not self._status_shown:
+            return
+        self._status_shown = False
+        self._set_hidden(self._status_group, True)
+        if self._scroll_start is None:
+            self._set_hidden(self._weather_group, not self._day_mode)
+            self._set_hidden(self._train_board_group, not self._day_mode)
+
+    # turn the panel on (1) or off (0), skipped when it is already in that state
+    # rgbmatrix has no levels in between: any other value also just turns it on
+    def set_brightness(self, brightness):
+        if getattr(self.display, "brightness", None) == brightness:
+            return
+        try:
+            self.display.brightness = brightness
+        except (AttributeError, ValueError) as e:
+            print("Brightness not set: {}".format(e))
 
+    # queue a message to scroll across the display
     # use \n newline to access bottom row
     def scroll_text(self, label_text):
+        if len(self._scroll_queue) >= scroll_queue_size:
+            self._scroll_queue.pop(0)
+        self._scroll_queue.append(label_text)
+
+    def is_scrolling(self):
+        return self._scroll_start is not None or len(self._scroll_queue) > 0
+
+    # advance the scroll by the time elapsed since it started, call once per frame
+    # returns True while a message is on screen
+    def update_scroll(self, now=None):
+        if now is None:
+            now = time.monotonic()
+        if self._scroll_start is None:
+            if not self._scroll_queue:
+                return False
+            self._start_scroll(self._scroll_queue.pop(0), now)
+            return True
+
+        # count frames that came later than the target frame period
+        elapsed = now - self._last_frame
+        if elapsed > self.frame_period * 1.5:
+            self.dropped_frames += int(elapsed / self.frame_period) - 1
+        self._last_frame = now
+        self.frames += 1
+
+        offset = int((now - self._scroll_start) * scroll_speed)
+        if offset >= self._scroll_distance:
+            self._finish_scroll()
+            return False
+        self._scrolling_group.x = self.display.width - offset
+        return True
+
+    def _start_scroll(self, label_text, now):
         self._scrolling_group.x = self.display.width
         self.scrolling_label.text = label_text
+        self._status_group.hidden = True
         self._weather_group.hidden = True
         self._train_board_group.hidden = True
         self._scrolling_group.hidden = False
+        self._scroll_distance = self.display.width + len(label_text) * 4
+        self._scroll_start = now
+        self._last_frame = now
+        self._dirty = True
 
-        for _ in range(self.display.width + len(label_text) * 4):
-            self._scrolling_group.x = self._scrolling_group.x - 1
-            time.sleep(scroll_delay)
+    def _finish_scroll(self):
         self._scrolling_group.hidden = True
-        self._weather_group.hidden = False
-        self._train_board_group.hidden = False
+        # a status message still up comes back in place of the boards
+        self._status_group.hidden = not self._status_shown
+        self._weather_group.hidden = not self._day_mode or self._status_shown
+        self._train_board_group.hidden = not self._day_mode or self._status_shown
+        self._night_mode_group.hidden = self._day_mode
+        self._scroll_start = None
+        self._dirty = True
         self.refresh_display()
 
-    # refresh the root group on the display
+    # refresh the root group on the display, only when something changed since the last refresh
+    # returns True if the display was refreshed
     def refresh_display(self):
+        if not self._dirty:
+            return False
         self.display.show(self.root_group)
+        self._dirty = False
+        self.refreshes += 1
+        return True
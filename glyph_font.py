@@ -0,0 +1,71 @@
+# Glyph font
+# loader for the compact glyph files written by tools/bdf2glyphs.py
+# the whole file is read at once and every glyph is unpacked into a bitmap when
+# the font is loaded, so a label never parses font data while the sign runs
+#
+# file layout, little endian:
+#   header  b"GLF1", glyph count (H), bounding box width, height, x offset, y offset,
+#           ascent, descent (6 b)
+#   glyph   code point (H), width, height (2 B), dx, dy, shift x, shift y (4 b)
+#           followed by height rows of ceil(width / 8) bytes, most significant bit first
+
+import struct
+import displayio
+
+try:
+    from fontio import Glyph
+except ImportError:
+    # same fields as fontio.Glyph
+    class Glyph:
+        def __init__(self, bitmap, tile_index, width, height, dx, dy, shift_x, shift_y):
+            self.bitmap = bitmap
+            self.tile_index = tile_index
+            self.width = width
+            self.height = height
+            self.dx = dx
+            self.dy = dy
+            self.shift_x = shift_x
+            self.shift_y = shift_y
+
+magic = b"GLF1"
+header_format = "<4sHbbbbbb"
+glyph_format = "<HBBbbbb"
+
+class GlyphFont:
+    def __init__(self, data, bitmap_class=displayio.Bitmap):
+        header = struct.unpack_from(header_format, data, 0)
+        if header[0] != magic:
+            raise ValueError("not a glyph font file")
+        self._bounding_box = header[2:6]
+        # read by adafruit_display_text instead of measuring glyphs
+        self.ascent = header[6]
+        self.descent = header[7]
+        self._glyphs = {}
+        offset = struct.calcsize(header_format)
+        glyph_size = struct.calcsize(glyph_format)
+        for _ in range(header[1]):
+            code_point, width, height, dx, dy, shift_x, shift_y = struct.unpack_from(glyph_format, data, offset)
+            offset += glyph_size
+            bitmap = bitmap_class(width, height, 2)
+            row_bytes = (width + 7) // 8
+            for y in range(height):
+                for x in range(width):
+                    if data[offset + (x >> 3)] & (0x80 >> (x & 7)):
+                        bitmap[x, y] = 1
+                offset += row_bytes
+            self._glyphs[code_point] = Glyph(bitmap, 0, width, height, dx, dy, shift_x, shift_y)
+
+    def get_bounding_box(self):
+        return self._bounding_box
+
+    # every glyph is already loaded
+    def load_glyphs(self, code_points):
+        pass
+
+    def get_glyph(self, code_point):
+        return self._glyphs.get(code_point)
+
+def load_font(path, bitmap_class=displayio.Bitmap):
+    with open(path, "rb") as font_file:
+        data = font_file.read()
+    return GlyphFont(data, bitmap_class)
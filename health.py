@@ -0,0 +1,119 @@
+# Health
+# per-endpoint exponential backoff and circuit breaker for feed fetches
+# one flaky endpoint only backs itself off, the radio is reset only when
+# several endpoints fail within the same window
+
+import time
+import random
+
+# circuit states
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half-open"
+
+class Endpoint:
+    def __init__(self, name, threshold=2, base_delay=30, max_delay=60 * 15, jitter=0.2):
+        self.name = name
+        # consecutive failures before the circuit opens
+        self.threshold = threshold
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.jitter = jitter
+        self.state = CLOSED
+        self.failures = 0
+        self.last_failure = None
+        self.retry_at = None
+        self.total_failures = 0
+
+    # True if a request may be sent now, an open circuit lets one trial through once its delay passes
+    def allow(self, now):
+        if self.state == OPEN and now >= self.retry_at:
+            self.state = HALF_OPEN
+            return True
+        return self.state != OPEN
+
+    def success(self):
+        self.state = CLOSED
+        self.failures = 0
+        self.retry_at = None
+
+    def failure(self, now):
+        self.failures += 1
+        self.total_failures += 1
+        self.last_failure = now
+        if self.state == HALF_OPEN or self.failures >= self.threshold:
+            # exponential backoff with jitter so endpoints don't retry in lockstep
+            delay = min(self.max_delay, self.base_delay * 2 ** max(0, self.failures - self.threshold))
+            delay *= 1 + random.uniform(-self.jitter, self.jitter)
+            self.state = OPEN
+            self.retry_at = now + delay
+
+class HealthMonitor:
+    def __init__(self, reset, reset_quorum=2, window=60 * 2, reset_cooldown=60 * 5, clock=time.monotonic):
+        # reset is called to reset the radio, e.g. wifi.reset
+        self.reset = reset
+        # failing endpoints within window seconds needed for a radio reset
+        self.reset_quorum = reset_quorum
+        self.window = window
+        self.reset_cooldown = reset_cooldown
+        self.clock = clock
+        self.endpoints = {}
+        self.resets = 0
+        self.reset_time = 0
+        self._last_reset = None
+
+    def add(self, name, **kwargs):
+        endpoint = Endpoint(name, **kwargs)
+        self.endpoints[name] = endpoint
+        return endpoint
+
+    def _endpoint(self, name):
+        endpoint = self.endpoints.get(name)
+        if endpoint is None:
+            endpoint = self.add(name)
+        return endpoint
+
+    def allow(self, name):
+        return self._endpoint(name).allow(self.clock())
+
+    def is_open(self, name):
+        return self._endpoint(name).state == OPEN
+
+    def success(self, name):
+        self._endpoint(name).success()
+
+    # record a failure, returns True if it triggered a radio reset
+    def failure(self, name):
+        now = self.clock()
+        self._endpoint(name).failure(now)
+        failing = 0
+        for endpoint in self.endpoints.values():
+            if endpoint.failures > 0 and now - endpoint.last_failure <= self.window:
+                failing += 1
+        if failing < self.reset_quorum:
+            return False
+        if self._last_reset is not None and now - self._last_reset < self.reset_cooldown:
+            return False
+        print("{} endpoints failing, resetting radio".format(failing))
+        try:
+            self.reset()
+        except Exception as e:
+            print("Radio reset failed: {}".format(e))
+        finished = self.clock()
+        self.reset_time += finished - now
+        self.resets += 1
+        self._last_reset = finished
+        # the backoff built up on the old connection starts over: every open circuit
+        # gets a trial right after the reset, and a failing trial waits base_delay again
+        for endpoint in self.endpoints.values():
+            endpoint.failures = 0
+            if endpoint.state == OPEN:
+                endpoint.retry_at = finished
+        return True
+
+    def report(self):
+        for endpoint in self.endpoints.values():
+            print("{}: {} | {} failures ({} total)".format(
+            endpoint.name, endpoint.state, endpoint.failures, endpoint.total_failures
+            ))
+        print("radio resets: {} | time lost: {:.1f}s".format(self.resets, self.reset_time))
@@ -0,0 +1,414 @@
+# Host harness
+# runs the real code.py operating loop on CPython: CircuitPython modules are
+# replaced by the stand-ins in host/stubs, every feed is answered from the
+# recorded fixtures in host/fixtures and time runs on a virtual clock
+
+import asyncio
+import contextlib
+import datetime
+import gc
+import io
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+host_dir = os.path.dirname(os.path.abspath(__file__))
+repo_dir = os.path.dirname(host_dir)
+stub_dir = os.path.join(host_dir, "stubs")
+fixture_dir = os.path.join(host_dir, "fixtures")
+
+_real_sleep = asyncio.sleep
+
+# url fragment, feed name, fixture file (None is generated)
+routes = (
+    ("GetPrediction", "trains", "wmata_predictions.json"),
+    ("Incidents.svc", "incidents", "wmata_incidents.json"),
+    ("openweathermap", "weather", "openweather_onecall.json"),
+    ("io.adafruit.com", "time", None),
+    ("aircraft.json", "planes", "aircraft.json"),
+    # server/aggregator.py payload (sign.json or sign.bin), built from the other fixtures
+    ("/sign.", "sign", None),
+)
+
+# virtual seconds a request blocks for, TLS endpoints are slower on the ESP32
+default_latency = {
+    "trains": 0.8,
+    "incidents": 0.8,
+    "weather": 1.5,
+    "time": 0.3,
+    "planes": 0.4,
+    # plain HTTP on the LAN
+    "sign": 0.2,
+}
+
+class StopReplay(Exception):
+    pass
+
+# drop the repo's modules from sys.modules, except the benchmarks and tests driving the replay
+def _forget_modules():
+    kept = (os.path.join(repo_dir, "bench"), os.path.join(repo_dir, "tests"))
+    for name, module in list(sys.modules.items()):
+        location = getattr(module, "__file__", None) or ""
+        if location.startswith(repo_dir) and not location.startswith(kept):
+            del sys.modules[name]
+
+class VirtualClock:
+    def __init__(self, stop_at=None):
+        self.now = 0.0
+        self.stop_at = stop_at
+        self._waiting = []
+        self._epoch = 0
+
+    def monotonic(self):
+        return self.now
+
+    def monotonic_ns(self):
+        return int(self.now * 1000000000)
+
+    def advance(self, seconds):
+        self.now += seconds
+
+    # blocking sleep, just moves time forward
+    def sleep(self, seconds):
+        self.advance(seconds)
+
+    # asyncio sleep, time only moves forward once every task is parked in a sleep
+    # and then jumps straight to the earliest wake up
+    async def async_sleep(self, delay, result=None):
+        wake = self.now + max(0, delay)
+        self._waiting.append(wake)
+        try:
+            while self.now < wake:
+                epoch = self._epoch
+                await _real_sleep(0)
+                await _real_sleep(0)
+                if self._epoch == epoch and wake <= min(self._waiting):
+                    self.now = wake
+        finally:
+            self._waiting.remove(wake)
+        self._epoch += 1
+        if self.stop_at is not None and self.now >= self.stop_at:
+            raise StopReplay()
+        return result
+
+class Replay:
+    def __init__(self, duration=60 * 60, start=datetime.datetime(2024, 5, 14, 7, 0), latency=None,
+    reset_time=3.0, heap_size=2000000, quiet=True, secrets=None, connect_time=0.0, nvm=None):
+        self.clock = VirtualClock(stop_at=duration)
+        self.start = start
+        self.latency = dict(default_latency)
+        if latency:
+            self.latency.update(latency)
+        self.reset_time = reset_time
+        # virtual seconds the radio takes to join the network on the first request
+        self.connect_time = connect_time
+        # microcontroller.nvm, pass the nvm of an earlier run to replay a reboot
+        self.nvm = nvm if nvm is not None else bytearray(8192)
+        # virtual time of the first frame with trains and weather, and of the first
+        # one where neither is stale (None if never)
+        self.first_frame = None
+        self.first_live_frame = None
+        # CPython objects are several times larger than CircuitPython ones, so the
+        # simulated heap is only good for spotting growth between reports
+        self.heap_size = heap_size
+        self._heap_base = 0
+        self.quiet = quiet
+        # entries added to host/secrets.py for this run, e.g. {"aggregator_url": ...}
+        self.secrets = secrets or {}
+        # server/aggregator.py instance answering "sign" requests, made on first use
+        self.aggregator = None
+        self._sign_body = None
+        self.fixtures = {}
+        for _, _, name in routes:
+            if name is not None:
+                with open(os.path.join(fixture_dir, name), "rb") as fixture:
+                    self.fixtures[name] = fixture.read()
+        # feed: [fixture names, position] served in turn, the last one repeats
+        self.sequences = {}
+        # feed: [remaining injected failures (None fails forever), virtual time they start,
+        # virtual time they stop (None never stops)]
+        self.faults = {}
+        self.requests = {}
+        self.failures = {}
+        self.bytes = {}
+        self.last_success = {}
+        # feed: [samples, total staleness, max staleness]
+        self.staleness = {}
+        # task: [runs, host seconds, max host seconds, blocked virtual seconds, max blocked, max peak allocation]
+        self.task_stats = {}
+        # virtual seconds between consecutive frames of a scrolling message
+        self.frame_intervals = []
+        self.globals = None
+        self.output = ""
+        self._patches = []
+
+    # make the next `count` requests of a feed fail (None fails every request)
+    # starting at virtual time `start`, until virtual time `until` if given
+    def fail(self, feed, count=None, start=0, until=None):
+        self.faults[feed] = [count, start, until]
+
+    # answer successive successful requests of a feed with these fixtures
+    # e.g. recorded incident payloads as incidents appear, change and clear
+    def sequence(self, feed, names):
+        for name in names:
+            if name not in self.fixtures:
+                with open(os.path.join(fixture_dir, name), "rb") as fixture:
+                    self.fixtures[name] = fixture.read()
+        self.sequences[feed] = [list(names), 0]
+
+    def heal(self, feed):
+        self.faults.pop(feed, None)
+
+    def time_struct(self):
+        now = self.start + datetime.timedelta(seconds=self.clock.now)
+        return {
+            "year": now.year, "mon": now.month, "mday": now.day,
+            "hour": now.hour, "min": now.minute, "sec": now.second,
+            "wday": (now.weekday() + 1) % 7, "yday": now.timetuple().tm_yday, "isdst": 1,
+        }
+
+    # answers a request from the fixtures, called by the adafruit_requests stand-in
+    def handle(self, method, url, headers):
+        import adafruit_requests
+        for fragment, feed, name in routes:
+            if fragment in url:
+                break
+        else:
+            raise OSError("no fixture for {}".format(url))
+        self.requests[feed] = self.requests.get(feed, 0) + 1
+        self.clock.advance(self.latency.get(feed, 0.2))
+        fault = self.faults.get(feed)
+        if fault is not None and fault[2] is not None and self.clock.now >= fault[2]:
+            del self.faults[feed]
+            fault = None
+        if fault is not None and self.clock.now >= fault[1]:
+            if fault[0] is not None:
+                fault[0] -= 1
+                if fault[0] <= 0:
+                    del self.faults[feed]
+            self.failures[feed] = self.failures.get(feed, 0) + 1
+            raise OSError("replay fault injected for {}".format(feed))
+        if feed == "sign":
+            body = self._sign_body or self._sign(url)
+            self._sign_body = None
+        elif name is None:
+            body = json.dumps(self.time_struct()).encode()
+        else:
+            body = self._fixture(feed, name)
+        self.bytes[feed] = self.bytes.get(feed, 0) + len(body)
+        self.last_success[feed] = self.clock.now
+        return adafruit_requests.Response(200, body, {"Content-Type": "application/json"})
+
+    # fixture body for a successful request, following the feed's sequence if it has one
+    def _fixture(self, feed, name):
+        if feed in self.sequences:
+            names, position = self.sequences[feed]
+            name = names[min(position, len(names) - 1)]
+            self.sequences[feed][1] = position + 1
+        return self.fixtures[name]
+
+    # virtual wall clock seconds since the epoch
+    def epoch(self):
+        return self.start.timestamp() + self.clock.now
+
+    # the aggregator polls its upstreams on the virtual clock from the same fixtures,
+    # its upstream requests are not counted as device requests
+    def _aggregator(self):
+        if self.aggregator is None:
+            import importlib.util
+            import secrets
+            spec = importlib.util.spec_from_file_location("aggregator", os.path.join(repo_dir, "server", "aggregator.py"))
+            module = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(module)
+            names = dict((feed, name) for _, feed, name in routes)
+            self.aggregator = module.Aggregator(secrets.secrets,
+            lambda feed, url, headers: self._fixture(feed, names[feed]),
+            clock=self.epoch, local_time=lambda seconds: self.time_struct())
+        self.aggregator.tick()
+        return self.aggregator
+
+    # aggregator payload in the format the URL asks for
+    def _sign(self, url):
+        aggregator = self._aggregator()
+        if url.endswith(".bin"):
+            return aggregator.wire_body(self.epoch())
+        return aggregator.body(self.epoch())
+
+    # a frame is meaningful once it shows a temperature and a train's minutes
+    # instead of the "0" placeholders, and live once neither is drawn as stale
+    def _on_show(self, group):
+        manager = group[0]
+        if self.first_live_frame is not None:
+            return
+        minutes = (manager.top_row_train_min, manager.bottom_row_train_min)
+        trains = [label for label in minutes if label.text not in ("0", "NULL")]
+        if not trains or manager.temp_text.text in ("", "..."):
+            return
+        if self.first_frame is None:
+            self.first_frame = self.clock.now
+        stale_gray = sys.modules["display_manager"].stale_gray
+        if manager.temp_text.color != stale_gray and all(label.color != stale_gray for label in trains):
+            self.first_live_frame = self.clock.now
+
+    def _patch(self, target, name, value):
+        self._patches.append((target, name, getattr(target, name, None), hasattr(target, name)))
+        setattr(target, name, value)
+
+    def _mem_free(self):
+        if tracemalloc.is_tracing():
+            return self.heap_size - (tracemalloc.get_traced_memory()[0] - self._heap_base)
+        return self.heap_size
+
+    def _measure(self, original):
+        replay = self
+
+        def run(task, now):
+            # the aggregator's own polling happens on the server, not inside the device task
+            if task.name == "sign":
+                replay._sign_body = replay._sign(replay.secrets.get("aggregator_url", ""))
+            virtual_start = replay.clock.now
+            if task.name == "frame":
+                replay._record_frame()
+            traced = tracemalloc.is_tracing()
+            if traced:
+                tracemalloc.reset_peak()
+                base = tracemalloc.get_traced_memory()[0]
+            start = time.perf_counter()
+            original(task, now)
+            host = time.perf_counter() - start
+            blocked = replay.clock.now - virtual_start
+            peak = tracemalloc.get_traced_memory()[1] - base if traced else 0
+            stats = replay.task_stats.get(task.name)
+            if stats is None:
+                stats = replay.task_stats[task.name] = [0, 0.0, 0.0, 0.0, 0.0, 0]
+            stats[0] += 1
+            stats[1] += host
+            stats[2] = max(stats[2], host)
+            stats[3] += blocked
+            stats[4] = max(stats[4], blocked)
+            stats[5] = max(stats[5], peak)
+            # sample how old each feed's data is whenever the display is redrawn
+            if task.name == "render":
+                for feed, last in replay.last_success.items():
+                    sample = replay.staleness.get(feed)
+                    if sample is None:
+                        sample = replay.staleness[feed] = [0, 0.0, 0.0]
+                    age = replay.clock.now - last
+                    sample[0] += 1
+                    sample[1] += age
+                    sample[2] = max(sample[2], age)
+        return run
+
+    # interval since the previous frame when a scroll frame is about to be drawn
+    def _record_frame(self):
+        manager = self.globals.get("display_manager")
+        if manager is not None and manager._scroll_start is not None:
+            self.frame_intervals.append(self.clock.now - manager._last_frame)
+
+    # (frames, mean, 95th percentile, max) of the scroll frame intervals in seconds, None without frames
+    def frame_stats(self):
+        intervals = sorted(self.frame_intervals)
+        if not intervals:
+            return None
+        p95 = intervals[min(len(intervals) - 1, int(len(intervals) * 0.95))]
+        return len(intervals), sum(intervals) / len(intervals), p95, intervals[-1]
+
+    def install(self):
+        for path in (repo_dir, host_dir, stub_dir):
+            sys.path.insert(0, path)
+        # modules imported before the run (e.g. by a test) bound the real clock and sleep
+        _forget_modules()
+        clock = self.clock
+        self._patch(time, "monotonic", clock.monotonic)
+        self._patch(time, "monotonic_ns", clock.monotonic_ns)
+        self._patch(time, "sleep", clock.sleep)
+        self._patch(asyncio, "sleep", clock.async_sleep)
+        self._patch(gc, "mem_free", self._mem_free)
+        import secrets
+        secrets.secrets.update(self.secrets)
+        import adafruit_requests
+        from adafruit_esp32spi import adafruit_esp32spi_wifimanager
+        from adafruit_matrixportal import matrix
+        import microcontroller
+        import scheduler
+        import instrument
+        self._patch(adafruit_requests, "handler", self.handle)
+        self._patch(adafruit_esp32spi_wifimanager, "on_reset", lambda: clock.advance(self.reset_time))
+        self._patch(adafruit_esp32spi_wifimanager, "on_connect", lambda: clock.advance(self.connect_time))
+        self._patch(matrix, "on_show", self._on_show)
+        self._patch(microcontroller, "nvm", self.nvm)
+        # boot stages take host time for their work plus virtual time for blocking I/O
+        self._patch(instrument, "boot_clock", lambda: (time.perf_counter() + clock.now) * 1000)
+        self._patch(scheduler.PeriodicTask, "run", self._measure(scheduler.PeriodicTask.run))
+
+    def uninstall(self):
+        while self._patches:
+            target, name, value, existed = self._patches.pop()
+            if existed:
+                setattr(target, name, value)
+            else:
+                delattr(target, name)
+        for path in (repo_dir, host_dir, stub_dir):
+            sys.path.remove(path)
+        # forget the modules loaded for this run so the next run starts fresh
+        _forget_modules()
+
+    # run a script (code.py by default) until the virtual duration is over
+    # returns the script's globals
+    def run(self, path=None, trace_allocations=True):
+        if path is None:
+            path = os.path.join(repo_dir, "code.py")
+        with open(path) as source:
+            code = compile(source.read(), path, "exec")
+        self.globals = {"__name__": "__main__", "__file__": path}
+        output = io.StringIO()
+        self.install()
+        if trace_allocations:
+            tracemalloc.start()
+            self._heap_base = tracemalloc.get_traced_memory()[0]
+        try:
+            with contextlib.redirect_stdout(output if self.quiet else sys.stdout):
+                exec(code, self.globals)
+        except StopReplay:
+            pass
+        finally:
+            if trace_allocations:
+                tracemalloc.stop()
+            self.uninstall()
+            self.output = output.getvalue()
+        return self.globals
+
+    def report(self):
+        print("virtual time: {:.0f}s".format(self.clock.now))
+        print("{:<10} {:>7} {:>10} {:>10} {:>10} {:>10} {:>11}".format(
+        "task", "runs", "host avg", "host max", "block avg", "block max", "peak alloc"))
+        for name, stats in self.task_stats.items():
+            print("{:<10} {:>7} {:>8.2f}ms {:>8.2f}ms {:>9.3f}s {:>9.3f}s {:>10}B".format(
+            name, stats[0], stats[1] / stats[0] * 1000, stats[2] * 1000,
+            stats[3] / stats[0], stats[4], stats[5]))
+        print("{:<10} {:>8} {:>8} {:>10} {:>13} {:>13}".format(
+        "feed", "requests", "failed", "bytes", "stale avg", "stale max"))
+        for feed in sorted(self.requests):
+            sample = self.staleness.get(feed)
+            if sample:
+                average, worst = "{:.1f}s".format(sample[1] / sample[0]), "{:.1f}s".format(sample[2])
+            else:
+                average = worst = "never"
+            print("{:<10} {:>8} {:>8} {:>10} {:>13} {:>13}".format(
+            feed, self.requests[feed], self.failures.get(feed, 0), self.bytes.get(feed, 0), average, worst))
+        manager = self.globals.get("display_manager") if self.globals else None
+        if manager is not None:
+            print("display: {} label layouts | {} refreshes | {} scroll frames | {} dropped frames".format(
+            manager.layouts, manager.refreshes, manager.frames, manager.dropped_frames))
+            stats = self.frame_stats()
+            if stats is not None:
+                print("frame interval: mean {:.1f}ms | p95 {:.1f}ms | max {:.1f}ms | target {:.1f}ms".format(
+                stats[1] * 1000, stats[2] * 1000, stats[3] * 1000, manager.frame_period * 1000))
+        print("first frame: {} | first live frame: {}".format(
+        "never" if self.first_frame is None else "{:.1f}s".format(self.first_frame),
+        "never" if self.first_live_frame is None else "{:.1f}s".format(self.first_live_frame)))
+        wifi = self.globals.get("wifi") if self.globals else None
+        if wifi is not None:
+            print("radio resets: {}".format(wifi.resets))
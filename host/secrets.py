@@ -0,0 +1,13 @@
+# placeholder secrets for running code.py on the host, nothing here is real
+secrets = {
+    "ssid": "host",
+    "password": "host",
+    "station_code": "A01",
+    "wmata api key": "host",
+    "openweather api key": "host",
+    "aio_username": "host",
+    "aio_key": "host",
+    "ip_address": "127.0.0.1",
+    "dc coords x": "38.9",
+    "dc coords y": "-77.03",
+}
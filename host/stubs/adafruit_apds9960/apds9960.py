@@ -0,0 +1,20 @@
+# host stand-in for adafruit_apds9960.apds9960
+# lux readings come from `readings`, a list of (r, g, b, c) tuples set by the harness
+
+readings = [(100, 100, 100, 300)]
+
+class APDS9960:
+    def __init__(self, i2c):
+        self.i2c = i2c
+        self.enable_color = False
+        self._index = 0
+
+    @property
+    def color_data_ready(self):
+        return True
+
+    @property
+    def color_data(self):
+        reading = readings[min(self._index, len(readings) - 1)]
+        self._index += 1
+        return reading
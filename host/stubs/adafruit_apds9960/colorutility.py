@@ -0,0 +1,4 @@
+# host stand-in for adafruit_apds9960.colorutility
+
+def calculate_lux(r, g, b):
+    return (-0.32466 * r) + (1.57837 * g) + (-0.73191 * b)
@@ -0,0 +1 @@
+# host stand-in for adafruit_bitmap_font
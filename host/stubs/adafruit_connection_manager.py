@@ -0,0 +1,21 @@
+# host stand-in for adafruit_connection_manager
+
+class SocketPool:
+    AF_INET = 2
+    SOCK_STREAM = 1
+
+    def socket(self, family=AF_INET, type=SOCK_STREAM):
+        return Socket()
+
+class Socket:
+    def close(self):
+        pass
+
+def get_radio_socketpool(radio):
+    return SocketPool()
+
+def get_radio_ssl_context(radio):
+    return None
+
+def connection_manager_close_all(socket_pool=None, release_references=False):
+    pass
@@ -0,0 +1,22 @@
+# host stand-in for adafruit_display_text.label, counts text layouts
+
+import displayio
+
+layouts = 0
+
+class Label(displayio.Group):
+    def __init__(self, font=None, text="", color=0xFFFFFF, **kwargs):
+        super().__init__(**kwargs)
+        self.font = font
+        self._text = text
+        self.color = color
+
+    @property
+    def text(self):
+        return self._text
+
+    @text.setter
+    def text(self, value):
+        global layouts
+        layouts += 1
+        self._text = value
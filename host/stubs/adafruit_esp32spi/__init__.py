@@ -0,0 +1 @@
+# host stand-in for adafruit_esp32spi
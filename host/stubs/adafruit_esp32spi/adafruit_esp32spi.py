@@ -0,0 +1,7 @@
+# host stand-in for adafruit_esp32spi.adafruit_esp32spi
+
+class ESP_SPIcontrol:
+    def __init__(self, spi, cs, ready, reset, gpio0=None):
+        self.spi = spi
+        # the radio joins the network on the first request, like after a reboot
+        self.is_connected = False
@@ -0,0 +1,23 @@
+# host stand-in for adafruit_esp32spi.adafruit_esp32spi_wifimanager
+# resets and connects take virtual time through `on_reset` and `on_connect`, set by the harness
+
+on_reset = None
+on_connect = None
+
+class ESPSPI_WiFiManager:
+    def __init__(self, esp, secrets, status_pixel=None, attempts=2):
+        self.esp = esp
+        self.secrets = secrets
+        self.attempts = attempts
+        self.resets = 0
+
+    def connect(self):
+        if on_connect is not None:
+            on_connect()
+        self.esp.is_connected = True
+
+    def reset(self):
+        self.resets += 1
+        if on_reset is not None:
+            on_reset()
+        self.esp.is_connected = False
@@ -0,0 +1,25 @@
+# host stand-in for adafruit_matrixportal.matrix
+# `on_show(group)` is called on every show, set by the harness to time the first frames
+
+on_show = None
+
+class Display:
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self.brightness = 1.0
+        self.root_group = None
+        self.shows = 0
+
+    def show(self, group):
+        self.root_group = group
+        self.shows += 1
+        if on_show is not None:
+            on_show(group)
+
+    def refresh(self, **kwargs):
+        return True
+
+class Matrix:
+    def __init__(self, width=64, height=32, bit_depth=2, tile_rows=1, **kwargs):
+        self.display = Display(width, height)
@@ -0,0 +1,77 @@
+# host stand-in for adafruit_requests
+# requests are answered by `handler(method, url, headers)`, set by the host harness,
+# sockets are opened once per host from the socket pool like the real keep-alive session
+
+import json as json_module
+
+handler = None
+
+class Response:
+    def __init__(self, status_code, body=b"", headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self._body = body
+        self.closed = False
+
+    @property
+    def content(self):
+        return self._body
+
+    @property
+    def text(self):
+        return str(self._body, "utf-8")
+
+    def json(self):
+        value = json_module.loads(self._body)
+        self.close()
+        return value
+
+    def iter_content(self, chunk_size=1, decode_unicode=False):
+        for start in range(0, len(self._body), chunk_size):
+            yield self._body[start:start + chunk_size]
+
+    def close(self):
+        self.closed = True
+
+class _FakeSSLContext:
+    def __init__(self, iface):
+        self._iface = iface
+
+class Session:
+    def __init__(self, socket_pool, ssl_context=None):
+        self._socket_pool = socket_pool
+        self._ssl_context = ssl_context
+        # host: open socket, oldest first
+        self._sockets = {}
+
+    def _get_socket(self, host):
+        sock = self._sockets.get(host)
+        if sock is not None:
+            return sock
+        while True:
+            try:
+                sock = self._socket_pool.socket(2, 1)
+                break
+            except RuntimeError:
+                # out of sockets, free the oldest idle one and retry
+                if not self._sockets:
+                    raise
+                oldest = next(iter(self._sockets))
+                self._sockets.pop(oldest).close()
+        self._sockets[host] = sock
+        return sock
+
+    def request(self, method, url, data=None, json=None, headers=None, stream=False, timeout=60):
+        host = url.split("://", 1)[-1].split("/", 1)[0]
+        self._get_socket(host)
+        try:
+            return handler(method, url, headers or {})
+        except Exception:
+            # a failed request closes its socket
+            sock = self._sockets.pop(host, None)
+            if sock is not None:
+                sock.close()
+            raise
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
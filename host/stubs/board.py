@@ -0,0 +1,4 @@
+# host stand-in for board, every pin is just its name
+
+def __getattr__(name):
+    return name
@@ -0,0 +1,10 @@
+# host stand-in for digitalio
+
+class Pull:
+    UP = "UP"
+    DOWN = "DOWN"
+
+class DigitalInOut:
+    def __init__(self, pin):
+        self.pin = pin
+        self.value = False
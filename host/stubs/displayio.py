@@ -0,0 +1,71 @@
+# host stand-in for displayio
+
+class Group(list):
+    def __init__(self, x=0, y=0, scale=1):
+        super().__init__()
+        self.x = x
+        self.y = y
+        self.scale = scale
+        self.hidden = False
+
+    # displayio groups are hashable by identity
+    __hash__ = object.__hash__
+
+    def __eq__(self, other):
+        return self is other
+
+    def __bool__(self):
+        return len(self) > 0
+
+class Bitmap:
+    def __init__(self, width, height, value_count):
+        self.width = width
+        self.height = height
+        self.value_count = value_count
+        self._pixels = bytearray(width * height)
+
+    def __getitem__(self, index):
+        if isinstance(index, tuple):
+            index = index[1] * self.width + index[0]
+        return self._pixels[index]
+
+    def __setitem__(self, index, value):
+        if isinstance(index, tuple):
+            index = index[1] * self.width + index[0]
+        self._pixels[index] = value
+
+class Palette(list):
+    def __init__(self, color_count):
+        super().__init__([0] * color_count)
+
+class ColorConverter:
+    def __init__(self, input_colorspace=None):
+        self.input_colorspace = input_colorspace
+
+class OnDiskBitmap:
+    def __init__(self, file):
+        if not hasattr(file, "read"):
+            file = open(file, "rb")
+        header = file.read(26)
+        self.width = int.from_bytes(header[18:22], "little")
+        self.height = abs(int.from_bytes(header[22:26], "little", signed=True))
+        self.pixel_shader = ColorConverter()
+
+class TileGrid:
+    def __init__(self, bitmap, pixel_shader=None, width=1, height=1, tile_width=None, tile_height=None, default_tile=0, x=0, y=0):
+        self.bitmap = bitmap
+        self.pixel_shader = pixel_shader
+        self.width = width
+        self.height = height
+        self.tile_width = tile_width
+        self.tile_height = tile_height
+        self.x = x
+        self.y = y
+        self.hidden = False
+        self._tiles = [default_tile] * (width * height)
+
+    def __getitem__(self, index):
+        return self._tiles[index]
+
+    def __setitem__(self, index, value):
+        self._tiles[index] = value
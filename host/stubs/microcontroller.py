@@ -0,0 +1,5 @@
+# host stand-in for microcontroller
+# nvm is replaced by the harness with a bytearray that outlives the run, so a
+# second run starts from what the first one wrote like a reboot would
+
+nvm = bytearray(8192)
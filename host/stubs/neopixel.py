@@ -0,0 +1,10 @@
+# host stand-in for neopixel
+
+class NeoPixel(list):
+    def __init__(self, pin, n, brightness=1.0, auto_write=True):
+        super().__init__([(0, 0, 0)] * n)
+        self.brightness = brightness
+
+    def fill(self, color):
+        for i in range(len(self)):
+            self[i] = color
@@ -0,0 +1,3 @@
+# host stand-in for terminalio
+
+FONT = "terminalio.FONT"
@@ -0,0 +1,86 @@
+# Incidents
+# WMATA rail incidents indexed by IncidentID
+# each poll is diffed against the previous one by DateUpdated, so only new,
+# updated and cleared incidents are reported instead of the whole list again
+
+incidents_url = 'https://api.wmata.com/Incidents.svc/json/Incidents'
+
+# response fields kept by the streaming parser and the Incident attribute each one fills
+incident_fields = {
+    "IncidentID": "id",
+    "DateUpdated": "updated",
+    "LinesAffected": "lines_affected",
+    "Description": "description",
+    "StartLocationFullName": "start",
+    "EndLocationFullName": "end",
+}
+
+# set of line codes from a LinesAffected string like "BL; OR; SV;"
+def parse_lines(lines_affected):
+    lines = set()
+    if lines_affected:
+        for line in lines_affected.split(";"):
+            line = line.strip()
+            if line:
+                lines.add(line)
+    return lines
+
+class Incident:
+    __slots__ = ("id", "updated", "lines_affected", "lines", "description", "start", "end")
+
+    def __init__(self, id=None, updated=None, lines_affected=None, description=None, start=None, end=None):
+        self.id = id
+        self.updated = updated
+        self.lines_affected = lines_affected
+        # parsed LinesAffected, set by the store
+        self.lines = None
+        self.description = description
+        self.start = start
+        self.end = end
+
+    # key in the store, incidents without an ID fall back to their description
+    def key(self):
+        return self.id or self.description
+
+class IncidentStore:
+    def __init__(self, lines=None):
+        # only incidents affecting one of these line codes are kept (None keeps all)
+        self.lines = set(lines) if lines is not None else None
+        # key: Incident
+        self.incidents = {}
+        self._source = None
+        self.polls = 0
+
+    def __len__(self):
+        return len(self.incidents)
+
+    def active(self):
+        return list(self.incidents.values())
+
+    def update(self, records):
+        """Replace the store with a poll's incidents and return the diff as
+        (new, updated, cleared) lists. Passing the same list object again (a
+        cached response) returns no changes without looking at it.
+        :param records: iterable of Incident records (see incident_fields)
+        """
+        if records is self._source:
+            return [], [], []
+        self._source = records
+        self.polls += 1
+        new = []
+        updated = []
+        current = {}
+        for incident in records:
+            incident.lines = parse_lines(incident.lines_affected)
+            if self.lines is not None and not (incident.lines & self.lines):
+                continue
+            key = incident.key()
+            previous = self.incidents.get(key)
+            if previous is None:
+                new.append(incident)
+            elif previous.updated != incident.updated:
+                updated.append(incident)
+            current[key] = incident
+        cleared = [incident for key, incident in self.incidents.items() if key not in current]
+        self.incidents = current
+        return new, updated, cleared
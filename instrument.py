@@ -0,0 +1,179 @@
+# Instrument
+# wall time and heap accounting for each phase of the operating loop
+# every run of a phase records its duration and gc.mem_free() before and after
+# into a ring buffer, aggregates are printed as one compact line per phase:
+#   @phase trains n=4 ms=12/15/31 free=48112 low=40960 drop=7152 err=0
+# durations are integer milliseconds and heap values bytes, cheap enough to
+# leave on in production
+# BootProfiler records the startup stages of code.py the same way, once:
+#   @boot display import=85/-8192 init=412/-12288 free=96256 at=497
+# (ms/heap change in bytes for the stage's imports and its init, ms since start)
+
+import gc
+import time
+
+# integer milliseconds, monotonic_ns keeps full resolution after days of uptime
+# where CircuitPython's float monotonic() does not
+def _ms():
+    try:
+        return time.monotonic_ns() // 1000000
+    except AttributeError:
+        return int(time.monotonic() * 1000)
+
+class PhaseStats:
+    def __init__(self, name):
+        self.name = name
+        # lowest mem_free ever seen in this phase, kept across reset()
+        self.low_water = None
+        self.reset()
+
+    # clear the aggregates of the current report window
+    def reset(self):
+        self.runs = 0
+        self.errors = 0
+        self.min_ms = None
+        self.max_ms = 0
+        self.total_ms = 0
+        self.low = None
+        self.max_drop = 0
+
+    def add(self, ms, before, low, failed):
+        self.runs += 1
+        if failed:
+            self.errors += 1
+        self.total_ms += ms
+        if self.min_ms is None or ms < self.min_ms:
+            self.min_ms = ms
+        if ms > self.max_ms:
+            self.max_ms = ms
+        if self.low is None or low < self.low:
+            self.low = low
+        if self.low_water is None or low < self.low_water:
+            self.low_water = low
+        if before - low > self.max_drop:
+            self.max_drop = before - low
+
+    def line(self):
+        return "@phase {} n={} ms={}/{}/{} free={} low={} drop={} err={}".format(
+        self.name, self.runs,
+        self.min_ms, self.total_ms // self.runs, self.max_ms,
+        self.low, self.low_water, self.max_drop, self.errors
+        )
+
+class Instruments:
+    def __init__(self, size=32):
+        self.phases = {}
+        # ring buffer of the last `size` runs: (phase, ms, free before, free after, lowest free, failed)
+        self._ring = [None] * size
+        self._next = 0
+        self.recorded = 0
+        # phase running now, after a crash this names the phase that caused it
+        self.current = None
+        self.last_failed = None
+        self._heap = hasattr(gc, "mem_free")
+        self._start = 0
+        self._before = 0
+        self._low = 0
+
+    def _free(self):
+        return gc.mem_free() if self._heap else 0
+
+    def begin(self, name):
+        self.current = name
+        self._before = self._low = self._free()
+        self._start = _ms()
+
+    # record the heap inside a phase, call after large allocations so the
+    # peak drop is seen before the memory is freed again
+    def sample(self):
+        if self.current is not None:
+            free = self._free()
+            if free < self._low:
+                self._low = free
+
+    def end(self, failed=False):
+        name = self.current
+        if name is None:
+            return
+        ms = _ms() - self._start
+        after = self._free()
+        low = min(self._low, after)
+        stats = self.phases.get(name)
+        if stats is None:
+            stats = self.phases[name] = PhaseStats(name)
+        stats.add(ms, self._before, low, failed)
+        if failed:
+            self.last_failed = name
+        self._ring[self._next] = (name, ms, self._before, after, low, failed)
+        self._next = (self._next + 1) % len(self._ring)
+        self.recorded += 1
+        self.current = None
+
+    # recorded runs, oldest first
+    def recent(self):
+        if self.recorded < len(self._ring):
+            return self._ring[:self._next]
+        return self._ring[self._next:] + self._ring[:self._next]
+
+    # lowest mem_free seen by any phase
+    def low_water(self):
+        lows = [stats.low_water for stats in self.phases.values() if stats.low_water is not None]
+        return min(lows) if lows else None
+
+    # print one line per phase that ran since the last emit, then start a new window
+    def emit(self, reset=True):
+        for stats in self.phases.values():
+            if stats.runs:
+                print(stats.line())
+                if reset:
+                    stats.reset()
+        print("@heap free={} low={} last_failed={}".format(self._free(), self.low_water(), self.last_failed))
+
+# clock of the boot profiler in milliseconds, the host harness swaps in one that
+# adds its virtual (blocking) time to host time
+boot_clock = _ms
+
+class BootProfiler:
+    """Import and init time and heap use of each startup stage, in order.
+    Call begin(name) before a stage's imports, imported() after them and end()
+    once the stage is initialized.
+    """
+    def __init__(self):
+        self.clock = boot_clock
+        self._heap = hasattr(gc, "mem_free")
+        self.started = self.clock()
+        # (name, import ms, init ms, import heap change, init heap change, free after, ms since start)
+        self.stages = []
+        # ms since start when the first frame was on the panel
+        self.first_frame = None
+        self._name = None
+
+    def _free(self):
+        return gc.mem_free() if self._heap else 0
+
+    def begin(self, name):
+        self._name = name
+        self._start = self._imported = self.clock()
+        self._before = self._after_imports = self._free()
+
+    def imported(self):
+        self._imported = self.clock()
+        self._after_imports = self._free()
+
+    def end(self):
+        now = self.clock()
+        free = self._free()
+        self.stages.append((self._name, self._imported - self._start, now - self._imported,
+        self._after_imports - self._before, free - self._after_imports, free, now - self.started))
+        self._name = None
+
+    def frame(self):
+        if self.first_frame is None:
+            self.first_frame = self.clock() - self.started
+
+    def report(self):
+        for name, import_ms, init_ms, import_heap, init_heap, free, at in self.stages:
+            print("@boot {} import={}/{} init={}/{} free={} at={}".format(
+            name, int(import_ms), import_heap, int(init_ms), init_heap, free, int(at)))
+        print("@boot first_frame={} total={}".format(
+        None if self.first_frame is None else int(self.first_frame), int(self.clock() - self.started)))
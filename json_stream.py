@@ -0,0 +1,285 @@
+# JSON Stream
+# incremental, field-selective JSON parsing for large feed responses
+# reads a response in chunks and keeps only the fields the sign uses,
+# so a full aircraft.json or WMATA document is never held in RAM
+
+# byte values used by the parser
+_QUOTE = 0x22
+_BACKSLASH = 0x5C
+_COMMA = 0x2C
+_COLON = 0x3A
+_OPEN_OBJECT = 0x7B
+_CLOSE_OBJECT = 0x7D
+_OPEN_ARRAY = 0x5B
+_CLOSE_ARRAY = 0x5D
+_WHITESPACE = b" \t\r\n"
+_DELIMITERS = b" \t\r\n,]}"
+_ESCAPES = {
+    0x22: b'"', 0x5C: b"\\", 0x2F: b"/", 0x62: b"\b",
+    0x66: b"\f", 0x6E: b"\n", 0x72: b"\r", 0x74: b"\t",
+}
+
+class _Reader:
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._buf = b""
+        self._pos = 0
+
+    # load the next non-empty chunk, returns False at the end of the stream
+    def _fill(self):
+        for chunk in self._chunks:
+            if chunk:
+                self._buf = chunk
+                self._pos = 0
+                return True
+        return False
+
+    # current byte without consuming it, -1 at the end of the stream
+    def peek(self):
+        if self._pos >= len(self._buf) and not self._fill():
+            return -1
+        return self._buf[self._pos]
+
+    def next(self):
+        c = self.peek()
+        self._pos += 1
+        return c
+
+    # skip whitespace and return the next significant byte without consuming it
+    def skip_ws(self):
+        while True:
+            c = self.peek()
+            if c == -1 or c not in _WHITESPACE:
+                return c
+            self._pos += 1
+
+    def expect(self, byte):
+        c = self.skip_ws()
+        if c != byte:
+            raise ValueError("expected {} got {}".format(chr(byte), c))
+        self._pos += 1
+
+    # read (or skip when keep is False) a string, the opening quote must be next
+    def string(self, keep=True):
+        self.expect(_QUOTE)
+        out = bytearray() if keep else None
+        self._string_body(out)
+        return str(out, "utf-8") if keep else None
+
+    # read the rest of a string after its opening quote into out (skipped when None)
+    def _string_body(self, out):
+        while True:
+            buf = self._buf
+            pos = self._pos
+            if pos >= len(buf):
+                if not self._fill():
+                    raise ValueError("unterminated string")
+                continue
+            quote = buf.find(b'"', pos)
+            escape = buf.find(b"\\", pos, quote if quote != -1 else len(buf))
+            if escape != -1:
+                if out is not None:
+                    out += buf[pos:escape]
+                self._pos = escape + 1
+                self._escape(out)
+            elif quote != -1:
+                if out is not None:
+                    out += buf[pos:quote]
+                self._pos = quote + 1
+                return
+            else:
+                if out is not None:
+                    out += buf[pos:]
+                self._pos = len(buf)
+
+    # read an object key and return its index in names (encoded keys), -1 if it isn't there
+    # a key inside the current chunk is compared in place, no string is built for it
+    def key_index(self, names):
+        self.expect(_QUOTE)
+        buf = self._buf
+        pos = self._pos
+        quote = buf.find(b'"', pos)
+        if quote != -1 and buf.find(b"\\", pos, quote) == -1:
+            self._pos = quote + 1
+            length = quote - pos
+            for index in range(len(names)):
+                name = names[index]
+                if len(name) == length and buf.startswith(name, pos):
+                    return index
+            return -1
+        # split across chunks or escaped, rare enough to read it out
+        key = bytearray()
+        self._string_body(key)
+        for index in range(len(names)):
+            if key == names[index]:
+                return index
+        return -1
+
+    def _escape(self, out):
+        c = self.next()
+        if c == 0x75:
+            code = self._hex4()
+            # combine a utf-16 surrogate pair into one code point
+            if 0xD800 <= code < 0xDC00 and self.next() == _BACKSLASH and self.next() == 0x75:
+                code = 0x10000 + ((code - 0xD800) << 10) + (self._hex4() - 0xDC00)
+            if out is not None:
+                out += chr(code).encode("utf-8")
+        elif c in _ESCAPES:
+            if out is not None:
+                out += _ESCAPES[c]
+        else:
+            raise ValueError("bad escape")
+
+    def _hex4(self):
+        return int(str(bytes([self.next() for _ in range(4)]), "ascii"), 16)
+
+    # read a number or true/false/null literal
+    def scalar(self):
+        token = bytearray()
+        while True:
+            c = self.peek()
+            if c == -1 or c in _DELIMITERS:
+                break
+            token.append(c)
+            self._pos += 1
+        if token == b"true":
+            return True
+        if token == b"false":
+            return False
+        if token == b"null":
+            return None
+        text = str(token, "ascii")
+        if b"." in token or b"e" in token or b"E" in token:
+            return float(text)
+        return int(text)
+
+    # read a whole value, building containers
+    def value(self):
+        c = self.skip_ws()
+        if c == _QUOTE:
+            return self.string()
+        if c == _OPEN_OBJECT:
+            result = {}
+            for key in self.keys():
+                result[key] = self.value()
+            return result
+        if c == _OPEN_ARRAY:
+            result = []
+            for _ in self.items():
+                result.append(self.value())
+            return result
+        return self.scalar()
+
+    # skip a whole value without allocating it
+    def skip(self):
+        c = self.skip_ws()
+        if c == _QUOTE:
+            self.string(keep=False)
+        elif c == _OPEN_OBJECT or c == _OPEN_ARRAY:
+            depth = 0
+            while True:
+                c = self.peek()
+                if c == -1:
+                    raise ValueError("unterminated container")
+                if c == _QUOTE:
+                    self.string(keep=False)
+                    continue
+                self._pos += 1
+                if c == _OPEN_OBJECT or c == _OPEN_ARRAY:
+                    depth += 1
+                elif c == _CLOSE_OBJECT or c == _CLOSE_ARRAY:
+                    depth -= 1
+                    if depth == 0:
+                        return
+        else:
+            self._skip_scalar()
+
+    # move past a number or literal to its delimiter without reading it out
+    def _skip_scalar(self):
+        while True:
+            buf = self._buf
+            pos = self._pos
+            end = len(buf)
+            while pos < end and buf[pos] not in _DELIMITERS:
+                pos += 1
+            self._pos = pos
+            if pos < end or not self._fill():
+                return
+
+    # iterate the keys of an object, the caller must read or skip each value
+    # with names (a tuple of encoded keys) each key is given as its index in names instead
+    def keys(self, names=None):
+        self.expect(_OPEN_OBJECT)
+        if self.skip_ws() == _CLOSE_OBJECT:
+            self._pos += 1
+            return
+        while True:
+            key = self.string() if names is None else self.key_index(names)
+            self.expect(_COLON)
+            yield key
+            c = self.skip_ws()
+            self._pos += 1
+            if c == _CLOSE_OBJECT:
+                return
+            if c != _COMMA:
+                raise ValueError("expected , or }")
+
+    # iterate the elements of an array, the caller must read or skip each value
+    def items(self):
+        self.expect(_OPEN_ARRAY)
+        if self.skip_ws() == _CLOSE_ARRAY:
+            self._pos += 1
+            return
+        while True:
+            yield self.peek()
+            c = self.skip_ws()
+            self._pos += 1
+            if c == _CLOSE_ARRAY:
+                return
+            if c != _COMMA:
+                raise ValueError("expected , or ]")
+
+def iter_records(chunks, array_key, fields, record=None):
+    """Yield a dict holding only the wanted fields for every object in a
+    top-level array, one record at a time.
+    :param chunks: iterable of bytes, e.g. response.iter_content(256)
+    :param array_key: top-level key of the record array, e.g. "aircraft"
+    :param fields: collection of field names to keep, or a dict of field name: attribute
+    name or list position
+    :param record: optional function returning a blank object (or list), the fields are
+    set on it as attributes (or stored at their position) and it is yielded instead of a dict
+    """
+    attributes = isinstance(fields, dict)
+    positions = attributes and isinstance(next(iter(fields.values()), None), int)
+    # keys are matched as bytes against these, a key is only decoded if it is wanted
+    wanted = tuple(fields)
+    names = tuple(field.encode("utf-8") for field in wanted)
+    targets = tuple(fields[field] for field in wanted) if attributes else wanted
+    reader = _Reader(chunks)
+    for key in reader.keys((array_key.encode("utf-8"),)):
+        if key != 0 or reader.skip_ws() != _OPEN_ARRAY:
+            reader.skip()
+            continue
+        for _ in reader.items():
+            if reader.skip_ws() != _OPEN_OBJECT:
+                reader.skip()
+                continue
+            item = {} if record is None else record()
+            for index in reader.keys(names):
+                if index == -1:
+                    reader.skip()
+                elif record is None:
+                    item[wanted[index]] = reader.value()
+                elif positions:
+                    item[targets[index]] = reader.value()
+                else:
+                    setattr(item, targets[index], reader.value())
+            yield item
+
+def iter_response(response, array_key, fields, chunk_size=256, record=None):
+    """Stream records from an adafruit_requests response, closing it when done."""
+    try:
+        for item in iter_records(response.iter_content(chunk_size), array_key, fields, record):
+            yield item
+    finally:
+        response.close()
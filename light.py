@@ -0,0 +1,65 @@
+# Light
+# ambient light service for the APDS9960 color sensor
+# sample() never waits: if no reading is ready it returns at once and the next
+# scheduler run tries again. Readings go through a small median window (drops
+# flashes like headlights) and an exponential moving average, darkness switches
+# with hysteresis. rgbmatrix brightness only turns the panel on or off, so
+# brightness follows the dark state instead of stepping with the lux
+
+from array import array
+
+class LightService:
+    def __init__(self, sensor, calculate_lux, window=5, alpha=0.2, dark_lux=5, bright_lux=15):
+        """Smoothed lux, dark state and panel brightness from an APDS9960.
+        :param calculate_lux: function (r, g, b) -> lux, e.g. colorutility.calculate_lux
+        :param dark_lux: smoothed lux below which the room counts as dark (and the panel is off)
+        :param bright_lux: smoothed lux above which a dark room counts as lit again
+        """
+        self.sensor = sensor
+        self.calculate_lux = calculate_lux
+        self.alpha = alpha
+        self.dark_lux = dark_lux
+        self.bright_lux = max(bright_lux, dark_lux)
+        self._window = array("f", [0.0] * window)
+        self._next = 0
+        self.count = 0
+        # smoothed lux, None until the first reading
+        self.lux = None
+        self.dark = False
+        # panel brightness, 1 (on) or 0 (off while the room is dark)
+        self.brightness = 1
+        self.samples = 0
+        self.not_ready = 0
+
+    def _median(self):
+        values = sorted(self._window[:self.count] if self.count < len(self._window) else self._window)
+        return values[len(values) // 2]
+
+    def sample(self):
+        """Take a reading if one is ready. Returns True when the dark state (and
+        with it the brightness) changed, i.e. when the display needs updating.
+        """
+        if not self.sensor.color_data_ready:
+            self.not_ready += 1
+            return False
+        r, g, b, _ = self.sensor.color_data
+        self.samples += 1
+        self._window[self._next] = max(0, self.calculate_lux(r, g, b))
+        self._next = (self._next + 1) % len(self._window)
+        if self.count < len(self._window):
+            self.count += 1
+        median = self._median()
+        if self.lux is None:
+            self.lux = median
+        else:
+            self.lux += self.alpha * (median - self.lux)
+
+        # separate thresholds so the panel doesn't flicker around one value
+        if not self.dark and self.lux < self.dark_lux:
+            self.dark = True
+        elif self.dark and self.lux > self.bright_lux:
+            self.dark = False
+        else:
+            return False
+        self.brightness = 0 if self.dark else 1
+        return True
@@ -0,0 +1,73 @@
+# Polling
+# adaptive poll periods chosen from the data each feed last returned
+# feed tasks return the period so the scheduler runs them again after it:
+# trains are polled faster while a train is about to arrive, incidents back off
+# while none are active and nothing is polled outside service hours
+
+from predictions import MINUTES, minutes_key
+
+class PollPolicy:
+    def __init__(self, base, fast=None, slow=None, max_period=None, closed=60):
+        # seconds between polls in the normal case
+        self.base = base
+        self.fast = fast or base
+        self.slow = slow or base
+        # ceiling for back_off()
+        self.max_period = max_period or base
+        # wake up period outside service hours, only checks whether service has started
+        self.closed = closed
+        self.period = base
+        self.changes = 0
+
+    def _set(self, period):
+        if period != self.period:
+            self.changes += 1
+            self.period = period
+        return period
+
+    def base_rate(self):
+        return self._set(self.base)
+
+    def faster(self):
+        return self._set(self.fast)
+
+    def slower(self):
+        return self._set(self.slow)
+
+    # double the period up to max_period
+    def back_off(self):
+        return self._set(min(self.max_period, self.period * 2))
+
+    def closed_hours(self):
+        return self._set(self.closed)
+
+# fast while a displayed train is under `soon` minutes out (or ARR/BRD),
+# slow once every displayed train is at least `far` minutes out
+def train_period(policy, trains, soon=3, far=15):
+    soonest = None
+    for train in trains:
+        if train is None:
+            continue
+        rank = minutes_key(train[MINUTES])
+        # 999 is an unknown Min value (e.g. "---"), no basis to change the rate
+        if rank != 999 and (soonest is None or rank < soonest):
+            soonest = rank
+    if soonest is None:
+        return policy.base_rate()
+    if soonest < soon:
+        return policy.faster()
+    if soonest >= far:
+        return policy.slower()
+    return policy.base_rate()
+
+# back off while no incidents are active, back to the base rate as soon as one is
+def incident_period(policy, incidents):
+    if incidents:
+        return policy.base_rate()
+    return policy.back_off()
+
+# slow down while no aircraft is close enough to be shown
+def plane_period(policy, nearby):
+    if nearby:
+        return policy.base_rate()
+    return policy.slower()
@@ -0,0 +1,138 @@
+# Predictions
+# batched WMATA GetPrediction for a set of stations and lines
+# one request covers every configured station, results are indexed in one pass
+# each prediction is timestamped and counted down locally between polls
+
+import time
+
+prediction_url = 'https://api.wmata.com/StationPrediction.svc/json/GetPrediction/'
+
+# train records are lists indexed by these positions, filled in place by json_stream
+# (a short list is far smaller than a class instance on CircuitPython)
+DESTINATION = 0
+DESTINATION_NAME = 1
+DESTINATION_CODE = 2
+# Min exactly as WMATA returned it
+MINUTES = 3
+LINE = 4
+STATION = 5
+GROUP = 6
+# monotonic time the prediction was received
+RECEIVED = 7
+train_size = 8
+
+# response fields kept by the streaming parser and the position each one fills
+train_fields = {
+    "LocationCode": STATION,
+    "Line": LINE,
+    "Group": GROUP,
+    "DestinationCode": DESTINATION_CODE,
+    "Destination": DESTINATION,
+    "DestinationName": DESTINATION_NAME,
+    "Min": MINUTES,
+}
+
+# seconds after which a prediction is shown as stale
+stale_after = 60 * 3
+
+# sort order for the Min field, "ARR"/"BRD" first and unknown values last
+def minutes_key(minutes):
+    if minutes == "ARR" or minutes == "BRD":
+        return 0
+    try:
+        return int(minutes)
+    except (TypeError, ValueError):
+        return 999
+
+def train_record(destination, destination_name, destination_code, minutes, line=None, station=None, group=None, received=None):
+    return [destination, destination_name, destination_code, minutes, line, station, group, received]
+
+# blank record for json_stream to fill
+def empty_train():
+    return [None] * train_size
+
+# seconds since the prediction was received
+def train_age(train, now=None):
+    if train[RECEIVED] is None:
+        return 0
+    if now is None:
+        now = time.monotonic()
+    return max(0, now - train[RECEIVED])
+
+# minutes text counted down from the received prediction, "ARR" once it reaches 0
+# "ARR"/"BRD" and unknown values are shown as received
+def countdown(train, now=None):
+    try:
+        minutes = int(train[MINUTES])
+    except (TypeError, ValueError):
+        return train[MINUTES]
+    remaining = minutes - int(train_age(train, now) // 60)
+    if remaining <= 0:
+        return "ARR"
+    return str(remaining)
+
+# a prediction without a receive time (restored from a snapshot) has an unknown age
+def is_stale(train, now=None, max_age=stale_after):
+    if train[RECEIVED] is None:
+        return True
+    return train_age(train, now) > max_age
+
+class PredictionEngine:
+    def __init__(self, stations, lines, top_n=2, clock=time.monotonic):
+        # stations are WMATA station codes (e.g. "A01"), lines are line codes (e.g. "RD")
+        self.stations = tuple(stations)
+        self.lines = tuple(lines)
+        self.top_n = top_n
+        self.clock = clock
+        # (station, line, group): list of up to top_n trains, soonest first
+        self.index = {}
+
+    # one GetPrediction request for every station
+    def url(self):
+        return prediction_url + ",".join(self.stations)
+
+    # build the index from an iterable of train records (e.g. json_stream records
+    # filled through train_fields), new predictions replace the previous ones
+    # (and their local countdown) entirely
+    # trains on other lines (including "--" and "No" passenger trains) are dropped
+    def update(self, records, now=None):
+        if now is None:
+            now = self.clock()
+        index = {}
+        for train in records:
+            if train[STATION] not in self.stations or train[LINE] not in self.lines:
+                continue
+            key = (train[STATION], train[LINE], train[GROUP])
+            trains = index.get(key)
+            if trains is None:
+                trains = index[key] = []
+            rank = minutes_key(train[MINUTES])
+            # keep the list sorted and at most top_n long
+            position = len(trains)
+            while position > 0 and minutes_key(trains[position - 1][MINUTES]) > rank:
+                position -= 1
+            if position < self.top_n:
+                train[RECEIVED] = now
+                trains.insert(position, train)
+                if len(trains) > self.top_n:
+                    trains.pop()
+        self.index = index
+        return index
+
+    # drop every prediction, e.g. after a failed request
+    def clear(self):
+        self.index = {}
+
+    # soonest trains for a station, line and direction group
+    def top(self, station, line, group, n=None):
+        trains = self.index.get((station, line, group), ())
+        if n is None:
+            return list(trains)
+        return list(trains[:n])
+
+    # soonest train for a station, line and direction group, or None
+    def first(self, station, line, group):
+        trains = self.index.get((station, line, group))
+        if trains:
+            return trains[0]
+        return None
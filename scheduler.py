@@ -0,0 +1,116 @@
+# Scheduler
+# cooperative asyncio runner for the periodic feed, render and scroll tasks
+
+import time
+import asyncio
+
+class PeriodicTask:
+    def __init__(self, name, period, callback, clock=time.monotonic, instruments=None):
+        self.name = name
+        self.period = period
+        self.callback = callback
+        self.clock = clock
+        # period used for the next run, a callback may change it by returning seconds
+        self.next_period = period
+        # optional instrument.Instruments recording each run as a phase
+        self.instruments = instruments
+        # next time the task is due (None runs on the first pass)
+        self.deadline = None
+        self.last_run = None
+        # cadence accounting
+        self.runs = 0
+        self.missed = 0
+        self.max_late = 0
+        self.interval_total = 0
+
+    # seconds until the task is due
+    def due_in(self, now):
+        if self.deadline is None:
+            return 0
+        return max(0, self.deadline - now)
+
+    # run the callback once and schedule the next deadline
+    def run(self, now):
+        if self.deadline is not None and now - self.deadline > self.max_late:
+            self.max_late = now - self.deadline
+        if self.last_run is not None:
+            self.interval_total += now - self.last_run
+        instruments = self.instruments
+        if instruments is not None:
+            instruments.begin(self.name)
+        failed = False
+        period = self.period
+        try:
+            result = self.callback()
+            # adaptive tasks return the seconds until their next run (a bool is not a period)
+            if isinstance(result, (int, float)) and not isinstance(result, bool) and result > 0:
+                period = result
+        except Exception as e:
+            failed = True
+            print("{} task exception: {}".format(self.name, e))
+        if instruments is not None:
+            instruments.end(failed)
+        self.runs += 1
+        self.last_run = now
+        self.next_period = period
+
+        # schedule from the previous deadline so the cadence doesn't drift by the task runtime
+        if self.deadline is None:
+            self.deadline = now
+        self.deadline += period
+        finished = self.clock()
+        # if the task fell a whole period behind, skip ahead instead of running back to back
+        if self.deadline <= finished:
+            skipped = int((finished - self.deadline) // period) + 1
+            self.missed += skipped
+            self.deadline += skipped * period
+
+    # average seconds between runs, compare against period to check cadence
+    def average_interval(self):
+        if self.runs < 2:
+            return None
+        return self.interval_total / (self.runs - 1)
+
+class Scheduler:
+    def __init__(self, clock=time.monotonic, sleep=asyncio.sleep, instruments=None):
+        # clock and sleep can be swapped for a simulated clock off-device
+        self.clock = clock
+        self.sleep = sleep
+        self.instruments = instruments
+        self.tasks = []
+
+    # register a callback to run every period seconds
+    # a callback returning a number of seconds runs again after that many seconds instead
+    # instrumented tasks are recorded as a phase when the scheduler has instruments
+    def add(self, name, period, callback, instrumented=True):
+        task = PeriodicTask(name, period, callback, self.clock, self.instruments if instrumented else None)
+        self.tasks.append(task)
+        return task
+
+    def get_task(self, name):
+        for task in self.tasks:
+            if task.name == name:
+                return task
+        return None
+
+    async def _run_task(self, task):
+        while True:
+            # sleep(0) still yields so other tasks get a turn
+            await self.sleep(task.due_in(self.clock()))
+            task.run(self.clock())
+
+    async def main(self):
+        await asyncio.gather(*[asyncio.create_task(self._run_task(task)) for task in self.tasks])
+
+    def run(self):
+        asyncio.run(self.main())
+
+    # print the observed cadence of every task
+    def report(self):
+        for task in self.tasks:
+            average = task.average_interval()
+            print("{}: period {}s (next {}s) | avg {} | runs {} | missed {} | max late {:.2f}s".format(
+            task.name, task.period, task.next_period,
+            "-" if average is None else "{:.2f}s".format(average),
+            task.runs, task.missed, task.max_late
+            ))
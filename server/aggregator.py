@@ -0,0 +1,282 @@
+# Aggregator
+# companion service (run on CPython, e.g. on the box running tar1090) that polls
+# WMATA, OpenWeather and tar1090 for the sign and serves one small JSON payload
+# holding only what display_manager renders: the train for each display row,
+# the compact weather, the nearest aircraft, the active incidents and the time
+# the sign then makes one plain HTTP request per cycle instead of four TLS
+# requests and their JSON parsing (set "aggregator_url" in the sign's secrets.py)
+# /sign.json serves the payload as JSON, /sign.bin in the binary encoding of wire.py
+#
+#   python server/aggregator.py --secrets secrets.py --port 8080
+#   python server/aggregator.py --secrets host/secrets.py --fixtures host/fixtures --once
+#
+# the time comes from this machine's clock, so it should run in the sign's time zone
+
+import argparse
+import json
+import os
+import runpy
+import sys
+import threading
+import time
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+repo_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if repo_dir not in sys.path:
+    sys.path.insert(0, repo_dir)
+import json_stream
+from predictions import PredictionEngine, empty_train, train_fields
+from predictions import DESTINATION, DESTINATION_NAME, DESTINATION_CODE, MINUTES
+from incidents import Incident, IncidentStore, incident_fields, incidents_url
+from aircraft import PlaneIndex, empty_plane, plane_fields, FLIGHT, ALT_GEOM, LAT, LON, HEX
+from weather import onecall_url, compact_weather
+import wire
+
+# payload layout, bumped whenever a field changes meaning
+version = 1
+
+# seconds between upstream polls
+periods = {
+    "trains": 15,
+    "incidents": 60 * 2,
+    "weather": 60 * 10,
+    "planes": 15,
+}
+
+# fixture file standing in for each upstream with --fixtures (the host harness recordings)
+fixture_names = {
+    "trains": "wmata_predictions.json",
+    "incidents": "wmata_incidents.json",
+    "weather": "openweather_onecall.json",
+    "planes": "aircraft.json",
+}
+
+# GET an upstream URL and return the body
+def http_fetch(feed, url, headers):
+    request = urllib.request.Request(url, headers=headers or {})
+    with urllib.request.urlopen(request, timeout=20) as response:
+        return response.read()
+
+# local stand-ins for the upstreams, every request returns the feed's fixture file
+def fixture_fetch(directory):
+    def fetch(feed, url, headers):
+        with open(os.path.join(directory, fixture_names[feed]), "rb") as fixture:
+            return fixture.read()
+    return fetch
+
+# Adafruit IO style time struct (year, mon, mday, hour, min, sec, wday) for epoch seconds
+def time_struct(seconds):
+    local = time.localtime(seconds)
+    return {
+        "year": local.tm_year, "mon": local.tm_mon, "mday": local.tm_mday,
+        "hour": local.tm_hour, "min": local.tm_min, "sec": local.tm_sec,
+        # Sunday is 0 like Adafruit IO
+        "wday": (local.tm_wday + 1) % 7, "yday": local.tm_yday,
+    }
+
+class Aggregator:
+    def __init__(self, secrets, fetch=http_fetch, clock=time.time, local_time=time_struct,
+    plane_radius=15, plane_ceiling=20000):
+        """Upstream state reduced to the sign payload.
+        :param secrets: the sign's secrets dict, same keys as secrets.py
+        :param fetch: function (feed, url, headers) -> response body bytes
+        :param clock: epoch seconds, polls and the payload "at" times use it
+        :param local_time: function epoch seconds -> time struct for the sign's clock
+        """
+        self.secrets = secrets
+        self.fetch = fetch
+        self.clock = clock
+        self.local_time = local_time
+        self.plane_radius = plane_radius
+        self.plane_ceiling = plane_ceiling
+        station_code = secrets["station_code"]
+        self.rows = secrets.get("train_rows", ((station_code, "RD", "2"), (station_code, "RD", "1")))
+        lines = secrets.get("train_lines", "RD").split(",")
+        self.engine = PredictionEngine(secrets.get("station_codes", station_code).split(","), lines,
+        clock=clock)
+        self.incidents = IncidentStore(lines)
+        coords = secrets.get("plane coords", (secrets["dc coords x"], secrets["dc coords y"]))
+        self.plane_index = PlaneIndex(float(coords[0]), float(coords[1]))
+        self.weather = None
+        self.plane = None
+        # feed: epoch seconds of the last successful poll
+        self.at = {}
+        # feed: epoch seconds the next poll is due
+        self._due = {}
+        self.polls = {}
+        self.failures = {}
+        # held while a poll updates the feed state and while a payload is built from it,
+        # serve() polls on its own thread while handler threads build payloads
+        self.lock = threading.Lock()
+
+    # (url, headers) of an upstream
+    def request(self, feed):
+        secrets = self.secrets
+        if feed == "trains":
+            return self.engine.url(), {"api_key": secrets["wmata api key"]}
+        if feed == "incidents":
+            return incidents_url, {"api_key": secrets["wmata api key"]}
+        if feed == "weather":
+            return onecall_url(secrets["dc coords x"], secrets["dc coords y"], secrets["openweather api key"]), None
+        url = secrets.get("tar1090_url") or "http://{}/tar1090/data/aircraft.json".format(secrets["ip_address"])
+        return url, None
+
+    # poll every upstream that is due, returns the feeds that were updated
+    def tick(self, now=None):
+        if now is None:
+            now = self.clock()
+        updated = []
+        for feed, period in periods.items():
+            if now < self._due.get(feed, 0):
+                continue
+            self._due[feed] = now + period
+            if self.poll(feed, now):
+                updated.append(feed)
+        return updated
+
+    # fetch and reduce one upstream, the previous data is kept if it fails
+    def poll(self, feed, now=None):
+        if now is None:
+            now = self.clock()
+        self.polls[feed] = self.polls.get(feed, 0) + 1
+        try:
+            url, headers = self.request(feed)
+            # the request runs unlocked, payloads keep being served meanwhile
+            body = self.fetch(feed, url, headers)
+            with self.lock:
+                if feed == "trains":
+                    self.engine.update(json_stream.iter_records((body,), "Trains", train_fields, record=empty_train), now)
+                elif feed == "incidents":
+                    self.incidents.update(list(json_stream.iter_records((body,), "Incidents", incident_fields, record=Incident)))
+                elif feed == "weather":
+                    self.weather = compact_weather(json.loads(body))
+                else:
+                    self._update_planes(body)
+                self.at[feed] = int(now)
+        except Exception as e:
+            self.failures[feed] = self.failures.get(feed, 0) + 1
+            print("{} poll failed: {}".format(feed, e))
+            return False
+        return True
+
+    def _update_planes(self, body):
+        index = self.plane_index
+        index.clear()
+        for plane in json_stream.iter_records((body,), "aircraft", plane_fields, record=empty_plane):
+            if plane[FLIGHT] is not None:
+                plane[FLIGHT] = plane[FLIGHT].strip()
+                index.add(plane)
+        nearest = index.nearest(1, max_km=self.plane_radius, max_alt=self.plane_ceiling)
+        self.plane = nearest[0][1] if nearest else None
+
+    def payload(self, now=None):
+        """The sign payload as a dict, feeds that never succeeded are None.
+        trains: per display row [destination, destination_name, destination_code, Min] or None
+        plane: [flight, alt_geom, lat, lon, hex] of the nearest shown aircraft or None
+        incidents: [IncidentID, DateUpdated, LinesAffected, Description, start, end] per incident
+        at: epoch seconds each feed was last polled successfully, now: epoch seconds of the payload
+        """
+        if now is None:
+            now = self.clock()
+        with self.lock:
+            return self._payload(now)
+
+    def _payload(self, now):
+        trains = None
+        if "trains" in self.at:
+            trains = []
+            for station, line, group in self.rows:
+                train = self.engine.first(station, line, group)
+                trains.append(None if train is None else
+                [train[DESTINATION], train[DESTINATION_NAME], train[DESTINATION_CODE], train[MINUTES]])
+        incidents = None
+        if "incidents" in self.at:
+            incidents = [[item.id, item.updated, item.lines_affected, item.description, item.start, item.end]
+            for item in self.incidents.active()]
+        plane = self.plane
+        return {
+            "v": version,
+            "now": int(now),
+            "time": self.local_time(now),
+            # a copy, the poll thread adds feeds to self.at
+            "at": dict(self.at),
+            "trains": trains,
+            "weather": self.weather,
+            "plane": None if plane is None else [plane[FLIGHT], plane[ALT_GEOM], plane[LAT], plane[LON], plane[HEX]],
+            "incidents": incidents,
+        }
+
+    def body(self, now=None):
+        return json.dumps(self.payload(now), separators=(",", ":")).encode()
+
+    # the payload in the binary encoding of wire.py
+    def wire_body(self, now=None):
+        return wire.encode(self.payload(now))
+
+    def report(self):
+        for feed in periods:
+            print("{}: {} polls | {} failed | last success {}".format(
+            feed, self.polls.get(feed, 0), self.failures.get(feed, 0), self.at.get(feed, "never")))
+
+# path: (content type, Aggregator method building the body)
+formats = {
+    "/sign.json": ("application/json", Aggregator.body),
+    "/sign.bin": (wire.content_type, Aggregator.wire_body),
+}
+
+def serve(aggregator, host="0.0.0.0", port=8080, quiet=True):
+    class Handler(BaseHTTPRequestHandler):
+        # keep-alive, the sign's session reuses its socket
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            served = formats.get(self.path.split("?", 1)[0])
+            if served is None:
+                self.send_error(404)
+                return
+            body = served[1](aggregator)
+            self.send_response(200)
+            self.send_header("Content-Type", served[0])
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            if not quiet:
+                BaseHTTPRequestHandler.log_message(self, format, *args)
+
+    def poll_forever():
+        while True:
+            aggregator.tick()
+            time.sleep(1)
+
+    threading.Thread(target=poll_forever, daemon=True).start()
+    server = ThreadingHTTPServer((host, port), Handler)
+    for path in formats:
+        print("serving http://{}:{}{}".format(host, port, path))
+    server.serve_forever()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve one compact payload to the metro sign")
+    parser.add_argument("--secrets", default="secrets.py", help="the sign's secrets.py")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--fixtures", help="answer every upstream from the recordings in this directory")
+    parser.add_argument("--once", action="store_true", help="poll every upstream once, print the payload and exit")
+    parser.add_argument("--wire", action="store_true", help="with --once, print the size of the binary encoding too")
+    parser.add_argument("--verbose", action="store_true", help="log every request")
+    args = parser.parse_args()
+
+    secrets = runpy.run_path(args.secrets)["secrets"]
+    fetch = fixture_fetch(args.fixtures) if args.fixtures else http_fetch
+    aggregator = Aggregator(secrets, fetch)
+    if args.once:
+        aggregator.tick()
+        body = aggregator.body()
+        print(body.decode())
+        print("{} bytes".format(len(body)), file=sys.stderr)
+        if args.wire:
+            print("{} bytes in the binary encoding".format(len(aggregator.wire_body())), file=sys.stderr)
+    else:
+        serve(aggregator, args.host, args.port, quiet=not args.verbose)
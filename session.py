@@ -0,0 +1,121 @@
+# Session
+# shared HTTP session for every feed fetch
+# keeps sockets open between requests (per-host keep-alive pooling in adafruit_requests)
+# so the ESP32 co-processor doesn't repeat a TLS handshake on every poll
+
+import adafruit_requests as requests
+
+try:
+    import adafruit_connection_manager
+except ImportError:
+    # older esp32spi/requests releases without connection manager
+    adafruit_connection_manager = None
+
+# socket pool and ssl context for the ESP32SPI radio
+def radio_socket_pool(esp):
+    if adafruit_connection_manager is not None:
+        return (adafruit_connection_manager.get_radio_socketpool(esp),
+        adafruit_connection_manager.get_radio_ssl_context(esp))
+    import adafruit_esp32spi.adafruit_esp32spi_socket as socket_pool
+    socket_pool.set_interface(esp)
+    return socket_pool, requests._FakeSSLContext(esp)
+
+class _CountedSocket:
+    def __init__(self, sock, pool):
+        self._sock = sock
+        self._pool = pool
+        self._closed = False
+
+    def __getattr__(self, name):
+        return getattr(self._sock, name)
+
+    def close(self):
+        if not self._closed:
+            self._closed = True
+            self._pool.open.remove(self)
+        self._sock.close()
+
+class _CountingSocketPool:
+    """Wraps a socket pool to count opened sockets and cap how many are open
+    at once. Past the cap it raises the same RuntimeError the radio raises when
+    it runs out of sockets, so adafruit_requests frees an idle socket and retries.
+    """
+    def __init__(self, pool, max_sockets):
+        self._pool = pool
+        self.max_sockets = max_sockets
+        self.open = []
+        self.opened = 0
+
+    def __getattr__(self, name):
+        return getattr(self._pool, name)
+
+    def socket(self, *args, **kwargs):
+        if len(self.open) >= self.max_sockets:
+            raise RuntimeError("Out of sockets")
+        sock = _CountedSocket(self._pool.socket(*args, **kwargs), self)
+        self.open.append(sock)
+        self.opened += 1
+        return sock
+
+    def close_all(self):
+        while self.open:
+            try:
+                self.open[0].close()
+            except Exception:
+                pass
+
+class FeedSession:
+    def __init__(self, wifi, max_sockets=2, socket_pool=None, ssl_context=None):
+        # wifi is the ESPSPI_WiFiManager, used to reconnect before requests
+        # socket_pool and ssl_context can be passed in to run against CPython sockets
+        self.wifi = wifi
+        if socket_pool is None:
+            socket_pool, ssl_context = radio_socket_pool(wifi.esp)
+        self._pool = _CountingSocketPool(socket_pool, max_sockets)
+        self._ssl_context = ssl_context
+        self._session = requests.Session(self._pool, self._ssl_context)
+        # host: [requests, new connections]
+        self.hosts = {}
+
+    def get(self, url, headers=None, **kwargs):
+        return self.request("GET", url, headers=headers, **kwargs)
+
+    def request(self, method, url, **kwargs):
+        if self.wifi is not None and not self.wifi.esp.is_connected:
+            self.wifi.connect()
+        host = url.split("://", 1)[-1].split("/", 1)[0]
+        stats = self.hosts.get(host)
+        if stats is None:
+            stats = self.hosts[host] = [0, 0]
+        opened = self._pool.opened
+        response = self._session.request(method, url, **kwargs)
+        stats[0] += 1
+        stats[1] += self._pool.opened - opened
+        return response
+
+    # drop every pooled socket, call after the radio has been reset
+    def reset(self):
+        # close through the session's connection manager so it forgets them too,
+        # a socket number it still hands out may already belong to a new socket
+        if adafruit_connection_manager is not None:
+            try:
+                adafruit_connection_manager.connection_manager_close_all(self._pool)
+            except Exception as e:
+                print("Closing managed sockets failed: {}".format(e))
+        # sockets the manager doesn't know, e.g. left over from a failed close
+        self._pool.close_all()
+        self._session = requests.Session(self._pool, self._ssl_context)
+
+    # requests served on an already open socket
+    def reused(self):
+        total = 0
+        for stats in self.hosts.values():
+            total += max(0, stats[0] - stats[1])
+        return total
+
+    def report(self):
+        for host, stats in self.hosts.items():
+            print("{}: {} requests | {} connections | {} reused".format(
+            host, stats[0], stats[1], max(0, stats[0] - stats[1])
+            ))
+        print("sockets open: {}/{}".format(len(self._pool.open), self._pool.max_sockets))
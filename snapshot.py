@@ -0,0 +1,97 @@
+# Snapshot
+# last known trains, weather (with the daily high/low shown) and local time kept
+# in nonvolatile memory (microcontroller.nvm on the Matrix Portal), so the first
+# frame after a reboot or brownout shows them, marked stale, instead of placeholders
+# flash wears out, so writes are rate limited and snapshots whose trains and weather
+# are unchanged are skipped (the time they were taken doesn't count as a change)
+#
+# layout, little endian:
+#   header   b"SS", payload length (H), checksum of the payload (H)
+#   payload  a wire.py sign payload, "now" is the local time it was taken (0 if unknown)
+
+import struct
+import time
+import wire
+
+magic = b"SS"
+header_format = "<2sHH"
+header_size = struct.calcsize(header_format)
+
+# 16 bit sum of the payload bytes, catches a write cut short by a power loss
+def checksum(data):
+    total = 0
+    for byte in data:
+        total += byte
+    return total & 0xFFFF
+
+# what a snapshot shows, compared to skip writes that would only change its time
+def content(payload):
+    return (payload["trains"], payload["weather"])
+
+class Snapshotter:
+    def __init__(self, store, min_interval=60 * 30, clock=time.monotonic):
+        """Snapshot of the sign's state in a byte store.
+        :param store: bytearray-like nonvolatile memory (microcontroller.nvm), None disables snapshots
+        :param min_interval: least seconds between writes, also the wait after a boot
+        that restored a snapshot before it is overwritten
+        """
+        self.store = store
+        self.min_interval = min_interval
+        self.clock = clock
+        self._decoder = wire.WireDecoder(512)
+        # trains and weather of the last snapshot written or loaded
+        self._last_content = None
+        self._last_write = None
+        self.writes = 0
+        self.skipped = 0
+
+    def load(self):
+        """Return the stored payload dict, or None if there is no valid snapshot."""
+        store = self.store
+        if store is None or len(store) < header_size:
+            return None
+        try:
+            name, length, total = struct.unpack(header_format, bytes(store[0:header_size]))
+            if name != magic or header_size + length > len(store):
+                return None
+            data = bytes(store[header_size:header_size + length])
+            if checksum(data) != total:
+                print("Snapshot checksum mismatch, ignored")
+                return None
+            payload = self._decoder.decode(data)
+        except Exception as e:
+            print("Snapshot not loaded: {}".format(e))
+            return None
+        self._last_content = content(payload)
+        # a reboot loop shouldn't write on every boot
+        self._last_write = self.clock()
+        return payload
+
+    def save(self, payload, now=None):
+        """Write a payload dict (see wire.encode) unless the last write was less
+        than min_interval ago or its trains and weather are unchanged. Returns True
+        if it was written.
+        """
+        if self.store is None:
+            return False
+        if now is None:
+            now = self.clock()
+        if self._last_write is not None and now - self._last_write < self.min_interval:
+            return False
+        snapshot_content = content(payload)
+        if snapshot_content == self._last_content:
+            self.skipped += 1
+            return False
+        data = wire.encode(payload)
+        if header_size + len(data) > len(self.store):
+            print("Snapshot of {} bytes doesn't fit".format(len(data)))
+            return False
+        # one write of the whole record, nvm writes are erased and programmed per page
+        self.store[0:header_size + len(data)] = struct.pack(header_format, magic, len(data), checksum(data)) + data
+        self._last_content = snapshot_content
+        self._last_write = now
+        self.writes += 1
+        return True
+
+    def report(self):
+        print("snapshot: {} writes | {} unchanged".format(self.writes, self.skipped))
@@ -0,0 +1,120 @@
+# Temperature
+# fixed-size history of observed temperatures, memory stays constant however
+# long the sign runs
+# min/max since local midnight are updated on every append and the observed
+# slope is recomputed once per sample, so reading them costs nothing
+
+import time
+from array import array
+
+class TemperatureHistory:
+    def __init__(self, size=48, trend_window=60 * 90, clock=time.monotonic):
+        self.size = size
+        # seconds of history used for the observed slope
+        self.trend_window = trend_window
+        self.clock = clock
+        # ring buffers, times are seconds since the first sample
+        self._temps = array("f", [0.0] * size)
+        self._times = array("f", [0.0] * size)
+        self._next = 0
+        self.count = 0
+        self._origin = None
+        self._last = None
+        # local day (from clock.day) the min/max belong to
+        self.day = None
+        self.day_min = None
+        self.day_max = None
+        # observed change in degrees per hour, None until there are enough samples
+        self.slope = None
+
+    def latest(self):
+        if self.count == 0:
+            return None
+        return self._temps[(self._next - 1) % self.size]
+
+    def append(self, temp, day=None, now=None):
+        """Record an observed temperature, returns False if now isn't newer than
+        the last sample (e.g. the same cached weather response twice).
+        :param day: local day number, the min/max restart when it changes (None leaves them as they are)
+        """
+        if now is None:
+            now = self.clock()
+        if self._last is not None and now <= self._last:
+            return False
+        if self._origin is None:
+            self._origin = now
+        self._last = now
+        elapsed = now - self._origin
+
+        # without a synced clock there's no local day to keep a range for
+        if day is not None:
+            if day != self.day or self.day_min is None:
+                self.day = day
+                self.day_min = self.day_max = temp
+            elif temp < self.day_min:
+                self.day_min = temp
+            elif temp > self.day_max:
+                self.day_max = temp
+
+        self._temps[self._next] = temp
+        self._times[self._next] = elapsed
+        self._next = (self._next + 1) % self.size
+        if self.count < self.size:
+            self.count += 1
+        self.slope = self._observed_slope(elapsed)
+        return True
+
+    # widen today's min/max with a range seen earlier the same day (e.g. before a reboot)
+    def restore_day(self, day, day_min, day_max):
+        if day is None or (self.day is not None and self.day != day):
+            return False
+        if self.day is None:
+            self.day = day
+            self.day_min = day_min
+            self.day_max = day_max
+        else:
+            self.day_min = min(self.day_min, day_min)
+            self.day_max = max(self.day_max, day_max)
+        return True
+
+    # least-squares slope (degrees per hour) of the samples within trend_window
+    def _observed_slope(self, newest):
+        n = 0
+        sum_t = sum_x = sum_tt = sum_tx = 0.0
+        for i in range(1, self.count + 1):
+            position = (self._next - i) % self.size
+            # hours before the newest sample keeps the sums small in single precision
+            t = (self._times[position] - newest) / 3600
+            if -t * 3600 > self.trend_window:
+                break
+            x = self._temps[position]
+            n += 1
+            sum_t += t
+            sum_x += x
+            sum_tt += t * t
+            sum_tx += t * x
+        if n < 3:
+            return None
+        denominator = n * sum_tt - sum_t * sum_t
+        if denominator == 0:
+            return None
+        return (n * sum_tx - sum_t * sum_x) / denominator
+
+    def trend(self, forecast_change=None, hours=2, threshold=1):
+        """Return 1 (rising), -1 (falling) or 0 from the expected change over the next
+        hours, the average of the observed slope and the forecast when both exist.
+        :param forecast_change: forecast temperature in `hours` minus the current one
+        """
+        changes = []
+        if self.slope is not None:
+            changes.append(self.slope * hours)
+        if forecast_change is not None:
+            changes.append(forecast_change)
+        if not changes:
+            return 0
+        change = sum(changes) / len(changes)
+        if change > threshold:
+            return 1
+        if change < -threshold:
+            return -1
+        return 0
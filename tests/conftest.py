@@ -0,0 +1,23 @@
+# Tests
+# run on CPython against the repo's modules, the CircuitPython modules they
+# import are replaced by the host stand-ins in host/stubs (see host/harness.py)
+
+import importlib
+import os
+import sys
+
+tests_dir = os.path.dirname(os.path.abspath(__file__))
+repo_dir = os.path.dirname(tests_dir)
+host_dir = os.path.join(repo_dir, "host")
+stub_dir = os.path.join(host_dir, "stubs")
+
+# code.py is the sign's program, the standard library's code module (imported
+# by pdb) is loaded first so it never resolves to it and starts the sign
+path = sys.path[:]
+sys.path[:] = [entry for entry in path if os.path.abspath(entry or ".") != repo_dir]
+importlib.import_module("code")
+sys.path[:] = path
+
+for path in (repo_dir, host_dir, stub_dir):
+    if path not in sys.path:
+        sys.path.insert(0, path)
@@ -0,0 +1,176 @@
+# server/aggregator.py payloads from the host fixtures and scripted upstreams, and the sign's aggregator mode
+
+import importlib.util
+import json
+import os
+import threading
+
+import pytest
+
+from harness import Replay, VirtualClock, fixture_dir, repo_dir
+from aircraft import FLIGHT
+from predictions import DESTINATION_CODE, MINUTES
+
+spec = importlib.util.spec_from_file_location("aggregator", os.path.join(repo_dir, "server", "aggregator.py"))
+aggregator = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(aggregator)
+
+secrets = {
+    "station_code": "A01", "wmata api key": "host", "openweather api key": "host",
+    "ip_address": "127.0.0.1", "dc coords x": "38.9", "dc coords y": "-77.03",
+}
+
+class Upstreams:
+    """fetch function answering from the fixtures, feeds in `down` fail and
+    `bodies` replaces a feed's fixture."""
+    def __init__(self):
+        self.down = set()
+        self.bodies = {}
+        self.calls = []
+
+    def __call__(self, feed, url, headers):
+        self.calls.append(feed)
+        if feed in self.down:
+            raise OSError("{} unreachable".format(feed))
+        if feed in self.bodies:
+            return self.bodies[feed]
+        with open(os.path.join(fixture_dir, aggregator.fixture_names[feed]), "rb") as fixture:
+            return fixture.read()
+
+def service(**overrides):
+    clock = VirtualClock()
+    # epoch seconds
+    clock.now = 1700000000
+    upstreams = Upstreams()
+    instance = aggregator.Aggregator(dict(secrets, **overrides), upstreams, clock=clock.monotonic,
+    local_time=lambda seconds: {"hour": 8})
+    return instance, upstreams, clock
+
+def aircraft_body(*planes):
+    return json.dumps({"now": 0, "aircraft": [
+        {"hex": hex, "flight": flight, "alt_geom": alt, "lat": lat, "lon": lon} for flight, alt, lat, lon, hex in planes
+    ]}).encode()
+
+def test_train_rows_hold_the_soonest_train_of_each_row():
+    instance, _, _ = service()
+    instance.tick()
+    trains = instance.payload()["trains"]
+    # default rows: Shady Grove (group 2) on top, Glenmont (group 1) below
+    assert trains == [["Shady Gr", "Shady Grove", "A15", "BRD"], ["Glenmont", "Glenmont", "B11", "3"]]
+
+def test_row_without_a_train_is_none():
+    instance, _, _ = service(train_rows=(("A01", "RD", "1"), ("C01", "RD", "1")))
+    instance.tick()
+    trains = instance.payload()["trains"]
+    assert trains[0][2] == "B11"
+    # C01 is not one of the polled stations, the row is empty rather than missing
+    assert trains[1] is None
+
+def test_nearest_plane_under_the_ceiling_with_a_callsign():
+    instance, upstreams, _ = service()
+    instance.tick()
+    assert instance.payload()["plane"] == ["AAL9029", 2100, 38.87, -77.04, "aa5cd6"]
+    upstreams.bodies["planes"] = aircraft_body(
+        # nearest, but above the 20000 ft ceiling
+        ("UAL1", 30000, 38.9, -77.03, "a00001"),
+        # no callsign
+        (None, 3000, 38.9, -77.031, "a00002"),
+        ("DAL2  ", 5000, 38.95, -77.03, "a00003"),
+        ("SWA3", 4000, 38.93, -77.03, "a00004"),
+        # outside the 15 km radius
+        ("JBU4", 2000, 39.2, -77.03, "a00005"),
+    )
+    instance.poll("planes")
+    assert instance.payload()["plane"] == ["SWA3", 4000, 38.93, -77.03, "a00004"]
+    upstreams.bodies["planes"] = aircraft_body(("JBU4", 2000, 39.2, -77.03, "a00005"))
+    instance.poll("planes")
+    assert instance.payload()["plane"] is None
+
+def test_failed_poll_keeps_the_data_and_its_time():
+    instance, upstreams, clock = service()
+    instance.tick()
+    polled = clock.now
+    upstreams.down.add("trains")
+    clock.now += aggregator.periods["trains"]
+    assert instance.tick() == ["planes"]
+    payload = instance.payload()
+    # the sign ages the last good trains from their own time, not the payload's
+    assert payload["at"]["trains"] == polled
+    assert payload["at"]["planes"] == clock.now
+    assert payload["now"] == clock.now
+    assert payload["trains"][0][3] == "BRD"
+    assert instance.failures == {"trains": 1}
+
+def test_feed_that_never_succeeded_is_missing():
+    instance, upstreams, _ = service()
+    upstreams.down.update(("weather", "incidents"))
+    instance.tick()
+    payload = instance.payload()
+    assert payload["weather"] is None and payload["incidents"] is None
+    assert sorted(payload["at"]) == ["planes", "trains"]
+    # failed feeds are retried on their period, not on every tick
+    instance.tick()
+    assert upstreams.calls.count("weather") == 1
+
+def test_upstream_requests_run_without_the_lock():
+    instance, upstreams, _ = service()
+    served = []
+
+    def fetch(feed, url, headers):
+        # a payload can be built while a poll waits on its upstream
+        served.append(instance.payload())
+        return upstreams(feed, url, headers)
+
+    instance.fetch = fetch
+    instance.tick()
+    assert len(served) == len(aggregator.periods)
+    assert served[0]["trains"] is None
+
+def test_poll_updates_the_state_under_the_lock():
+    instance, _, _ = service()
+    done = threading.Event()
+    with instance.lock:
+        worker = threading.Thread(target=lambda: (instance.poll("trains"), done.set()))
+        worker.start()
+        # the response is fetched but not applied while a payload is being built
+        assert not done.wait(0.2)
+        assert "trains" not in instance.at
+        assert instance.engine.index == {}
+    worker.join(5)
+    assert done.is_set()
+    assert "trains" in instance.at
+
+def test_payload_is_a_snapshot_of_the_feed_times():
+    instance, _, clock = service()
+    instance.poll("trains")
+    payload = instance.payload()
+    clock.now += 15
+    instance.poll("planes")
+    assert list(payload["at"]) == ["trains"]
+
+@pytest.mark.parametrize("path", ("sign.json", "sign.bin"))
+def test_sign_shows_the_aggregator_payload(path):
+    replay = Replay(duration=60 * 10, secrets={"aggregator_url": "http://127.0.0.1:8080/" + path})
+    globals = replay.run(trace_allocations=False)
+    # one request per cycle replaces every direct feed
+    assert set(replay.requests) == {"sign"}
+    assert replay.requests["sign"] >= 60 * 10 / 15 - 1
+    assert replay.first_frame is not None
+    assert globals["clock"].now() is not None
+    trains = globals["trains"]
+    assert [train[DESTINATION_CODE] for train in trains] == ["A15", "B11"]
+    assert trains[0][MINUTES] == "BRD"
+    manager = globals["display_manager"]
+    assert manager.top_row_train_min.text == "BRD"
+    assert globals["weather"] is not None
+    assert manager.temp_text.text != ""
+    assert [plane[FLIGHT] for plane in globals["planes"].values()] == ["AAL9029"]
+
+def test_sign_keeps_historical_trains_while_the_aggregator_is_down():
+    replay = Replay(duration=60 * 5, secrets={"aggregator_url": "http://127.0.0.1:8080/sign.json"})
+    replay.fail("sign", start=60 * 2)
+    globals = replay.run(trace_allocations=False)
+    assert replay.failures["sign"] > 0
+    assert globals["trains"] == [None, None]
+    assert [train[DESTINATION_CODE] for train in globals["historical_trains"]] == ["A15", "B11"]
+    assert globals["health"].is_open("sign")
@@ -0,0 +1,66 @@
+# AircraftHistory capacity bounds and expiry under a fake clock
+
+from aircraft import AircraftHistory
+from harness import VirtualClock
+
+def history(capacity=3, ttl=60):
+    clock = VirtualClock()
+    return AircraftHistory(capacity=capacity, ttl=ttl, clock=clock.monotonic), clock
+
+def test_capacity_evicts_least_recently_seen():
+    planes, clock = history(capacity=3)
+    for key in ("a1", "a2", "a3"):
+        planes.seen(key)
+        clock.now += 1
+    # seeing a1 again makes a2 the least recently seen
+    assert not planes.seen("a1")
+    assert planes.seen("a4")
+    assert len(planes) == 3
+    assert "a2" not in planes
+    assert "a1" in planes
+    assert planes.evicted == 1
+    for index in range(100):
+        planes.seen("b{}".format(index))
+    assert len(planes) == 3
+    assert planes.evicted == 101
+
+def test_entries_expire_by_last_seen():
+    planes, clock = history(ttl=60)
+    planes.seen("a1")
+    planes.seen("a2")
+    clock.now = 50
+    planes.seen("a1")
+    clock.now = 60
+    planes.expire()
+    assert "a2" not in planes
+    assert "a1" in planes
+    clock.now = 109
+    planes.expire()
+    assert "a1" in planes
+    clock.now = 110
+    planes.expire()
+    assert len(planes) == 0
+    assert planes.expired == 2
+
+def test_entry_keeps_first_seen_last_seen_and_peak_altitude():
+    planes, clock = history()
+    planes.seen("a1", alt=2100)
+    clock.now = 30
+    planes.seen("a1", alt=3500)
+    clock.now = 45
+    # "ground" and missing altitudes don't replace the peak
+    planes.seen("a1", alt="ground")
+    planes.seen("a1")
+    assert planes.get("a1") == [0.0, 45, 3500]
+    assert planes.get("a9") is None
+
+def test_new_since_counts_first_sightings():
+    planes, clock = history(capacity=10)
+    planes.seen("a1")
+    clock.now = 100
+    planes.seen("a2")
+    planes.seen("a1")
+    clock.now = 130
+    planes.seen("a3")
+    assert planes.new_since(60) == 2
+    assert planes.new_since(200) == 3
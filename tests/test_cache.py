@@ -0,0 +1,132 @@
+# FeedCache TTLs and conditional revalidation against an HTTP stand-in that answers 304s
+
+import pytest
+
+from adafruit_requests import Response
+from cache import FeedCache
+from harness import Replay, VirtualClock
+
+class ConditionalServer:
+    """Session stand-in serving one document with an ETag and Last-Modified,
+    answering 304 when a request's validators match.
+    """
+    def __init__(self, body=b'{"Incidents": []}', etag='"v1"', last_modified="Tue, 14 May 2024 08:12:31 GMT"):
+        self.body = body
+        self.etag = etag
+        self.last_modified = last_modified
+        self.status = None
+        self.requests = []
+
+    def get(self, url, headers=None):
+        headers = headers or {}
+        self.requests.append(headers)
+        if self.status is not None:
+            return Response(self.status)
+        if self.etag is not None and headers.get("If-None-Match") == self.etag:
+            return Response(304)
+        if self.etag is None and self.last_modified is not None and headers.get("If-Modified-Since") == self.last_modified:
+            return Response(304)
+        response_headers = {}
+        if self.etag is not None:
+            response_headers["ETag"] = self.etag
+        if self.last_modified is not None:
+            response_headers["last-modified"] = self.last_modified
+        return Response(200, self.body, response_headers)
+
+class CountingParse:
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, response):
+        self.calls += 1
+        return response.json()
+
+def fetch(cache, parse, ttl=50):
+    return cache.fetch("incidents", "https://api.wmata.com/Incidents.svc/json/Incidents", parse, ttl)
+
+@pytest.fixture
+def setup():
+    clock = VirtualClock()
+    server = ConditionalServer()
+    return FeedCache(server, clock=clock.monotonic), server, clock, CountingParse()
+
+def test_fresh_value_is_served_without_a_request(setup):
+    cache, server, clock, parse = setup
+    assert fetch(cache, parse) == {"Incidents": []}
+    clock.now = 49
+    assert fetch(cache, parse) == {"Incidents": []}
+    assert len(server.requests) == 1
+    assert (cache.hits, cache.misses, cache.revalidations) == (1, 1, 0)
+    assert cache.is_fresh("incidents")
+
+def test_unchanged_response_is_revalidated_without_parsing(setup):
+    cache, server, clock, parse = setup
+    first = fetch(cache, parse)
+    for poll in range(1, 6):
+        clock.now = poll * 60
+        assert fetch(cache, parse) is first
+    assert parse.calls == 1
+    assert cache.revalidations == 5
+    assert server.requests[-1]["If-None-Match"] == '"v1"'
+    assert server.requests[-1]["If-Modified-Since"] == server.last_modified
+    # a 304 restarts the TTL
+    assert cache.fetched_at("incidents") == 300
+    clock.now = 340
+    fetch(cache, parse)
+    assert cache.hits == 1
+
+def test_changed_response_is_parsed_again(setup):
+    cache, server, clock, parse = setup
+    fetch(cache, parse)
+    server.body = b'{"Incidents": [{"IncidentID": "1"}]}'
+    server.etag = '"v2"'
+    clock.now = 60
+    assert fetch(cache, parse) == {"Incidents": [{"IncidentID": "1"}]}
+    assert parse.calls == 2
+    clock.now = 120
+    fetch(cache, parse)
+    assert server.requests[-1]["If-None-Match"] == '"v2"'
+    assert cache.revalidations == 1
+
+def test_last_modified_alone_revalidates():
+    clock = VirtualClock()
+    server = ConditionalServer(etag=None)
+    cache, parse = FeedCache(server, clock=clock.monotonic), CountingParse()
+    fetch(cache, parse)
+    clock.now = 60
+    fetch(cache, parse)
+    assert "If-None-Match" not in server.requests[-1]
+    assert cache.revalidations == 1
+    assert parse.calls == 1
+
+def test_errors_keep_the_stale_value(setup):
+    cache, server, clock, parse = setup
+    value = fetch(cache, parse)
+    server.status = 503
+    clock.now = 60
+    with pytest.raises(RuntimeError):
+        fetch(cache, parse)
+    assert not cache.is_fresh("incidents")
+    assert cache.fetched_at("incidents") == 0
+    server.status = None
+    clock.now = 120
+    assert fetch(cache, parse) is value
+    assert cache.revalidations == 1
+
+def test_request_headers_are_kept(setup):
+    cache, server, clock, parse = setup
+    cache.fetch("incidents", "https://example", parse, 50, headers={"api_key": "key"})
+    clock.now = 60
+    cache.fetch("incidents", "https://example", parse, 50, headers={"api_key": "key"})
+    assert server.requests[0] == {"api_key": "key"}
+    assert server.requests[1]["api_key"] == "key"
+
+def test_sign_polls_are_answered_from_the_cache():
+    # an hour of the sign's own polling, the fixtures send no validators
+    replay = Replay(duration=60 * 60)
+    globals = replay.run(trace_allocations=False)
+    # weather polled every 10 minutes, fetched every 20
+    assert replay.requests["weather"] == 3
+    # incidents stay active in the fixtures, polled every minute, fetched every 3
+    assert replay.requests["incidents"] <= 21
+    assert globals["feed_cache"].hits >= 40
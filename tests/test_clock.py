@@ -0,0 +1,119 @@
+# Clock extrapolation, day rollover and drift correction with a fake monotonic clock
+
+import datetime
+
+import pytest
+
+from clock import Clock, days_from_civil
+
+class FakeTime:
+    def __init__(self, start, rate=1.0):
+        # real local time and how many real seconds pass per monotonic second
+        self.real = start
+        self.rate = rate
+        self.now = 0.0
+        self.fetches = 0
+        self.fail = False
+
+    def monotonic_ns(self):
+        return int(self.now * 1000000000)
+
+    def advance(self, seconds):
+        self.now += seconds
+        self.real += datetime.timedelta(seconds=seconds * self.rate)
+
+    # Adafruit IO time struct of the real local time
+    def fetch(self):
+        self.fetches += 1
+        if self.fail:
+            raise OSError("io.adafruit.com unreachable")
+        real = self.real
+        return {"year": real.year, "mon": real.month, "mday": real.day, "hour": real.hour,
+        "min": real.minute, "sec": real.second, "wday": (real.weekday() + 1) % 7}
+
+def clock_at(start, rate=1.0, **kwargs):
+    fake = FakeTime(start, rate)
+    return Clock(fake.fetch, monotonic_ns=fake.monotonic_ns, **kwargs), fake
+
+@pytest.mark.parametrize("date", [
+    datetime.date(1970, 1, 1), datetime.date(2000, 2, 29), datetime.date(2024, 2, 29),
+    datetime.date(2024, 3, 1), datetime.date(2024, 12, 31), datetime.date(2100, 3, 1),
+])
+def test_days_from_civil(date):
+    assert days_from_civil(date.year, date.month, date.day) == (date - datetime.date(1970, 1, 1)).days
+
+def test_answers_without_fetching_after_sync():
+    clock, fake = clock_at(datetime.datetime(2024, 5, 14, 7, 0, 0))
+    assert clock.now() is None
+    assert clock.sync()
+    fake.advance(60 * 60 * 2 + 60 * 5)
+    now = clock.now()
+    assert (now["hour"], now["min"]) == (9, 5)
+    assert fake.fetches == 1
+    assert not clock.needs_sync()
+
+def test_weekday_rolls_over_at_midnight():
+    # Saturday 23:59:30, wday 6
+    clock, fake = clock_at(datetime.datetime(2024, 5, 18, 23, 59, 30))
+    clock.sync()
+    assert clock.now()["wday"] == 6
+    day = clock.day()
+    fake.advance(40)
+    now = clock.now()
+    # Sunday 00:00:10 wraps to wday 0
+    assert (now["wday"], now["hour"], now["min"], now["sec"]) == (0, 0, 0, 10)
+    assert clock.day() == day + 1
+    fake.advance(60 * 60 * 24)
+    assert clock.now()["wday"] == 1
+
+def test_resync_measures_drift_and_corrects_rate():
+    # the local oscillator runs 0.5% slow, real time passes faster than monotonic time
+    clock, fake = clock_at(datetime.datetime(2024, 5, 14, 7, 0, 0), rate=1.005, resync_interval=60 * 60)
+    clock.sync()
+    fake.advance(60 * 60)
+    assert clock.needs_sync()
+    assert clock.sync()
+    assert clock.drift == pytest.approx(18, abs=1)
+    assert clock.skew_ppm == pytest.approx(5000, abs=500)
+    # with the corrected rate the next hour is extrapolated without the drift
+    fake.advance(60 * 60)
+    expected = days_from_civil(fake.real.year, fake.real.month, fake.real.day) * 86400 + (
+    fake.real.hour * 3600 + fake.real.minute * 60 + fake.real.second)
+    assert clock.seconds() == pytest.approx(expected, abs=2)
+
+def test_implausible_rate_is_ignored():
+    clock, fake = clock_at(datetime.datetime(2024, 5, 14, 7, 0, 0))
+    clock.sync()
+    fake.advance(60 * 60)
+    # the time was changed by hand, not drift
+    fake.real += datetime.timedelta(minutes=10)
+    clock.sync()
+    assert clock.skew_ppm == 0
+    assert clock.drift == pytest.approx(600, abs=1)
+
+def test_failed_sync_retries_after_retry_interval():
+    clock, fake = clock_at(datetime.datetime(2024, 5, 14, 7, 0, 0), retry_interval=60)
+    fake.fail = True
+    assert not clock.sync()
+    assert clock.now() is None
+    assert clock.day() is None
+    assert clock.failures == 1
+    fake.advance(30)
+    assert not clock.needs_sync()
+    fake.advance(30)
+    assert clock.needs_sync()
+    fake.fail = False
+    assert clock.sync()
+    assert clock.now()["hour"] == 7
+
+def test_seconds_stay_exact_ints_after_days_of_uptime():
+    # a 30-bit float steps by minutes at epoch size, the clock must never hold one
+    clock, fake = clock_at(datetime.datetime(2024, 5, 14, 7, 0, 0))
+    fake.advance(60 * 60 * 24 * 9)
+    clock.sync()
+    start = clock.seconds()
+    assert type(start) is int
+    for second in range(1, 121):
+        fake.advance(1)
+        assert clock.seconds() == start + second
+        assert clock.now()["sec"] == second % 60
@@ -0,0 +1,44 @@
+# local countdown of train minutes between polls, reconciliation and staleness
+
+import pytest
+
+from predictions import PredictionEngine, train_record, countdown, is_stale, stale_after
+
+def prediction(minutes, received=0.0, destination_code="B11"):
+    return train_record("Glenmont", "Glenmont", destination_code, minutes, "RD", "A01", "1", received)
+
+def test_counts_down_from_the_received_time():
+    train = prediction("5", received=100.0)
+    assert countdown(train, 100.0) == "5"
+    assert countdown(train, 159.9) == "5"
+    assert countdown(train, 160.0) == "4"
+    assert countdown(train, 100.0 + 4 * 60) == "1"
+
+def test_shows_arr_once_the_estimate_reaches_zero():
+    train = prediction("2", received=0.0)
+    assert countdown(train, 119.0) == "1"
+    assert countdown(train, 120.0) == "ARR"
+    assert countdown(train, 60 * 10) == "ARR"
+
+@pytest.mark.parametrize("minutes", ["ARR", "BRD", "---", "", None])
+def test_non_numeric_minutes_are_shown_as_received(minutes):
+    assert countdown(prediction(minutes), 60 * 5) == minutes
+
+def test_new_predictions_replace_the_countdown():
+    engine = PredictionEngine(("A01",), ("RD",), clock=lambda: 0.0)
+    engine.update([prediction("8")], now=0.0)
+    shown = engine.first("A01", "RD", "1")
+    assert countdown(shown, 150.0) == "6"
+    # the next poll says the train is running late, its own Min wins over the local estimate
+    engine.update([prediction("7")], now=150.0)
+    assert countdown(engine.first("A01", "RD", "1"), 150.0) == "7"
+    assert countdown(engine.first("A01", "RD", "1"), 210.0) == "6"
+
+def test_marked_stale_after_the_threshold():
+    train = prediction("12", received=0.0)
+    assert not is_stale(train, stale_after)
+    assert is_stale(train, stale_after + 1)
+    assert is_stale(train, 30, max_age=20)
+    # restored from a snapshot, the age is unknown
+    assert is_stale(prediction("12", received=None), 0)
+    assert countdown(prediction("12", received=None), 600) == "12"
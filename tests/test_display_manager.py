@@ -0,0 +1,179 @@
+# change-aware label updates and dirty tracking of display_manager on the fake displayio
+
+import pytest
+
+import display_manager
+from display_manager import metro_red, stale_gray, scroll_queue_size, scroll_speed
+from predictions import train_record, stale_after
+
+class FakeDisplay:
+    def __init__(self):
+        self.width = 128
+        self.height = 32
+        self.shown = 0
+
+    def show(self, group):
+        self.shown += 1
+
+weather = {
+    "icon": "03d", "current_temp": 68.4, "current_feels_like": 67.9, "daily_temp_min": 58.1,
+    "daily_temp_max": 77.9, "hourly_next_temp": 70.2, "hourly_feels_like": 68.7,
+}
+
+@pytest.fixture
+def manager():
+    manager = display_manager.display_manager(FakeDisplay())
+    manager.refresh_display()
+    return manager
+
+def trains_at(now, top="4", bottom="9"):
+    return [train_record("Shady Gr", "Shady Grove", "A15", top, "RD", "A01", "2", now),
+    train_record("Glenmont", "Glenmont", "B11", bottom, "RD", "A01", "1", now)]
+
+def test_unchanged_trains_are_not_laid_out_or_refreshed(manager):
+    trains = trains_at(100)
+    manager.assign_trains(trains, [None, None], now=100)
+    assert manager.refresh_display()
+    layouts, refreshes = manager.layouts, manager.display.shown
+    for _ in range(5):
+        manager.assign_trains(trains_at(100), [None, None], now=100)
+        assert not manager.refresh_display()
+    assert manager.layouts == layouts
+    assert manager.display.shown == refreshes
+
+def test_only_the_changed_label_is_laid_out(manager):
+    manager.assign_trains(trains_at(100), [None, None], now=100)
+    manager.refresh_display()
+    layouts = manager.layouts
+    manager.assign_trains(trains_at(115, top="3"), [None, None], now=115)
+    assert manager.layouts == layouts + 1
+    assert manager.top_row_train_min.text == "3"
+    assert manager.refresh_display()
+
+def test_color_change_refreshes_without_layout(manager):
+    # "BRD"/"ARR" aren't counted down, only their color changes once they are stale
+    trains = trains_at(100, top="BRD", bottom="ARR")
+    manager.assign_trains(trains, [None, None], now=100)
+    manager.refresh_display()
+    layouts = manager.layouts
+    later = 100 + stale_after + 1
+    manager.assign_trains(trains, [None, None], now=later)
+    assert manager.top_row_train_min.color == stale_gray
+    assert manager.layouts == layouts
+    assert manager.refresh_display()
+    manager.assign_trains(trains, [None, None], now=later)
+    assert not manager.refresh_display()
+
+def test_arriving_train_is_red(manager):
+    manager.assign_trains(trains_at(100, top="ARR"), [None, None], now=100)
+    assert manager.top_row_train_min.color == metro_red
+
+def test_unchanged_weather_and_icon_are_skipped(manager):
+    manager.update_weather(dict(weather))
+    assert manager.refresh_display()
+    layouts = manager.layouts
+    icon = manager._icon_group[0]
+    manager.update_weather(dict(weather))
+    manager.set_icon("03d")
+    assert manager.layouts == layouts
+    assert manager._icon_group[0] is icon
+    assert not manager.refresh_display()
+    # a new icon swaps the tile without a text layout
+    manager.set_icon("10n")
+    assert manager.layouts == layouts
+    assert manager.refresh_display()
+
+def test_stale_weather_is_gray(manager):
+    manager.update_weather(dict(weather), stale=True)
+    assert manager.temp_text.color == stale_gray
+    manager.update_weather(dict(weather))
+    assert manager.temp_text.color == 0xFFFFFF
+
+def scroll_through(manager, text):
+    manager.scroll_text(text)
+    manager.update_scroll(0.0)
+    while manager.update_scroll(1000.0):
+        pass
+
+# the message on screen at each start of a scroll, frames every frame period until the queue is empty
+def shown_messages(manager, now=0.0):
+    shown = []
+    while manager.is_scrolling():
+        if manager._scroll_start is None:
+            manager.update_scroll(now)
+            shown.append(manager.scrolling_label.text)
+        else:
+            manager.update_scroll(now)
+        now += manager.frame_period
+    return shown
+
+def test_idle_scroller_draws_nothing(manager):
+    assert not manager.is_scrolling()
+    assert not manager.update_scroll(0.0)
+    assert manager.frames == 0
+
+def test_queued_messages_scroll_in_order_and_the_oldest_are_dropped(manager):
+    messages = ["Flight AAL{}".format(i) for i in range(scroll_queue_size + 2)]
+    for message in messages:
+        manager.scroll_text(message)
+    assert shown_messages(manager) == messages[-scroll_queue_size:]
+    assert manager._scrolling_group.hidden
+
+def test_scroll_advances_by_elapsed_time(manager):
+    manager.scroll_text("Flight AAL1")
+    manager.update_scroll(10.0)
+    assert manager._scrolling_group.x == manager.display.width
+    manager.update_scroll(10.5)
+    assert manager._scrolling_group.x == manager.display.width - int(0.5 * scroll_speed)
+    # a late frame catches up instead of slowing the message down
+    distance = manager.display.width + len("Flight AAL1") * 4
+    assert manager.update_scroll(10.0 + (distance - 1) / scroll_speed)
+    assert not manager.update_scroll(10.0 + distance / scroll_speed)
+    assert not manager.is_scrolling()
+
+def test_late_frames_are_counted_as_dropped(manager):
+    manager.scroll_text("Flight AAL1 at 3000 ft")
+    period = manager.frame_period
+    manager.update_scroll(0.0)
+    for frame in range(1, 11):
+        manager.update_scroll(frame * period)
+    assert (manager.frames, manager.dropped_frames) == (10, 0)
+    # a fetch blocks for 10 frame periods
+    manager.update_scroll(20 * period)
+    assert (manager.frames, manager.dropped_frames) == (11, 9)
+
+def test_status_hides_the_boards_until_cleared(manager):
+    manager.show_status("Connecting...")
+    assert not manager._status_group.hidden
+    assert manager._weather_group.hidden and manager._train_board_group.hidden
+    manager.clear_status()
+    assert manager._status_group.hidden
+    assert not manager._weather_group.hidden and not manager._train_board_group.hidden
+
+def test_status_comes_back_after_a_scroll(manager):
+    manager.show_status("Connecting...")
+    scroll_through(manager, "N123AB 737 at 3000 ft")
+    assert not manager._status_group.hidden
+    assert manager._weather_group.hidden and manager._train_board_group.hidden
+
+def test_night_mode_replaces_the_status(manager):
+    manager.show_status("Connecting...")
+    manager.night_mode_toggle(False)
+    assert manager._status_group.hidden
+    assert manager._weather_group.hidden and manager._train_board_group.hidden
+    assert not manager._night_mode_group.hidden
+    # the status is not brought back in the morning
+    manager.night_mode_toggle(True)
+    assert manager._status_group.hidden
+    assert not manager._weather_group.hidden and not manager._train_board_group.hidden
+
+def test_night_mode_during_a_scroll_drops_the_status(manager):
+    manager.show_status("Connecting...")
+    manager.scroll_text("N123AB 737 at 3000 ft")
+    manager.update_scroll(0.0)
+    manager.night_mode_toggle(False)
+    while manager.update_scroll(1000.0):
+        pass
+    assert manager._status_group.hidden
+    assert manager._weather_group.hidden and manager._train_board_group.hidden
+    assert not manager._night_mode_group.hidden
@@ -0,0 +1,174 @@
+# per-endpoint backoff, circuit states and radio reset quorum against a fault-injecting fake wifi manager
+
+import random
+
+import pytest
+
+from harness import Replay, VirtualClock, routes
+from health import CLOSED, HALF_OPEN, OPEN, Endpoint, HealthMonitor
+
+class FaultyWifi:
+    """Fake wifi manager, endpoints in `down` fail and a reset takes reset_time seconds."""
+    def __init__(self, clock, reset_time=3.0):
+        self.clock = clock
+        self.reset_time = reset_time
+        self.down = set()
+        self.resets = 0
+
+    def get(self, endpoint):
+        if endpoint in self.down:
+            raise OSError("{} unreachable".format(endpoint))
+        return endpoint
+
+    def reset(self):
+        self.resets += 1
+        self.clock.advance(self.reset_time)
+
+def monitor():
+    clock = VirtualClock()
+    wifi = FaultyWifi(clock)
+    health = HealthMonitor(wifi.reset, reset_quorum=2, window=120, reset_cooldown=300, clock=clock.monotonic)
+    for name in ("trains", "incidents", "weather", "planes"):
+        health.add(name, threshold=2, base_delay=30, max_delay=60 * 15, jitter=0)
+    return health, wifi, clock
+
+# one poll of an endpoint the way code.py's fetch functions report it
+def poll(health, wifi, name):
+    if not health.allow(name):
+        return None
+    try:
+        value = wifi.get(name)
+    except OSError:
+        health.failure(name)
+        return None
+    health.success(name)
+    return value
+
+def test_backoff_doubles_and_is_capped():
+    endpoint = Endpoint("planes", threshold=2, base_delay=30, max_delay=100, jitter=0)
+    endpoint.failure(0)
+    assert endpoint.state == CLOSED
+    delays = []
+    for now in (0, 100, 200, 300):
+        endpoint.failure(now)
+        delays.append(endpoint.retry_at - now)
+    assert delays == [30, 60, 100, 100]
+    assert endpoint.state == OPEN
+
+def test_jitter_stays_within_bounds():
+    for _ in range(50):
+        endpoint = Endpoint("planes", threshold=1, base_delay=100, jitter=0.2)
+        endpoint.failure(0)
+        assert 80 <= endpoint.retry_at <= 120
+
+def test_open_circuit_lets_one_trial_through():
+    health, wifi, clock = monitor()
+    wifi.down.add("planes")
+    for _ in range(2):
+        poll(health, wifi, "planes")
+    assert health.is_open("planes")
+    assert not health.allow("planes")
+    clock.now = 30
+    assert health.allow("planes")
+    assert health.endpoints["planes"].state == HALF_OPEN
+    # the trial fails and the circuit opens again with a longer delay
+    health.failure("planes")
+    assert health.is_open("planes")
+    assert health.endpoints["planes"].retry_at == 30 + 60
+    wifi.down.clear()
+    clock.now = 90
+    assert poll(health, wifi, "planes") == "planes"
+    assert health.endpoints["planes"].state == CLOSED
+    assert health.endpoints["planes"].failures == 0
+
+def test_one_failing_endpoint_never_resets_the_radio():
+    health, wifi, clock = monitor()
+    wifi.down.add("planes")
+    attempts = 0
+    # an hour of polling every 60 seconds, like the planes task
+    for minute in range(60):
+        clock.now = minute * 60
+        if health.allow("planes"):
+            attempts += 1
+        poll(health, wifi, "planes")
+        assert poll(health, wifi, "trains") == "trains"
+    assert wifi.resets == 0
+    assert health.reset_time == 0
+    # backed off instead of failing every minute
+    assert attempts < 15
+
+def test_endpoints_failing_together_reset_once_per_cooldown():
+    health, wifi, clock = monitor()
+    wifi.down.update(("trains", "incidents"))
+    for minute in range(5):
+        clock.now = minute * 60
+        poll(health, wifi, "trains")
+        poll(health, wifi, "incidents")
+    assert wifi.resets == 1
+    assert health.resets == 1
+    # time lost to resets, every failure used to cost a reset
+    failures = health.endpoints["trains"].total_failures + health.endpoints["incidents"].total_failures
+    assert health.reset_time == pytest.approx(wifi.reset_time)
+    assert failures * wifi.reset_time > 2 * health.reset_time
+
+def test_reset_gives_open_circuits_a_trial():
+    health, wifi, clock = monitor()
+    wifi.down.update(("trains", "weather"))
+    for _ in range(2):
+        poll(health, wifi, "trains")
+    assert health.is_open("trains")
+    assert poll(health, wifi, "weather") is None
+    assert wifi.resets == 1
+    wifi.down.clear()
+    # the trial right after the reset succeeds without waiting out the backoff
+    assert poll(health, wifi, "trains") == "trains"
+    assert not health.is_open("trains")
+
+def test_reset_starts_the_backoff_over():
+    health, wifi, clock = monitor()
+    wifi.down.update(("trains", "weather"))
+    # trains backed off to 60 seconds before weather fails too
+    for now in (0, 0, 30):
+        clock.now = now
+        poll(health, wifi, "trains")
+    assert health.endpoints["trains"].retry_at - 30 == 60
+    poll(health, wifi, "weather")
+    assert wifi.resets == 1
+    assert health.endpoints["trains"].failures == 0
+    # a failing trial on the new connection waits base_delay, not the doubled delay
+    poll(health, wifi, "trains")
+    trains = health.endpoints["trains"]
+    assert trains.state == OPEN
+    assert trains.retry_at - clock.now == 30
+
+def test_failures_outside_the_window_do_not_count():
+    health, wifi, clock = monitor()
+    wifi.down.update(("trains", "weather"))
+    poll(health, wifi, "trains")
+    clock.now = 121
+    poll(health, wifi, "weather")
+    assert wifi.resets == 0
+
+# the sign booting into a radio outage shows trains and weather soon after the radio recovers
+@pytest.mark.parametrize("outage", (60, 120, 180))
+def test_first_useful_frame_follows_a_boot_outage(outage):
+    # the backoff jitter is drawn from random
+    random.seed(outage)
+    replay = Replay(duration=60 * 10)
+    for feed in set(feed for _, feed, _ in routes):
+        replay.fail(feed, until=outage)
+    globals = replay.run(trace_allocations=False)
+    assert globals["health"].resets == 1
+    # at worst the train circuit waits out its longest backoff after the outage,
+    # weather used to be held back for its whole 10 minute period
+    trains = globals["health"].endpoints["trains"]
+    assert replay.first_frame is not None
+    assert replay.first_frame - outage < trains.max_delay * (1 + trains.jitter) + 15
+
+def test_first_useful_frame_follows_failing_train_polls():
+    random.seed(4)
+    replay = Replay(duration=60 * 10)
+    replay.fail("trains", 4)
+    replay.run(trace_allocations=False)
+    # four failed polls cost about 4 minutes of 30 second doubling backoff
+    assert replay.first_frame < 60 * 3
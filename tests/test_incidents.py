@@ -0,0 +1,73 @@
+# IncidentStore diffs over sequences of recorded incident payloads
+
+import os
+
+import pytest
+
+import json_stream
+from harness import Replay
+from incidents import Incident, IncidentStore, incident_fields, parse_lines
+
+fixture_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "host", "fixtures")
+
+red_line_id = "3754F8B2-A0A6-494E-A4B5-82C9E72DFA74"
+
+def recorded(name):
+    with open(os.path.join(fixture_dir, name + ".json"), "rb") as fixture:
+        return list(json_stream.iter_records((fixture.read(),), "Incidents", incident_fields, record=Incident))
+
+def ids(incidents):
+    return sorted(incident.id[:8] for incident in incidents)
+
+@pytest.mark.parametrize("lines_affected, lines", [
+    ("RD;", {"RD"}), ("BL; OR; SV;", {"BL", "OR", "SV"}), ("", set()), (None, set()),
+])
+def test_parse_lines(lines_affected, lines):
+    assert parse_lines(lines_affected) == lines
+
+def test_recorded_sequence_reports_only_changes():
+    store = IncidentStore()
+    assert tuple(map(ids, store.update(recorded("wmata_incidents")))) == (["1A2B3C4D", "3754F8B2"], [], [])
+    # the same incidents polled again
+    assert store.update(recorded("wmata_incidents")) == ([], [], [])
+    # the red line incident got a new DateUpdated
+    assert tuple(map(ids, store.update(recorded("wmata_incidents_updated")))) == ([], ["3754F8B2"], [])
+    assert tuple(map(ids, store.update(recorded("wmata_incidents_cleared")))) == ([], [], ["3754F8B2"])
+    assert ids(store.active()) == ["1A2B3C4D"]
+    assert store.polls == 4
+
+def test_matches_lines_as_sets():
+    store = IncidentStore(["RD"])
+    new, _, _ = store.update(recorded("wmata_incidents"))
+    assert ids(new) == ["3754F8B2"]
+    assert store.incidents[red_line_id].lines == {"RD"}
+    # a line code only matches whole entries of LinesAffected, "R" is not in "RD;"
+    store = IncidentStore(["R"])
+    assert store.update(recorded("wmata_incidents")) == ([], [], [])
+
+def test_cached_response_is_not_diffed_again():
+    store = IncidentStore()
+    records = recorded("wmata_incidents")
+    store.update(records)
+    assert store.update(records) == ([], [], [])
+    assert store.polls == 1
+
+def test_incident_without_id_is_keyed_by_description():
+    store = IncidentStore()
+    store.update([Incident(None, "t1", "RD;", "Delays at Union Station")])
+    new, updated, cleared = store.update([Incident(None, "t2", "RD;", "Delays at Union Station")])
+    assert (new, cleared) == ([], [])
+    assert [incident.updated for incident in updated] == ["t2"]
+
+def test_only_changes_scroll_on_the_sign():
+    # polled every minute, the feed cache only lets every third poll through
+    replay = Replay(duration=60 * 10)
+    replay.sequence("incidents", ("wmata_incidents.json", "wmata_incidents.json", "wmata_incidents_updated.json",
+    "wmata_incidents_cleared.json"))
+    replay.run(trace_allocations=False)
+    assert replay.requests["incidents"] >= 4
+    # the red line incident scrolls when it appears and when it is updated, never in between
+    assert replay.output.count("Desc.: Red Line") == 2
+    assert replay.output.count("Incident cleared: Red Line") == 1
+    # the sign only shows red line incidents
+    assert "Blue/Orange/Silver" not in replay.output
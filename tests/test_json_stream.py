@@ -0,0 +1,47 @@
+# json_stream record parsing with keys and skipped values split across every chunk boundary
+
+import json
+
+import pytest
+
+import json_stream
+from json_stream import _Reader
+
+document = json.dumps({
+    "now": 1700000000.5, "messages": [1, 2, {"flight": "nested"}],
+    "aircraft": [
+        {"hex": "a00001", "flight": "AAL1  ", "alt_geom": 3000, "lat": 38.9, "lon": -77.0, "gs": 412.5, "mlat": []},
+        {"flighté": "skipped", "fli\\ght": True, "lat": -1e-3, "flight": "UAL2", "seen": None},
+        {"alt_geom": 12000, "emergency": "none", "squawk": "7700", "rssi": -22.1},
+    ],
+}).encode()
+
+def chunks(data, size):
+    for start in range(0, len(data), size):
+        yield data[start:start + size]
+
+@pytest.mark.parametrize("size", range(1, 40))
+def test_records_match_json_loads_for_any_chunk_size(size):
+    fields = ("flight", "alt_geom", "lat", "emergency")
+    records = list(json_stream.iter_records(chunks(document, size), "aircraft", fields))
+    expected = [{key: entry[key] for key in fields if key in entry} for entry in json.loads(document)["aircraft"]]
+    assert records == expected
+
+@pytest.mark.parametrize("size", (1, 2, 3, 7))
+def test_skipped_scalars_stop_at_their_delimiter(size):
+    reader = _Reader(chunks(b'[123456.75e2 , true,null]', size))
+    seen = []
+    for _ in reader.items():
+        reader.skip()
+        seen.append(reader.skip_ws())
+    assert seen == [0x2C, 0x2C, 0x5D]
+
+@pytest.mark.parametrize("size", (1, 2, 4, 100))
+def test_keys_are_matched_as_bytes(size):
+    names = (b"Min", b"Line", "Destinationé".encode("utf-8"))
+    data = '{"Line": 1, "Lin": 2, "Minutes": 3, "Min": 4, "Destination\\u00e9": 5, "Li\\u006ee": 6}'.encode()
+    reader = _Reader(chunks(data, size))
+    keys = []
+    for index in reader.keys(names):
+        keys.append((index, reader.value()))
+    assert keys == [(1, 1), (-1, 2), (-1, 3), (0, 4), (2, 5), (1, 6)]
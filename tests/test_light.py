@@ -0,0 +1,105 @@
+# LightService smoothing, hysteresis and panel on/off with a fake sensor reporting scripted lux
+
+import pytest
+
+from harness import Replay
+from light import LightService
+
+class ScriptedSensor:
+    """APDS9960 stand-in, each reading's red channel is the scripted lux,
+    None in the script is a poll where no reading is ready yet.
+    """
+    def __init__(self, script):
+        self.script = list(script)
+        self.reads = 0
+
+    @property
+    def color_data_ready(self):
+        if self.script and self.script[0] is None:
+            self.script.pop(0)
+            return False
+        return bool(self.script)
+
+    @property
+    def color_data(self):
+        self.reads += 1
+        return self.script.pop(0), 0, 0, 0
+
+def red_lux(r, g, b):
+    return r
+
+def service(script, **kwargs):
+    sensor = ScriptedSensor(script)
+    return LightService(sensor, red_lux, **kwargs), sensor
+
+# sample until the script runs out, returns the samples that asked for a display update
+def run(light, sensor):
+    changes = []
+    while sensor.script:
+        if light.sample():
+            changes.append((light.dark, light.brightness))
+    return changes
+
+def test_not_ready_returns_without_reading():
+    light, sensor = service([None, None, 200])
+    assert not light.sample()
+    assert not light.sample()
+    assert sensor.reads == 0
+    assert light.not_ready == 2
+    light.sample()
+    assert light.lux == 200
+    # nothing left to read
+    assert not light.sample()
+    assert light.samples == 1
+
+def test_median_window_ignores_a_flash():
+    light, sensor = service([1, 1, 1, 1, 1, 1000, 1, 1, 1], dark_lux=5, bright_lux=15)
+    run(light, sensor)
+    assert light.dark
+    assert light.lux < 5
+
+def test_hysteresis_between_dark_and_bright_thresholds():
+    light, sensor = service([2] * 10, dark_lux=5, bright_lux=15, alpha=1)
+    run(light, sensor)
+    assert light.dark
+    # readings between the two thresholds keep the room dark
+    sensor.script = [4, 8, 12, 6, 14, 10] * 3
+    assert all(dark for dark, _ in run(light, sensor))
+    assert light.dark
+    sensor.script = [20] * 3
+    changes = run(light, sensor)
+    assert changes[0][0] is False
+    assert not light.dark
+
+def test_smoothed_lux_follows_gradually():
+    light, sensor = service([100] * 5, alpha=0.2)
+    run(light, sensor)
+    sensor.script = [200] * 3
+    run(light, sensor)
+    # the median of 5 only moves once 3 readings are 200, then the average moves a fifth of the way
+    assert light.lux == pytest.approx(120)
+    sensor.script = [200] * 2
+    run(light, sensor)
+    assert light.lux == pytest.approx(100 + 100 * (1 - 0.8 ** 3))
+
+def test_panel_turns_off_only_while_dark():
+    light, sensor = service([300] * 5, dark_lux=5, bright_lux=15, alpha=1)
+    # lit readings at any level leave the panel on without a display update
+    assert run(light, sensor) == []
+    assert light.brightness == 1
+    sensor.script = [20, 150, 40] * 3
+    assert run(light, sensor) == []
+    # rgbmatrix brightness is on or off, there are no dimmed steps in between
+    sensor.script = [2] * 5
+    assert run(light, sensor) == [(True, 0)]
+    sensor.script = [20] * 5
+    assert run(light, sensor) == [(False, 1)]
+
+def test_disabled_light_sensing_never_starts_the_sensor():
+    replay = Replay(duration=60)
+    globals = replay.run(trace_allocations=False)
+    # lux_min is negative in code.py, the room could never count as dark
+    assert globals["lux_min"] < 0
+    assert not globals["sensor_enabled"]
+    assert "light" not in globals and "sensor" not in globals
+    assert globals["scheduler"].get_task("light") is None
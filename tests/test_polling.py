@@ -0,0 +1,63 @@
+# adaptive poll periods from recorded feeds, and a replay of the sign across closing time
+
+import datetime
+import os
+
+import json_stream
+from harness import Replay
+from polling import PollPolicy, incident_period, plane_period, train_period
+from predictions import PredictionEngine, train_record, empty_train, train_fields
+
+fixture_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "host", "fixtures")
+
+def recorded_rows():
+    with open(os.path.join(fixture_dir, "wmata_predictions.json"), "rb") as fixture:
+        records = json_stream.iter_records((fixture.read(),), "Trains", train_fields, record=empty_train)
+        engine = PredictionEngine(("A01",), ("RD",), clock=lambda: 0.0)
+        engine.update(records)
+    return [engine.first("A01", "RD", "2"), engine.first("A01", "RD", "1")]
+
+def train(minutes):
+    return train_record("Glenmont", "Glenmont", "B11", minutes, "RD", "A01", "1", 0.0)
+
+def test_trains_polled_fast_while_one_is_boarding():
+    policy = PollPolicy(15, fast=10, slow=45)
+    # the recorded feed has a boarding Shady Grove train
+    assert train_period(policy, recorded_rows()) == 10
+    assert train_period(policy, [train("2"), None]) == 10
+    assert train_period(policy, [train("ARR"), train("20")]) == 10
+
+def test_trains_polled_slowly_when_every_train_is_far_out():
+    policy = PollPolicy(15, fast=10, slow=45)
+    assert train_period(policy, [train("15"), train("22")]) == 45
+    assert train_period(policy, [train("14"), train("22")]) == 15
+    # no trains or unknown minutes keep the base rate
+    assert train_period(policy, [None, None]) == 15
+    assert train_period(policy, [train("---"), None]) == 15
+    # 15 to 45 and back
+    assert policy.changes == 2
+
+def test_incidents_back_off_while_none_are_active():
+    policy = PollPolicy(60, max_period=60 * 10)
+    periods = [incident_period(policy, []) for _ in range(6)]
+    assert periods == [120, 240, 480, 600, 600, 600]
+    assert incident_period(policy, ["incident"]) == 60
+    assert incident_period(policy, []) == 120
+
+def test_planes_slow_down_without_nearby_aircraft():
+    policy = PollPolicy(60, slow=60 * 2)
+    assert plane_period(policy, []) == 120
+    assert plane_period(policy, ["AAL9029"]) == 60
+
+def test_no_feed_is_polled_outside_service_hours():
+    # the last 5 minutes before the 22:00 shut off and 5 minutes after it
+    replay = Replay(duration=60 * 10, start=datetime.datetime(2024, 5, 14, 21, 55))
+    globals = replay.run(trace_allocations=False)
+    closing = 60 * 5
+    # the time task notices the closing within its 60 second period
+    for feed in ("trains", "incidents", "planes"):
+        assert replay.last_success[feed] < closing + 60
+    assert globals["day_mode"] is False
+    assert globals["train_poll"].period == globals["train_poll"].closed
+    # a boarding train in the recorded feed keeps trains at the fast 10 seconds until then
+    assert replay.requests["trains"] >= closing / 10
@@ -0,0 +1,63 @@
+# PredictionEngine on the recorded multi-station GetPrediction fixture (Metro Center A01 and C01)
+
+import os
+
+import pytest
+
+import json_stream
+from predictions import PredictionEngine, train_record, empty_train, train_fields
+from predictions import DESTINATION, DESTINATION_CODE, MINUTES, RECEIVED
+
+fixture_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "host", "fixtures")
+
+def recorded_trains(name="wmata_predictions.json"):
+    with open(os.path.join(fixture_dir, name), "rb") as fixture:
+        data = fixture.read()
+    chunks = [data[start:start + 256] for start in range(0, len(data), 256)]
+    return json_stream.iter_records(chunks, "Trains", train_fields, record=empty_train)
+
+def destinations(trains):
+    return [(train[DESTINATION_CODE], train[MINUTES]) for train in trains]
+
+@pytest.fixture
+def engine():
+    engine = PredictionEngine(("A01", "C01"), ("RD", "BL", "OR"), clock=lambda: 100.0)
+    engine.update(recorded_trains())
+    return engine
+
+def test_one_request_covers_every_station(engine):
+    assert engine.url().endswith("/GetPrediction/A01,C01")
+
+def test_indexed_by_station_line_and_group(engine):
+    assert sorted(engine.index) == [
+        ("A01", "RD", "1"), ("A01", "RD", "2"),
+        ("C01", "BL", "1"), ("C01", "BL", "2"), ("C01", "OR", "2"),
+    ]
+    assert destinations(engine.top("A01", "RD", "1")) == [("B11", "3"), ("B08", "9")]
+    # boarding trains sort before numbered minutes
+    assert destinations(engine.top("A01", "RD", "2")) == [("A15", "BRD"), ("A11", "12")]
+    assert destinations(engine.top("C01", "BL", "2")) == [("J03", "ARR")]
+    assert engine.first("A01", "RD", "2")[DESTINATION] == "Shady Gr"
+
+def test_unconfigured_lines_and_non_passenger_trains_are_dropped(engine):
+    lines = set(line for _, line, _ in engine.index)
+    assert "SV" not in lines
+    assert "No" not in lines
+    assert "--" not in lines
+    assert engine.first("C01", "SV", "1") is None
+
+def test_top_n_limits_each_direction():
+    engine = PredictionEngine(("A01",), ("RD",), top_n=1, clock=lambda: 0.0)
+    engine.update(recorded_trains())
+    assert destinations(engine.top("A01", "RD", "1")) == [("B11", "3")]
+    assert engine.top("A01", "RD", "2", n=5) == engine.top("A01", "RD", "2")
+
+def test_update_replaces_predictions_and_timestamps_them(engine):
+    assert engine.first("A01", "RD", "1")[RECEIVED] == 100.0
+    engine.update(recorded_trains(), now=160.0)
+    assert engine.first("A01", "RD", "1")[RECEIVED] == 160.0
+    engine.update([train_record("Glenmont", "Glenmont", "B11", "6", "RD", "A01", "1")], now=175.0)
+    assert list(engine.index) == [("A01", "RD", "1")]
+    assert destinations(engine.top("A01", "RD", "1")) == [("B11", "6")]
+    engine.clear()
+    assert engine.first("A01", "RD", "1") is None
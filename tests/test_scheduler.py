@@ -0,0 +1,131 @@
+# cadence of Scheduler tasks checked on the host harness's virtual clock
+
+import pytest
+
+from harness import Replay, StopReplay, VirtualClock, default_latency
+from scheduler import Scheduler
+import display_manager
+from display_manager import scroll_speed
+from tests.test_display_manager import FakeDisplay
+
+# run a scheduler on its virtual clock until `duration` virtual seconds have passed
+def run_for(scheduler, clock, duration):
+    clock.stop_at = duration
+    with pytest.raises(StopReplay):
+        scheduler.run()
+
+def virtual_scheduler():
+    clock = VirtualClock()
+    return Scheduler(clock=clock.monotonic, sleep=clock.async_sleep), clock
+
+def test_tasks_keep_their_own_period():
+    scheduler, clock = virtual_scheduler()
+    trains = scheduler.add("trains", 15, lambda: clock.advance(0.8))
+    weather = scheduler.add("weather", 60 * 10, lambda: clock.advance(1.5))
+    render = scheduler.add("render", 1, lambda: None)
+    run_for(scheduler, clock, 60 * 60)
+
+    # the blocking fetches don't stretch their own cadence
+    assert trains.average_interval() == pytest.approx(15, abs=0.1)
+    assert weather.average_interval() == pytest.approx(60 * 10, abs=0.1)
+    assert trains.runs == pytest.approx(60 * 60 / 15, abs=1)
+    assert trains.missed == 0
+    assert weather.missed == 0
+    # rendering only loses the frames the fetches due with it block for (0.8 + 1.5 seconds)
+    # instead of waiting out a whole loop of every fetch
+    assert render.average_interval() == pytest.approx(1, abs=0.1)
+    assert render.missed <= 2 * weather.runs
+    assert render.max_late <= 0.8 + 1.5
+
+def test_deadlines_do_not_drift_by_runtime():
+    scheduler, clock = virtual_scheduler()
+    task = scheduler.add("trains", 15, lambda: clock.advance(2))
+    run_for(scheduler, clock, 15 * 20 + 1)
+    assert task.runs == 21
+    assert task.average_interval() == pytest.approx(15)
+    assert task.max_late == pytest.approx(0)
+
+def test_overrunning_task_skips_missed_periods():
+    scheduler, clock = virtual_scheduler()
+    # each run blocks for two and a half periods
+    task = scheduler.add("planes", 10, lambda: clock.advance(25))
+    run_for(scheduler, clock, 100)
+    # runs at 0, 30, 60, 90 instead of back to back
+    assert task.runs == 4
+    # the periods due at 10, 20, 40, 50, 70, 80, 100 and 110 were skipped
+    assert task.missed == 8
+    assert task.average_interval() == pytest.approx(30)
+
+def test_callback_returning_seconds_sets_next_period():
+    scheduler, clock = virtual_scheduler()
+    periods = iter((5, 5, 45))
+    task = scheduler.add("trains", 15, lambda: next(periods, None))
+    run_for(scheduler, clock, 60)
+    # 0, 5, 10, then 45 seconds later at 55 and back to the configured period
+    assert task.runs == 4
+    assert task.last_run == pytest.approx(55)
+    assert task.next_period == 15
+    assert task.deadline == pytest.approx(70)
+
+def test_failing_callback_keeps_its_cadence():
+    scheduler, clock = virtual_scheduler()
+
+    def fail():
+        raise OSError("no route to host")
+
+    task = scheduler.add("incidents", 60, fail)
+    run_for(scheduler, clock, 60 * 5 + 1)
+    assert task.runs == 6
+    assert task.average_interval() == pytest.approx(60)
+
+def test_missed_runs_are_counted_against_the_adaptive_period():
+    scheduler, clock = virtual_scheduler()
+
+    # asks for 5 second polls but blocks for 12 seconds
+    def poll():
+        clock.advance(12)
+        return 5
+
+    task = scheduler.add("trains", 15, poll)
+    run_for(scheduler, clock, 40)
+    # runs at 0, 15 and 30: deadlines 5 and 10, 20 and 25, 35 and 40 were missed
+    assert task.runs == 3
+    assert task.missed == 6
+    assert task.next_period == 5
+
+@pytest.mark.parametrize("result", [None, True, 0, -5, "15"])
+def test_results_that_are_not_periods_keep_the_configured_period(result):
+    scheduler, clock = virtual_scheduler()
+    task = scheduler.add("scroll", 10, lambda: result)
+    run_for(scheduler, clock, 35)
+    assert task.runs == 4
+    assert task.next_period == 10
+
+def test_scroll_frames_interleave_with_blocking_fetches():
+    scheduler, clock = virtual_scheduler()
+    manager = display_manager.display_manager(FakeDisplay())
+    text = "Flight AAL1\n  Alt: 3000"
+    # a fetch blocking for 10 frame periods every 2 seconds, the message scrolls for about 6.2 seconds
+    scheduler.add("trains", 2, lambda: clock.advance(0.3))
+    scheduler.add("scroll", 60, lambda: manager.scroll_text(text))
+    frame = scheduler.add("frame", manager.frame_period, lambda: manager.update_scroll(clock.now), instrumented=False)
+    run_for(scheduler, clock, 10)
+    assert not manager.is_scrolling()
+    # the fetches at 2, 4 and 6 seconds each cost the frames they block, the rest keep the frame period
+    assert manager.dropped_frames == 3 * 9
+    # the frame task also missed the periods of the fetch at 8 seconds, after the message
+    assert frame.missed == 4 * 9
+    assert frame.max_late == pytest.approx(0.3)
+    distance = manager.display.width + len(text) * 4
+    assert manager.frames + manager.dropped_frames == pytest.approx(distance / scroll_speed / manager.frame_period, abs=2)
+
+def test_replayed_scroll_frames_hold_the_frame_period():
+    replay = Replay(duration=60 * 20)
+    globals = replay.run(trace_allocations=False)
+    period = globals["display_manager"].frame_period
+    frames, mean, p95, worst = replay.frame_stats()
+    assert frames > 100
+    assert p95 == pytest.approx(period)
+    assert mean < period * 1.2
+    # the longest stall is one blocking fetch of the slowest feed due at the same time
+    assert worst <= max(default_latency.values()) + period
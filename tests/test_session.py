@@ -0,0 +1,134 @@
+# FeedSession against a local HTTP server that counts the connections it accepts
+
+import importlib
+import os
+import socket
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import session
+
+stub_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "host", "stubs")
+
+# the installed adafruit_requests and its connection manager instead of the host stand-ins
+def installed_requests():
+    names = ("adafruit_requests", "adafruit_connection_manager")
+    saved = dict((name, sys.modules.pop(name)) for name in names if name in sys.modules)
+    path = sys.path[:]
+    sys.path[:] = [entry for entry in path if os.path.abspath(entry or ".") != stub_dir]
+    try:
+        return importlib.import_module("adafruit_requests"), sys.modules["adafruit_connection_manager"]
+    except ImportError:
+        return None, None
+    finally:
+        sys.path[:] = path
+        for name in names:
+            sys.modules.pop(name, None)
+        sys.modules.update(saved)
+
+class CountingServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), Handler)
+        self.accepted = 0
+        self.requests = 0
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+    def get_request(self):
+        self.accepted += 1
+        return super().get_request()
+
+    def url(self, path="/feed.json"):
+        return "http://127.0.0.1:{}{}".format(self.server_port, path)
+
+class Handler(BaseHTTPRequestHandler):
+    # keep-alive like the feeds' servers
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self.server.requests += 1
+        body = b'{"path": "' + self.path.encode() + b'"}'
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+@pytest.fixture(autouse=True)
+def installed(monkeypatch):
+    requests, connection_manager = installed_requests()
+    if requests is None:
+        pytest.skip("adafruit_requests is not installed")
+    monkeypatch.setattr(session, "requests", requests)
+    monkeypatch.setattr(session, "adafruit_connection_manager", connection_manager)
+
+@pytest.fixture
+def servers():
+    started = []
+
+    def start():
+        server = CountingServer()
+        started.append(server)
+        return server
+
+    yield start
+    for server in started:
+        server.shutdown()
+        server.server_close()
+
+# a session on CPython sockets instead of the ESP32 radio
+def feed_session(max_sockets=2):
+    return session.FeedSession(None, max_sockets=max_sockets, socket_pool=socket, ssl_context=None)
+
+def test_requests_reuse_one_connection_per_host(servers):
+    trains, weather = servers(), servers()
+    feeds = feed_session()
+    for _ in range(5):
+        assert feeds.get(trains.url("/trains")).json() == {"path": "/trains"}
+        assert feeds.get(weather.url("/weather")).json() == {"path": "/weather"}
+    assert trains.accepted == 1
+    assert weather.accepted == 1
+    assert trains.requests == weather.requests == 5
+    assert feeds.reused() == 8
+    assert feeds.hosts["127.0.0.1:{}".format(trains.server_port)] == [5, 1]
+
+def test_socket_cap_frees_an_idle_connection(servers):
+    started = [servers() for _ in range(3)]
+    feeds = feed_session(max_sockets=2)
+    for server in started:
+        assert feeds.get(server.url()).json() == {"path": "/feed.json"}
+        assert len(feeds._pool.open) <= 2
+    assert feeds._pool.opened == 3
+    assert [server.accepted for server in started] == [1, 1, 1]
+
+def test_reset_drops_pooled_connections(servers):
+    server = servers()
+    feeds = feed_session()
+    feeds.get(server.url()).json()
+    feeds.reset()
+    assert feeds._pool.open == []
+    # the next request reconnects once and reuses that connection again
+    feeds.get(server.url()).json()
+    feeds.get(server.url()).json()
+    assert server.accepted == 2
+    assert feeds.reused() == 1
+
+def test_request_after_reset_gets_a_fresh_socket(servers):
+    server = servers()
+    feeds = feed_session()
+    feeds.get(server.url()).json()
+    manager = session.adafruit_connection_manager.get_connection_manager(feeds._pool)
+    assert (manager.managed_socket_count, manager.available_socket_count) == (1, 1)
+    feeds.reset()
+    # the manager must not hand the closed socket out again
+    assert (manager.managed_socket_count, manager.available_socket_count) == (0, 0)
+    assert feeds.get(server.url()).json() == {"path": "/feed.json"}
+    assert (manager.managed_socket_count, manager.available_socket_count) == (1, 1)
+    assert feeds._pool.opened == 2
@@ -0,0 +1,85 @@
+# Snapshotter writes to a fake nvm: rate limit, unchanged content, torn writes
+
+import datetime
+
+from harness import Replay, VirtualClock
+from snapshot import Snapshotter, header_size
+
+# as the sign shows it: OpenWeather's hundredths and the observed trend
+weather = {
+    "icon": "03d", "current_temp": 68.41, "current_feels_like": 67.93, "daily_temp_min": 58.1,
+    "daily_temp_max": 77.96, "hourly_next_temp": 70.2, "hourly_feels_like": 68.75, "temp_trend": 1,
+}
+
+def payload(now, minutes="4"):
+    return {
+        "v": 1, "now": now, "time": {}, "at": {},
+        "trains": [["Shady Gr", "Shady Grove", "A15", minutes], None],
+        "weather": dict(weather), "plane": None, "incidents": None,
+    }
+
+def snapshotter(store=None):
+    clock = VirtualClock()
+    return Snapshotter(store if store is not None else bytearray(512), min_interval=1800, clock=clock.monotonic), clock
+
+def test_saved_snapshot_loads_back():
+    store = bytearray(512)
+    writer, clock = snapshotter(store)
+    assert writer.save(payload(1000))
+    restored = Snapshotter(store).load()
+    assert restored["trains"] == [["Shady Gr", "Shady Grove", "A15", "4"], None]
+    assert restored["weather"] == weather
+    assert restored["now"] == 1000
+
+def test_writes_are_rate_limited():
+    writer, clock = snapshotter()
+    assert writer.save(payload(0))
+    clock.now = 1799
+    assert not writer.save(payload(1799, minutes="3"))
+    clock.now = 1800
+    assert writer.save(payload(1800, minutes="3"))
+    assert writer.writes == 2
+
+def test_only_the_time_changing_is_not_written():
+    writer, clock = snapshotter()
+    writer.save(payload(0))
+    for hour in range(1, 9):
+        clock.now = hour * 3600
+        assert not writer.save(payload(hour * 3600))
+    assert writer.writes == 1
+    assert writer.skipped == 8
+
+def test_restored_snapshot_is_not_rewritten_right_away():
+    store = bytearray(512)
+    snapshotter(store)[0].save(payload(0))
+    writer, clock = snapshotter(store)
+    assert writer.load() is not None
+    clock.now = 1800
+    # the same trains and weather after the reboot
+    assert not writer.save(payload(5000))
+    assert writer.skipped == 1
+
+def test_torn_write_is_ignored():
+    store = bytearray(512)
+    snapshotter(store)[0].save(payload(0))
+    store[header_size + 10] ^= 0xFF
+    assert Snapshotter(store).load() is None
+    assert Snapshotter(bytearray(512)).load() is None
+    assert Snapshotter(None).load() is None
+    assert not Snapshotter(None).save(payload(0))
+
+def test_nothing_is_written_overnight():
+    # shortly before the 22:00 shut off until after midnight
+    replay = Replay(duration=60 * 60 * 3, start=datetime.datetime(2024, 5, 14, 21, 50))
+    globals = replay.run(trace_allocations=False)
+    assert globals["snapshotter"].writes == 1
+
+def test_reboot_restores_the_weather_that_was_shown():
+    before = Replay(duration=60 * 40)
+    globals = before.run(trace_allocations=False)
+    assert globals["snapshotter"].writes >= 1
+    saved = globals["snapshotter"]._last_content[1]
+    assert "temp_trend" in saved
+    after = Replay(duration=1, nvm=before.nvm)
+    globals = after.run(trace_allocations=False)
+    assert globals["snapshot"]["weather"] == saved
@@ -0,0 +1,61 @@
+# TemperatureHistory daily range and trend, including samples before the clock has synced
+
+import pytest
+
+from harness import Replay
+from temperature import TemperatureHistory
+
+def test_samples_without_a_local_day_keep_no_range():
+    history = TemperatureHistory()
+    assert history.append(60.0, None, now=0)
+    assert history.append(62.0, None, now=600)
+    assert (history.day, history.day_min, history.day_max) == (None, None, None)
+    # the range starts with the first sample of a known day
+    history.append(61.0, 19857, now=1200)
+    assert (history.day, history.day_min, history.day_max) == (19857, 61.0, 61.0)
+    # a lost sync later leaves the range as it was
+    history.append(70.0, None, now=1800)
+    assert (history.day_min, history.day_max) == (61.0, 61.0)
+    assert history.latest() == 70.0
+
+def test_range_restarts_at_a_new_day():
+    history = TemperatureHistory()
+    for now, temp in enumerate((58.0, 64.0, 61.0)):
+        history.append(temp, 19857, now=now)
+    assert (history.day_min, history.day_max) == (58.0, 64.0)
+    history.append(55.0, 19858, now=10)
+    assert (history.day, history.day_min, history.day_max) == (19858, 55.0, 55.0)
+
+def test_same_response_is_recorded_once():
+    history = TemperatureHistory()
+    assert history.append(60.0, 19857, now=100)
+    assert not history.append(60.0, 19857, now=100)
+    assert history.count == 1
+
+def test_restore_day_widens_the_same_day_only():
+    history = TemperatureHistory()
+    assert not history.restore_day(None, 50.0, 80.0)
+    history.append(60.0, 19857, now=0)
+    assert not history.restore_day(19856, 50.0, 80.0)
+    assert history.restore_day(19857, 55.0, 58.0)
+    assert (history.day_min, history.day_max) == (55.0, 60.0)
+
+def test_trend_from_observed_slope_and_forecast():
+    history = TemperatureHistory()
+    assert history.trend() == 0
+    for step in range(6):
+        history.append(60.0 + step, 19857, now=step * 600)
+    # 6 degrees per hour observed, averaged with the forecast change over 2 hours
+    assert history.slope == pytest.approx(6.0, abs=0.01)
+    assert history.trend() == 1
+    assert history.trend(forecast_change=-16) == -1
+    assert history.trend(forecast_change=-12) == 0
+
+def test_weather_survives_a_failing_time_feed():
+    replay = Replay(duration=60 * 15)
+    replay.fail("time", None)
+    globals = replay.run(trace_allocations=False)
+    assert globals["weather"] is not None
+    assert replay.failures.get("weather", 0) == 0
+    assert globals["health"].endpoints["weather"].total_failures == 0
+    assert globals["wifi"].resets == 0
@@ -0,0 +1,145 @@
+# round trips of the binary sign payload encoding
+
+import importlib.util
+import json
+import os
+import struct
+
+import pytest
+
+import wire
+from harness import fixture_dir, repo_dir
+
+time_struct = {"year": 2024, "mon": 5, "mday": 14, "hour": 8, "min": 30, "sec": 5, "wday": 2, "yday": 135}
+
+weather = {
+    "icon": "10n", "current_temp": -3.4, "current_feels_like": -8.1, "daily_temp_min": -6.0,
+    "daily_temp_max": 2.5, "hourly_next_temp": -2.9, "hourly_feels_like": -7.6,
+}
+
+def payload(**feeds):
+    value = {
+        "v": 1, "now": 1715675405, "time": dict(time_struct),
+        "at": {"trains": 1715675400, "incidents": 1715675340, "weather": 1715675100, "planes": 1715675390},
+        "trains": [["Shady Gr", "Shady Grove", "A15", "BRD"], ["Glenmont", "Glenmont", "B11", "3"]],
+        "weather": dict(weather),
+        "plane": ["AAL9029", 2100, 38.87, -77.04, "aa5cd6"],
+        "incidents": [["3754F8B2", "2024-05-14T08:12:31", "RD;", "Red Line: residual delays.", None, None]],
+    }
+    value.update(feeds)
+    return value
+
+class Body:
+    def __init__(self, data):
+        self.data = data
+        self.closed = False
+
+    def iter_content(self, chunk_size=1, decode_unicode=False):
+        for start in range(0, len(self.data), chunk_size):
+            yield self.data[start:start + chunk_size]
+
+    def close(self):
+        self.closed = True
+
+# decoded payloads match the encoded one, positions are float32 on the wire
+def assert_round_trip(value, decoded):
+    assert sorted(decoded) == sorted(value)
+    for key in value:
+        if key == "plane" and value[key] is not None:
+            flight, alt, lat, lon, hex = decoded[key]
+            assert (flight, alt, hex) == (value[key][0], value[key][1], value[key][4])
+            assert lat == pytest.approx(value[key][2], abs=1e-4)
+            assert lon == pytest.approx(value[key][3], abs=1e-4)
+        else:
+            assert decoded[key] == value[key], key
+
+def round_trip(value, size=1024):
+    data = wire.encode(value)
+    decoder = wire.WireDecoder(size)
+    body = Body(data)
+    decoded = decoder.read(body)
+    assert body.closed
+    assert_round_trip(value, decoded)
+    return decoded, decoder, data
+
+def test_full_payload_round_trip():
+    round_trip(payload())
+
+def test_aggregator_fixture_payload_round_trip():
+    spec = importlib.util.spec_from_file_location("aggregator", os.path.join(repo_dir, "server", "aggregator.py"))
+    aggregator = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(aggregator)
+    from secrets import secrets
+    service = aggregator.Aggregator(secrets, aggregator.fixture_fetch(fixture_dir))
+    service.tick()
+    value = json.loads(service.body())
+    assert value["plane"] is not None
+    round_trip(value)
+
+def test_no_plane_in_range():
+    decoded, _, _ = round_trip(payload(plane=None))
+    assert decoded["plane"] is None
+
+def test_plane_without_altitude_or_callsign():
+    round_trip(payload(plane=[None, None, 38.9, -77.0, "a1b2c3"]))
+
+def test_missing_feeds():
+    # nothing polled successfully yet
+    decoded, _, _ = round_trip(payload(at={}, trains=None, weather=None, plane=None, incidents=None))
+    assert decoded["at"] == {}
+    # a polled feed with no entries is not the same as a missing feed
+    decoded, _, _ = round_trip(payload(trains=[None, None], incidents=[]))
+    assert decoded["trains"] == [None, None]
+    assert decoded["incidents"] == []
+
+def test_non_ascii_strings():
+    incident = ["é-1", "2024-05-14T08:12:31", "RD;", "Gallery Pl–Chinatown: délai de 10 min ✓ 地铁", "Noma–Gallaudet U", None]
+    decoded, _, data = round_trip(payload(incidents=[incident], trains=[["Ñ", "Ñoño", "A15", "5"], None]))
+    assert decoded["incidents"][0][3] == incident[3]
+    # lengths in the string table are utf-8 bytes, not characters
+    assert incident[3].encode("utf-8") in data
+
+def test_weather_keeps_hundredths_and_the_trend():
+    observed = dict(weather, current_temp=68.41, daily_temp_max=77.99, hourly_feels_like=-0.01, temp_trend=-1)
+    decoded, _, _ = round_trip(payload(weather=observed))
+    assert decoded["weather"]["temp_trend"] == -1
+    # the aggregator leaves the trend to the sign
+    decoded, _, _ = round_trip(payload())
+    assert "temp_trend" not in decoded["weather"]
+
+def test_repeated_strings_are_stored_once():
+    data = wire.encode(payload(trains=[["Glenmont", "Glenmont", "B11", "3"], ["Glenmont", "Glenmont", "B11", "3"]]))
+    assert data.count(b"Glenmont") == 1
+
+def test_decoder_buffer_grows_to_fit_a_larger_payload():
+    incidents = [["id-{}".format(i), "2024-05-14T08:00:00", "RD;", "Red Line: incident {} ".format(i) * 4, None, None]
+    for i in range(20)]
+    large = payload(incidents=incidents)
+    decoded, decoder, data = round_trip(large, size=64)
+    # doubled until it fits
+    size = 64
+    while size < len(data):
+        size *= 2
+    assert len(decoder.buffer) == size
+    grown = decoder.grown
+    assert grown > 0
+    assert decoder.length == len(data)
+    buffer = decoder.buffer
+    # smaller and equal payloads reuse the grown buffer
+    for value in (payload(), large):
+        assert_round_trip(value, decoder.read(Body(wire.encode(value))))
+    assert decoder.buffer is buffer
+    assert decoder.grown == grown
+
+def test_decode_from_memoryview():
+    data = wire.encode(payload())
+    assert_round_trip(payload(), wire.WireDecoder().decode(memoryview(bytearray(data))))
+
+def test_rejects_other_data():
+    decoder = wire.WireDecoder()
+    with pytest.raises(ValueError):
+        decoder.decode(b'{"v": 1, "trains": []}')
+    data = bytearray(wire.encode(payload()))
+    struct.pack_into("<B", data, 2, wire.version + 1)
+    with pytest.raises(ValueError):
+        decoder.decode(data)
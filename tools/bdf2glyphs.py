@@ -0,0 +1,91 @@
+# BDF to glyph font
+# build step (run on CPython) converting a BDF font to the compact glyph file
+# read by glyph_font.py, keeping only the characters the sign renders
+#
+#   python tools/bdf2glyphs.py bdf/custom_bellota.bdf bdf/custom_bellota.glf --chars ",."
+
+import argparse
+import struct
+import sys
+
+# temperature trend arrows drawn with the symbol font (see display_manager.update_weather)
+symbol_chars = ",."
+
+magic = b"GLF1"
+header_format = "<4sHbbbbbb"
+glyph_format = "<HBBbbbb"
+
+def parse_bdf(path):
+    """Return (bounding box, ascent, descent, {code point: glyph dict}) for a BDF font."""
+    bounding_box = None
+    ascent = descent = 0
+    glyphs = {}
+    glyph = None
+    rows = None
+    with open(path) as bdf:
+        for line in bdf:
+            parts = line.split()
+            if not parts:
+                continue
+            keyword = parts[0]
+            if rows is not None:
+                if keyword == "ENDCHAR":
+                    glyph["rows"] = rows
+                    if glyph["encoding"] >= 0:
+                        glyphs[glyph["encoding"]] = glyph
+                    glyph = rows = None
+                else:
+                    rows.append(bytes.fromhex(keyword))
+            elif keyword == "FONTBOUNDINGBOX":
+                bounding_box = tuple(int(value) for value in parts[1:5])
+            elif keyword == "FONT_ASCENT":
+                ascent = int(parts[1])
+            elif keyword == "FONT_DESCENT":
+                descent = int(parts[1])
+            elif keyword == "STARTCHAR":
+                glyph = {"encoding": -1, "shift": (0, 0), "bbx": (0, 0, 0, 0)}
+            elif glyph is not None and keyword == "ENCODING":
+                glyph["encoding"] = int(parts[1])
+            elif glyph is not None and keyword == "DWIDTH":
+                glyph["shift"] = (int(parts[1]), int(parts[2]))
+            elif glyph is not None and keyword == "BBX":
+                glyph["bbx"] = tuple(int(value) for value in parts[1:5])
+            elif glyph is not None and keyword == "BITMAP":
+                rows = []
+    if bounding_box is None:
+        raise ValueError("{} has no FONTBOUNDINGBOX".format(path))
+    return bounding_box, ascent, descent, glyphs
+
+def encode(bounding_box, ascent, descent, glyphs, chars):
+    missing = [char for char in chars if ord(char) not in glyphs]
+    if missing:
+        raise ValueError("characters missing from the font: {!r}".format("".join(missing)))
+    code_points = sorted(set(ord(char) for char in chars))
+    data = bytearray(struct.pack(header_format, magic, len(code_points),
+    bounding_box[0], bounding_box[1], bounding_box[2], bounding_box[3], ascent, descent))
+    for code_point in code_points:
+        glyph = glyphs[code_point]
+        width, height, dx, dy = glyph["bbx"]
+        data += struct.pack(glyph_format, code_point, width, height, dx, dy, glyph["shift"][0], glyph["shift"][1])
+        row_bytes = (width + 7) // 8
+        for y in range(height):
+            # BDF rows may be padded past the glyph width, keep only the bytes that hold pixels
+            row = glyph["rows"][y] if y < len(glyph["rows"]) else b""
+            data += row[:row_bytes].ljust(row_bytes, b"\0")
+    return bytes(data)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="convert a BDF font to a compact glyph file")
+    parser.add_argument("bdf")
+    parser.add_argument("output", nargs="?", help="defaults to the BDF path with a .glf extension")
+    parser.add_argument("--chars", default=symbol_chars, help="characters to keep")
+    args = parser.parse_args(argv)
+    output = args.output or args.bdf.rsplit(".", 1)[0] + ".glf"
+    bounding_box, ascent, descent, glyphs = parse_bdf(args.bdf)
+    data = encode(bounding_box, ascent, descent, glyphs, args.chars)
+    with open(output, "wb") as glf:
+        glf.write(data)
+    print("{}: {} glyphs, {} bytes".format(output, len(set(args.chars)), len(data)))
+
+if __name__ == "__main__":
+    sys.exit(main())
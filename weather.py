@@ -0,0 +1,30 @@
+# Weather
+# OpenWeather One Call request and the compact dict of the fields the display
+# uses, shared by the sign and the aggregator service
+
+weather_url = 'https://api.openweathermap.org/data/3.0/onecall?'
+
+# One Call URL for a location, imperial units without minutely data and alerts
+def onecall_url(lat, long, api_key):
+    return (weather_url
+    +'lat='+lat
+    +'&lon='+long
+    +'&exclude=minutely,alerts'
+    +'&units=imperial'
+    +'&appid='+api_key
+    )
+
+# current weather, today's range and the forecast 2 hours out from a One Call document
+def compact_weather(weather_json):
+    weather_data = {}
+    # insert icon and current weather data into dict
+    weather_data["icon"] = weather_json["current"]["weather"][0]["icon"]
+    weather_data["current_temp"] = weather_json["current"]["temp"]
+    weather_data["current_feels_like"] = weather_json["current"]["feels_like"]
+    # insert daily forecast min and max temperature into dict
+    weather_data["daily_temp_min"] = weather_json["daily"][0]["temp"]["min"]
+    weather_data["daily_temp_max"] = weather_json["daily"][0]["temp"]["max"]
+    # insert next hour + 1 forecast temperature and feels like into dict
+    weather_data["hourly_next_temp"] = weather_json["hourly"][2]["temp"]
+    weather_data["hourly_feels_like"] = weather_json["hourly"][2]["feels_like"]
+    return weather_data
@@ -0,0 +1,245 @@
+# Wire
+# compact binary encoding of the aggregator's sign payload (see server/aggregator.py)
+# fixed-size struct records followed by one string table, decoded from a
+# preallocated buffer with struct.unpack_from so no JSON objects are built
+# encode() runs on the aggregator, WireDecoder on the sign; both produce and
+# take the same dict as the JSON payload
+#
+# layout, little endian:
+#   header     b"SW", encoding version (B), payload version "v" (B), feeds present (B, see
+#              feed_bits), now (I), string table offset (H)
+#   time       year (H), mon, mday, hour, min, sec, wday (6 B), yday (H)
+#   at         trains, incidents, weather, planes (4 I, 0 if never polled)
+#   trains     count (B), per row: present (B), destination, destination_name,
+#              destination_code, Min (4 H string indexes)
+#   weather    icon (H string index), current_temp, current_feels_like, daily_temp_min,
+#              daily_temp_max, hourly_next_temp, hourly_feels_like (6 h, hundredths of a
+#              degree, the precision OpenWeather reports), temp_trend (b, -128 if absent)
+#   plane      flight (H string index), alt_geom (i), lat, lon (2 f), hex (H string index)
+#   incidents  count (B), per incident: id, updated, lines_affected, description,
+#              start, end (6 H string indexes)
+#   strings    count (H), per string: length (H) and utf-8 bytes
+# string index 0xFFFF is None
+
+import struct
+
+magic = b"SW"
+version = 2
+
+header_format = "<2sBBBIH"
+time_format = "<HBBBBBBH"
+at_format = "<IIII"
+train_format = "<BHHHH"
+weather_format = "<H6hb"
+plane_format = "<HiffH"
+incident_format = "<6H"
+
+# bit of each feed in the header's feeds present byte
+feed_bits = {"trains": 1, "incidents": 2, "weather": 4, "planes": 8}
+at_feeds = ("trains", "incidents", "weather", "planes")
+weather_fields = ("current_temp", "current_feels_like", "daily_temp_min", "daily_temp_max",
+"hourly_next_temp", "hourly_feels_like")
+time_fields = ("year", "mon", "mday", "hour", "min", "sec", "wday", "yday")
+
+no_string = 0xFFFF
+# temp_trend of weather without one (the aggregator leaves the trend to the sign)
+no_trend = -128
+# alt_geom of a plane without one
+no_altitude = -0x80000000
+
+# content type the aggregator serves the encoding with
+content_type = "application/octet-stream"
+
+class _Strings:
+    def __init__(self):
+        self.index = {}
+        self.values = []
+
+    def add(self, value):
+        if value is None:
+            return no_string
+        value = str(value)
+        position = self.index.get(value)
+        if position is None:
+            position = self.index[value] = len(self.values)
+            self.values.append(value)
+        return position
+
+def _hundredths(value):
+    return int(round(value * 100))
+
+def encode(payload):
+    """Encode an aggregator payload dict (see Aggregator.payload) to bytes."""
+    strings = _Strings()
+    records = bytearray()
+    present = 0
+
+    time_struct = payload["time"]
+    records += struct.pack(time_format, *[time_struct.get(field, 0) for field in time_fields])
+    records += struct.pack(at_format, *[int(payload["at"].get(feed) or 0) for feed in at_feeds])
+
+    trains = payload["trains"]
+    if trains is not None:
+        present |= feed_bits["trains"]
+    trains = trains or ()
+    records += struct.pack("<B", len(trains))
+    for train in trains:
+        if train is None:
+            records += struct.pack(train_format, 0, no_string, no_string, no_string, no_string)
+        else:
+            records += struct.pack(train_format, 1, *[strings.add(value) for value in train])
+
+    weather = payload["weather"]
+    if weather is not None:
+        present |= feed_bits["weather"]
+        trend = weather.get("temp_trend")
+        records += struct.pack(weather_format, strings.add(weather["icon"]),
+        *[_hundredths(weather[field]) for field in weather_fields], no_trend if trend is None else trend)
+    else:
+        records += struct.pack(weather_format, no_string, 0, 0, 0, 0, 0, 0, no_trend)
+
+    plane = payload["plane"]
+    if plane is not None:
+        present |= feed_bits["planes"]
+        flight, alt_geom, lat, lon, hex = plane
+        records += struct.pack(plane_format, strings.add(flight),
+        no_altitude if alt_geom is None else int(alt_geom), lat or 0.0, lon or 0.0, strings.add(hex))
+    else:
+        records += struct.pack(plane_format, no_string, no_altitude, 0.0, 0.0, no_string)
+
+    incidents = payload["incidents"]
+    if incidents is not None:
+        present |= feed_bits["incidents"]
+    incidents = incidents or ()
+    records += struct.pack("<B", len(incidents))
+    for incident in incidents:
+        records += struct.pack(incident_format, *[strings.add(value) for value in incident])
+
+    table = bytearray(struct.pack("<H", len(strings.values)))
+    for value in strings.values:
+        data = value.encode("utf-8")
+        table += struct.pack("<H", len(data))
+        table += data
+
+    header_size = struct.calcsize(header_format)
+    header = struct.pack(header_format, magic, version, payload["v"], present, int(payload["now"]),
+    header_size + len(records))
+    return bytes(header + records + table)
+
+class WireDecoder:
+    def __init__(self, size=1024):
+        """Decoder reading payloads into one preallocated buffer.
+        :param size: initial buffer size, doubled while a payload doesn't fit and kept at that size
+        """
+        self.buffer = bytearray(size)
+        self.view = memoryview(self.buffer)
+        self.length = 0
+        self.grown = 0
+
+    # copy a response body into the buffer and decode it, closing the response
+    def read(self, response, chunk_size=256):
+        length = 0
+        try:
+            for chunk in response.iter_content(chunk_size):
+                end = length + len(chunk)
+                if end > len(self.buffer):
+                    self._grow(end)
+                self.buffer[length:end] = chunk
+                length = end
+        finally:
+            response.close()
+        self.length = length
+        return self.decode(self.view[:length])
+
+    def _grow(self, needed):
+        size = len(self.buffer)
+        while size < needed:
+            size *= 2
+        buffer = bytearray(size)
+        buffer[:len(self.buffer)] = self.buffer
+        self.buffer = buffer
+        self.view = memoryview(buffer)
+        self.grown += 1
+
+    def decode(self, data):
+        """Decode an encoded payload from any bytes-like object (e.g. a memoryview
+        of the buffer) to the same dict as the JSON payload.
+        """
+        header = struct.unpack_from(header_format, data, 0)
+        if header[0] != magic:
+            raise ValueError("not a sign payload")
+        if header[1] != version:
+            raise ValueError("unsupported sign payload version {}".format(header[1]))
+        present = header[3]
+        offset = header[5]
+
+        # the string table first, the records refer to it by index
+        count = struct.unpack_from("<H", data, offset)[0]
+        offset += 2
+        strings = []
+        for _ in range(count):
+            length = struct.unpack_from("<H", data, offset)[0]
+            offset += 2
+            strings.append(str(data[offset:offset + length], "utf-8"))
+            offset += length
+
+        def string(index):
+            return None if index == no_string else strings[index]
+
+        offset = struct.calcsize(header_format)
+        values = struct.unpack_from(time_format, data, offset)
+        offset += struct.calcsize(time_format)
+        time_struct = {}
+        for position, field in enumerate(time_fields):
+            time_struct[field] = values[position]
+
+        values = struct.unpack_from(at_format, data, offset)
+        offset += struct.calcsize(at_format)
+        at = {}
+        for position, feed in enumerate(at_feeds):
+            if values[position]:
+                at[feed] = values[position]
+
+        count = data[offset]
+        offset += 1
+        trains = []
+        for _ in range(count):
+            values = struct.unpack_from(train_format, data, offset)
+            offset += struct.calcsize(train_format)
+            trains.append([string(index) for index in values[1:]] if values[0] else None)
+
+        values = struct.unpack_from(weather_format, data, offset)
+        offset += struct.calcsize(weather_format)
+        weather = None
+        if present & feed_bits["weather"]:
+            weather = {"icon": string(values[0])}
+            for position, field in enumerate(weather_fields):
+                weather[field] = values[position + 1] / 100
+            if values[7] != no_trend:
+                weather["temp_trend"] = values[7]
+
+        values = struct.unpack_from(plane_format, data, offset)
+        offset += struct.calcsize(plane_format)
+        plane = None
+        if present & feed_bits["planes"]:
+            plane = [string(values[0]), None if values[1] == no_altitude else values[1],
+            values[2], values[3], string(values[4])]
+
+        count = data[offset]
+        offset += 1
+        incidents = []
+        for _ in range(count):
+            values = struct.unpack_from(incident_format, data, offset)
+            offset += struct.calcsize(incident_format)
+            incidents.append([string(index) for index in values])
+
+        return {
+            "v": header[2],
+            "now": header[4],
+            "time": time_struct,
+            "at": at,
+            "trains": trains if present & feed_bits["trains"] else None,
+            "weather": weather,
+            "plane": plane,
+            "incidents": incidents if present & feed_bits["incidents"] else None,
+        }